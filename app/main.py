@@ -1,15 +1,63 @@
-from fastapi import FastAPI
-from app.routers import profile_router
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from app.routers import profile_router, health_router, job_router, job_scheduler, snapshot_router
+from app.utils import model_registry, embedding_batcher, profile_executor
+from app.utils.metrics import REQUESTS, REQUEST_LATENCY
+from app.utils.startup import startup_report
 import uvicorn
 
 tags_metadata = [
     {
         "name": "profile",
         "description": "Operations with profile"
+    },
+    {
+        "name": "jobs",
+        "description": "Asynchronous bulk verification jobs"
+    },
+    {
+        "name": "snapshots",
+        "description": "Profile snapshots for replicas"
+    },
+    {
+        "name": "health",
+        "description": "Service readiness"
     }
 ]
 
-app = FastAPI(openapi_tags=tags_metadata)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm up models once before serving requests, a preforking parent has already loaded them
+    model_registry.load()
+    startup_report.mark("models_loaded")
+    await embedding_batcher.start()
+    # Resume jobs queued before a restart
+    await job_scheduler.start()
+    startup_report.mark("ready")
+    logging.getLogger("uvicorn.error").info(
+        "Ready in %.2fs (%s), phases: %s",
+        startup_report.ready_seconds, startup_report.mode,
+        ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in startup_report.phases.items()),
+    )
+    yield
+    await job_scheduler.stop()
+    await embedding_batcher.stop()
+    profile_executor.shutdown()
+
+app = FastAPI(openapi_tags=tags_metadata, lifespan=lifespan)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Label by route template so per-profile paths share one series
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    REQUEST_LATENCY.observe(time.perf_counter() - start, method=request.method, route=path)
+    REQUESTS.inc(method=request.method, route=path, status=response.status_code)
+    return response
 
 if __name__ == "__main__":
     uvicorn.run(app, host="localhost", port=8000)
@@ -20,4 +68,9 @@ async def root():
     return {"William Bui - IndentifAI Recruiting Challenge"}
 
 # Routers
-app.include_router(profile_router)
\ No newline at end of file
+app.include_router(profile_router)
+app.include_router(job_router)
+app.include_router(snapshot_router)
+app.include_router(health_router)
+
+startup_report.mark("app_imported")
\ No newline at end of file
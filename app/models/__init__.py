@@ -1 +1 @@
-from .profile_models import Profile, ProfileResponse, VerificationResponse
\ No newline at end of file
+from .profile_models import Profile, ProfileResponse, ProfileIdsRequest, BulkProfileResponse, BulkDeleteResponse, VerificationResponse, EnrollmentResponse, IdentificationCandidate, IdentificationResponse, FaceBox, FaceProfileResult, MultiFaceProfileResponse, FaceVerificationResult, MultiFaceVerificationResponse, FrameVerificationResult, VideoVerificationResponse, JobStatusResponse, JobTaskResult, JobResultsResponse, SnapshotImportResponse
\ No newline at end of file
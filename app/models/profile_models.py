@@ -1,19 +1,144 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 # Profile Model
 class Profile(BaseModel):
     landmark_distances: dict
     deep_features: list
     lbp_histogram: list
+    enrollment_count: int = 1
+    landmark_variance: Optional[dict] = None
 
 # Profile Response
 class ProfileResponse(BaseModel):
     message: str
     profile: Profile
 
+# Bulk Profile Requests and Responses
+class ProfileIdsRequest(BaseModel):
+    profile_ids: List[str]
+
+class BulkProfileResponse(BaseModel):
+    message: str
+    profiles: Dict[str, Profile]
+    missing: List[str]
+
+class BulkDeleteResponse(BaseModel):
+    message: str
+    deleted: int
+    missing: List[str]
+
 # Verification Response
 class VerificationResponse(BaseModel):
     message: str
     is_deepfaked: bool
-    confidence: float
\ No newline at end of file
+    confidence: float
+    skipped_stages: List[str] = []
+
+# Enrollment Response
+class EnrollmentResponse(BaseModel):
+    message: str
+    profile_id: str
+    enrollment_count: int
+
+# Identification Candidate
+class IdentificationCandidate(BaseModel):
+    profile_id: str
+    confidence: float
+    embedding_confidence: float
+
+# Identification Response
+class IdentificationResponse(BaseModel):
+    message: str
+    match_found: bool
+    profile_id: Optional[str] = None
+    confidence: Optional[float] = None
+    candidates: List[IdentificationCandidate]
+
+# Face Bounding Box
+class FaceBox(BaseModel):
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+# Per-face Profile Creation Result
+class FaceProfileResult(BaseModel):
+    box: FaceBox
+    profile_id: str
+
+# Multi-face Profile Creation Response
+class MultiFaceProfileResponse(BaseModel):
+    message: str
+    faces: List[FaceProfileResult]
+
+# Per-face Verification Result
+class FaceVerificationResult(BaseModel):
+    box: FaceBox
+    is_deepfaked: bool
+    confidence: float
+
+# Multi-face Verification Response
+class MultiFaceVerificationResponse(BaseModel):
+    message: str
+    match_found: bool
+    best_face: int
+    faces: List[FaceVerificationResult]
+
+# Per-frame Video Verification Result
+class FrameVerificationResult(BaseModel):
+    frame: int
+    timestamp: float
+    box: FaceBox
+    keyframe: bool
+    confidence: float
+
+# Video Verification Response
+class VideoVerificationResponse(BaseModel):
+    message: str
+    is_deepfaked: bool
+    confidence: float
+    confidence_interval: Optional[List[float]] = None
+    frames_decoded: int
+    frames_analyzed: int
+    frames_without_face: int
+    detections: int
+    early_exit: bool
+    video_seconds: float
+    frames: List[FrameVerificationResult]
+
+# Verification Job Status
+class JobStatusResponse(BaseModel):
+    job_id: str
+    state: str
+    priority: int
+    total: int
+    completed: int
+    failed: int
+    pending: int
+    created: float
+    finished: Optional[float] = None
+
+# Verification Job Task Result
+class JobTaskResult(BaseModel):
+    index: int
+    profile_id: str
+    image: str
+    state: str
+    is_deepfaked: Optional[bool] = None
+    confidence: Optional[float] = None
+    error: Optional[str] = None
+
+# Verification Job Results Response
+class JobResultsResponse(BaseModel):
+    job_id: str
+    state: str
+    results: List[JobTaskResult]
+
+# Snapshot Import Response
+class SnapshotImportResponse(BaseModel):
+    full: bool
+    since: int
+    sequence: int
+    imported: int
+    deleted: int
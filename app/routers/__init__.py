@@ -1 +1,4 @@
-from .profile_routers import router as profile_router
\ No newline at end of file
+from .profile_routers import router as profile_router
+from .health_routers import router as health_router
+from .job_routers import router as job_router, job_scheduler
+from .snapshot_routers import router as snapshot_router
\ No newline at end of file
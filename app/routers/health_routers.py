@@ -0,0 +1,116 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.utils import model_registry, embedding_batcher, profile_executor, metrics_registry, feature_cache
+from app.utils.metrics import Gauge
+from app.utils.startup import startup_report
+from app.routers.job_routers import job_scheduler
+
+router = APIRouter()
+
+# Gauges read from the live service objects whenever metrics are scraped
+metrics_registry.register(Gauge("executor_in_flight", "Profile generation requests admitted to the worker pool", lambda: profile_executor.in_flight))
+metrics_registry.register(Gauge("executor_rejected_total", "Profile generation requests rejected while saturated", lambda: profile_executor.rejected))
+metrics_registry.register(Gauge("facenet_batch_queue_depth", "Images waiting in the micro-batcher queue", lambda: embedding_batcher.queue_depth))
+metrics_registry.register(Gauge("feature_cache_bytes", "Memory held by cached profiles", lambda: feature_cache.nbytes))
+metrics_registry.register(Gauge("model_memory_bytes", "Estimated memory held by the loaded models", model_registry.memory_bytes))
+metrics_registry.register(Gauge("job_tasks_pending", "Verification job tasks queued or being processed", lambda: job_scheduler.queue.pending()))
+metrics_registry.register(Gauge("startup_ready_seconds", "Seconds from process start (or fork) until ready to serve", lambda: startup_report.ready_seconds or 0))
+
+@router.get(
+        "/health/ready",
+        description="Reports whether the analysis models are loaded and warmed up",
+        summary="Readiness probe",
+        tags=["health"],
+    )
+async def health_ready():
+    """
+    Report readiness of the process-wide model registry
+
+    Return:
+        dict: Readiness flag, loaded models and load times (503 status while loading)
+    """
+    status = model_registry.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@router.get(
+        "/health/batching",
+        description="Reports batch size and queue wait statistics of the FaceNet micro-batcher",
+        summary="Micro-batching statistics",
+        tags=["health"],
+    )
+async def health_batching():
+    """
+    Report micro-batcher statistics for tuning throughput against latency
+
+    Return:
+        dict: Batch counts, batch size histogram and queue wait figures
+    """
+    return embedding_batcher.stats.snapshot()
+
+
+@router.get(
+        "/health/executor",
+        description="Reports load and capacity of the profile generation worker pool",
+        summary="Worker pool statistics",
+        tags=["health"],
+    )
+async def health_executor():
+    """
+    Report worker pool backend, capacity and admission statistics
+
+    Return:
+        dict: Backend, capacity, in-flight and rejected request counts
+    """
+    return profile_executor.stats()
+
+
+@router.get(
+        "/health/cache",
+        description="Reports size and hit rate of the content-addressed feature cache",
+        summary="Feature cache statistics",
+        tags=["health"],
+    )
+async def health_cache():
+    """
+    Report feature cache usage for sizing its memory budget
+
+    Return:
+        dict: Entry count, bytes used, hit/miss/eviction counts and hit rate
+    """
+    return feature_cache.stats()
+
+
+@router.get(
+        "/health/startup",
+        description="Reports how long the process took to import, load models and become ready",
+        summary="Startup-time report",
+        tags=["health"],
+    )
+async def health_startup():
+    """
+    Report startup timings for tuning cold starts of new workers
+
+    Return:
+        dict: Serving mode, phase timings since process start or fork, lazy library import times and model load times
+    """
+    report = startup_report.report()
+    report["model_load_times"] = dict(model_registry.load_times)
+    return report
+
+
+@router.get(
+        "/metrics",
+        response_class=PlainTextResponse,
+        description="Exposes latency histograms, error counters and load gauges in the Prometheus text format",
+        summary="Prometheus metrics",
+        tags=["health"],
+    )
+async def metrics():
+    """
+    Report every registered metric for scraping
+
+    Return:
+        str: Metrics in the Prometheus text exposition format
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,140 @@
+import asyncio
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Query
+from app.models import JobStatusResponse, JobResultsResponse, JobTaskResult
+from app.utils.analysis_params import JOB_MAX_WAIT, UPLOAD_MAX_BYTES
+from app.utils.bulk import IMAGE_EXTENSIONS, iter_archive_images
+from app.utils.jobs import JobQueue, JobScheduler, parse_manifest
+from app.routers.profile_routers import profile_db
+
+router = APIRouter()
+
+# Durable job queue shared by every worker, processed in the background of each worker
+job_queue = JobQueue()
+job_scheduler = JobScheduler(job_queue, profile_db)
+
+@router.post(
+    "/jobs/verify",
+    response_model=JobStatusResponse,
+    status_code=202,
+    description="Queues many photo verifications as one job, to be polled for progress and results.",
+    summary="Submits verification job",
+    tags=["jobs"])
+async def submit_verification_job(
+        manifest: str = Form(...),
+        files: list[UploadFile] = File(None),
+        archive: UploadFile = File(None),
+        priority: int = Query(0, ge=-100, le=100)):
+    """
+    Queues a verification job of (profile id, image) pairs
+
+    Args:
+        manifest (str): JSON list of {"profile_id": ..., "image": ...} objects, image naming an uploaded file or archive member
+        files (list[File]): Files containing images referred to by the manifest
+        archive (File): Zip or tar archive containing images referred to by the manifest
+        priority (int): Jobs with higher priority are processed first
+
+    Return:
+        JobStatusResponse: Id and initial status of the job
+
+    Error:
+        HTTPException: If the manifest is invalid, no images are given, or the archive is not a zip/tar archive
+    """
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="No images provided")
+    if archive is not None and not archive.filename.endswith((".zip", ".tar", ".tar.gz", ".tgz")):
+        raise HTTPException(status_code=400, detail="Invalid Archive Format")
+    try:
+        pairs = parse_manifest(manifest)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def iter_images():
+        for file in files or []:
+            if file.filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield file.filename, file.file.read(UPLOAD_MAX_BYTES + 1)
+        if archive is not None:
+            yield from iter_archive_images(archive.file, archive.filename)
+
+    try:
+        job_id = await asyncio.to_thread(job_queue.submit, pairs, iter_images(), priority)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    await job_scheduler.start()
+    job_scheduler.notify()
+    return await asyncio.to_thread(job_queue.status, job_id)
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    description="Reports the progress of a verification job, optionally waiting for it to finish.",
+    summary="Gets job status",
+    tags=["jobs"])
+async def get_job_status(job_id: str, wait: float = Query(0, ge=0, le=JOB_MAX_WAIT)):
+    """
+    Retrieves the progress of a verification job
+
+    Args:
+        job_id (str): Id of the job
+        wait (float): Seconds to wait for the job to finish before responding (long-polling)
+
+    Return:
+        JobStatusResponse: State and task counts of the job
+
+    Error:
+        HTTPException: If the job is not found
+    """
+    await job_scheduler.start()
+    status = await job_scheduler.wait(job_id, wait)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+@router.get(
+    "/jobs/{job_id}/results",
+    response_model=JobResultsResponse,
+    description="Lists the outcome of each verification in a job, in manifest order.",
+    summary="Gets job results",
+    tags=["jobs"])
+async def get_job_results(job_id: str, offset: int = Query(0, ge=0), limit: int = Query(1000, ge=1, le=10000)):
+    """
+    Retrieves the results of a verification job, finished or not
+
+    Args:
+        job_id (str): Id of the job
+        offset (int): Manifest index of the first result returned
+        limit (int): Maximum number of results returned
+
+    Return:
+        JobResultsResponse: Job state and per-task state, deepfake status, confidence and error
+
+    Error:
+        HTTPException: If the job is not found
+    """
+    status = await asyncio.to_thread(job_queue.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    results = [JobTaskResult(**result) for result in await asyncio.to_thread(job_queue.results, job_id, offset, limit)]
+    return JobResultsResponse(job_id=job_id, state=status["state"], results=results)
+
+@router.delete(
+    "/jobs/{job_id}",
+    response_model=dict[str,str],
+    description="Deletes a verification job with its results, cancelling verifications not yet started.",
+    summary="Deletes job",
+    tags=["jobs"])
+async def delete_job(job_id: str):
+    """
+    Deletes a verification job
+
+    Args:
+        job_id (str): Id of the job
+
+    Return:
+        dict: Dictionary containing a success message
+
+    Error:
+        HTTPException: If the job is not found
+    """
+    if not await asyncio.to_thread(job_queue.delete, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"message": "Job deleted successfully"}
@@ -1,29 +1,100 @@
-import random
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from app.models import ProfileResponse, VerificationResponse
-from app.utils import generate_profile, compare_profiles
-from app.utils.analysis_params import CONFIDENCE_THRESHOLD
-from io import BytesIO
-from PIL import Image
+import asyncio
+import functools
+import json
+import os
+import tempfile
+import time
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from app.models import ProfileResponse, ProfileIdsRequest, BulkProfileResponse, BulkDeleteResponse, VerificationResponse, EnrollmentResponse, IdentificationCandidate, IdentificationResponse
+from app.models import FaceBox, FaceProfileResult, MultiFaceProfileResponse, FaceVerificationResult, MultiFaceVerificationResponse
+from app.models import FrameVerificationResult, VideoVerificationResponse
+from app.utils import generate_profile_from_bytes, verify_profile_from_bytes, generate_face_profiles_async, compare_profiles, compare_profile_batch, stack_profiles, ServerOverloadedError, create_embedding_index, open_profile_store
+from app.utils.analysis_params import CONFIDENCE_THRESHOLD, IDENTIFY_TOP_K, SERVER_TIMING_ENABLED, VIDEO_EXTENSIONS, VIDEO_MAX_BYTES, UPLOAD_MAX_BYTES, ENROLL_MAX_FILES, BULK_MAX_IDS
+from app.utils.compact_profile import BINARY_MEDIA_TYPE, CompactProfile
+from app.utils.metrics import STAGE_LATENCY, format_server_timing
+from app.utils.video import verify_video_async
+from app.utils.bulk import IMAGE_EXTENSIONS, iter_archive_images, stream_profiles
+from app.utils.ingest import UploadRejectedError, read_upload, spool_upload
+from app.utils.profile_ids import new_profile_id
 
 router = APIRouter()
 
-# In-memory storage for facial profiles, pivot to database in future iterations
-profile_db = {}
+# Durable storage for facial profiles, shared by every worker
+profile_db = open_profile_store()
+
+# Embedding index over profile_db for 1:N identification, kept in sync with store writes
+profile_index = create_embedding_index()
+
+def update_profile_index(profile_id: str, embedding):
+    """
+    Mirror a profile store write into the embedding index
+
+    Args:
+        profile_id (str): Id of the written profile
+        embedding (numpy.ndarray): Embedding of the profile, or None if it was deleted
+    """
+    if embedding is None:
+        profile_index.remove(profile_id)
+    else:
+        profile_index.add(profile_id, embedding)
+
+profile_db.subscribe(update_profile_index)
+
+def store_profile(profile: CompactProfile) -> str:
+    """
+    Store a new profile
+
+    Args:
+        profile (CompactProfile): Profile to store
+
+    Return:
+        str: Id assigned to the profile
+    """
+    profile_id = new_profile_id()
+    profile_db[profile_id] = profile
+    return profile_id
+
+def face_box(box: tuple) -> FaceBox:
+    """
+    Build the response model of a face box
+
+    Args:
+        box (tuple): Face box at full resolution as (left, top, right, bottom)
+
+    Return:
+        FaceBox: Face box response model
+    """
+    left, top, right, bottom = box
+    return FaceBox(left=left, top=top, right=right, bottom=bottom)
+
+def set_server_timing(response: Response, timings: dict):
+    """
+    Report per-stage timings in the Server-Timing header, if enabled
+
+    Args:
+        response (Response): Response to add the header to
+        timings (dict): Seconds spent per stage
+    """
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = format_server_timing(timings)
 
 @router.get(
         "/profile/{profile_id}",
         response_model=ProfileResponse,
-        description="Retrieves previously catalogued profile",
+        description="Retrieves previously catalogued profile, as JSON or in the compact binary format "
+                    "(`?format=binary` or `Accept: application/octet-stream`)",
         summary="Retrieves profile",
         tags=["profile"],
+        responses={200: {"content": {BINARY_MEDIA_TYPE: {}}}},
     )
-async def profile_get(profile_id: str):
+async def profile_get(profile_id: str, request: Request, format: str = Query("json", pattern="^(json|binary)$")):
     """
     Retrieve a previously uploaded facial profile
 
     Args:
         profile_id (str): string containing profile id
+        format (str): "json" for a ProfileResponse or "binary" for the raw float32 wire format
 
     Return:
         string: String with success message
@@ -32,11 +103,72 @@ async def profile_get(profile_id: str):
     Error:
         HTTPException: If profile is not found
     """
-    if profile_id not in profile_db:
+    profile = profile_db.get(profile_id)
+    if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "binary" or BINARY_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(content=profile.to_bytes(), media_type=BINARY_MEDIA_TYPE)
     return ProfileResponse(
         message="Retrieved profile with id " + str(profile_id),
-        profile=profile_db[profile_id]
+        profile=profile.to_profile()
+    )
+
+@router.post(
+    "/profile/get/batch",
+    response_model=BulkProfileResponse,
+    description="Retrieves many previously catalogued profiles in one request",
+    summary="Retrieves profiles",
+    tags=["profile"])
+async def profile_get_batch(request: ProfileIdsRequest):
+    """
+    Retrieve many previously uploaded facial profiles
+
+    Args:
+        request (ProfileIdsRequest): Ids of the profiles to retrieve
+
+    Return:
+        BulkProfileResponse: Profiles found by id, and the ids that were not found
+
+    Error:
+        HTTPException: If more than BULK_MAX_IDS ids are requested
+    """
+    if len(request.profile_ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_IDS} profile ids per request")
+    profiles = profile_db.get_many(request.profile_ids)
+    return BulkProfileResponse(
+        message="Retrieved " + str(len(profiles)) + " profiles",
+        profiles={profile_id: profile.to_profile() for profile_id, profile in profiles.items()},
+        missing=[profile_id for profile_id in dict.fromkeys(request.profile_ids) if profile_id not in profiles]
+    )
+
+@router.post(
+    "/profile/delete/batch",
+    response_model=BulkDeleteResponse,
+    description="Deletes many previously catalogued profiles in one request",
+    summary="Deletes profiles",
+    tags=["profile"])
+async def profile_delete_batch(request: ProfileIdsRequest):
+    """
+    Deletes many previously uploaded facial profiles, ignoring unknown ids
+
+    Args:
+        request (ProfileIdsRequest): Ids of the profiles to delete
+
+    Return:
+        BulkDeleteResponse: Number of profiles deleted, and the ids that were not found
+
+    Error:
+        HTTPException: If more than BULK_MAX_IDS ids are given
+    """
+    if len(request.profile_ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_IDS} profile ids per request")
+    profile_ids = list(dict.fromkeys(request.profile_ids))
+    missing = [profile_id for profile_id in profile_ids if profile_id not in profile_db]
+    deleted = await asyncio.to_thread(profile_db.delete_many, profile_ids)
+    return BulkDeleteResponse(
+        message="Removed " + str(deleted) + " profiles",
+        deleted=deleted,
+        missing=missing
     )
 
 @router.delete(
@@ -74,7 +206,7 @@ async def profile_delete(profile_id: str):
     description="Builds a detailed facial profile from an image.",
     summary="Creates profile",
     tags=["profile"])
-async def create_profile(file: UploadFile = File(...)):
+async def create_profile(response: Response, file: UploadFile = File(...)):
     """
     Creates a detailed profile based on an uploaded image
 
@@ -85,20 +217,217 @@ async def create_profile(file: UploadFile = File(...)):
         dict: Dictionary containing a profile id
 
     Error:
-        HTTPException: If file is not in correct format or if profile fails to generate
+        HTTPException: If file is not in correct format, if profile fails to generate, or if the server is saturated
+    """
+    if not file.filename.endswith((".jpg", ".jpeg", ".png")):
+        raise HTTPException(status_code=400, detail="Invalid Image Format")
+    try:
+        start = time.perf_counter()
+        image_bytes = await read_upload(file)
+        timings = {"upload": time.perf_counter() - start}
+        STAGE_LATENCY.observe(timings["upload"], stage="upload")
+        profile = await generate_profile_from_bytes(image_bytes, timings)
+        set_server_timing(response, timings)
+        profile_id = store_profile(profile)
+        return {"profile_id": profile_id}
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ServerOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/profile/enroll/{profile_id}",
+    response_model=EnrollmentResponse,
+    description="Adds more images of the same person to a profile, which becomes a template averaged over every enrolled image.",
+    summary="Enrolls images into profile",
+    tags=["profile"])
+async def enroll_profile(profile_id: str, response: Response, files: list[UploadFile] = File(...)):
+    """
+    Adds one or more images to an existing profile, updating its template incrementally
+
+    Args:
+        profile_id (str): String containing profile id
+        files (list[File]): Files containing further images of the person
+
+    Return:
+        EnrollmentResponse: Profile id and number of images enrolled into it
+
+    Error:
+        HTTPException: If profile not found, files are not in correct format or too many, any image fails to generate a profile, or the server is saturated
+    """
+    if profile_id not in profile_db:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if len(files) > ENROLL_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {ENROLL_MAX_FILES} images can be enrolled per request")
+    if not all(file.filename.endswith((".jpg", ".jpeg", ".png")) for file in files):
+        raise HTTPException(status_code=400, detail="Invalid Image Format")
+    try:
+        timings = {}
+        uploads = [await read_upload(file) for file in files]
+        profiles = await asyncio.gather(*(generate_profile_from_bytes(upload, timings) for upload in uploads))
+        set_server_timing(response, timings)
+
+        # Images are only enrolled if every one of them produced a profile
+        added = functools.reduce(CompactProfile.merge, profiles)
+        template = profile_db.update(profile_id, lambda profile: profile.merge(added))
+        return EnrollmentResponse(
+            message="Enrolled " + str(len(profiles)) + " images into profile " + profile_id,
+            profile_id=profile_id,
+            enrollment_count=template.count,
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ServerOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/profile/create/faces",
+    response_model=MultiFaceProfileResponse,
+    description="Builds a facial profile for every face in an image, such as a group photo, in one request.",
+    summary="Creates profiles for every face",
+    tags=["profile"])
+async def create_face_profiles(response: Response, file: UploadFile = File(...)):
+    """
+    Creates a profile for every face found in an uploaded image
+
+    Args:
+        file (File): File containing image with one or more faces
+
+    Return:
+        MultiFaceProfileResponse: Bounding box and profile id of each face
+
+    Error:
+        HTTPException: If file is not in correct format, if profiles fail to generate, or if the server is saturated
     """
     if not file.filename.endswith((".jpg", ".jpeg", ".png")):
         raise HTTPException(status_code=400, detail="Invalid Image Format")
     try:
-        img = Image.open(BytesIO(await file.read()))
-        profile = generate_profile(img)
-        profile_id = random.randrange(10000) # Temporary measure, future iterations would use uuid generator
-        profile_db[str(profile_id)] = profile
-        return {"profile_id": str(profile_id)}
+        timings = {}
+        face_profiles = await generate_face_profiles_async(await read_upload(file), timings)
+        set_server_timing(response, timings)
+        faces = [FaceProfileResult(box=face_box(box), profile_id=store_profile(profile)) for box, profile in face_profiles]
+        return MultiFaceProfileResponse(message="Created " + str(len(faces)) + " profiles", faces=faces)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ServerOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/profile/create/batch",
+    response_class=StreamingResponse,
+    description="Builds facial profiles for many images, streaming one NDJSON result line per image as it completes.",
+    summary="Creates profiles in bulk",
+    tags=["profile"])
+async def create_profiles_batch(files: list[UploadFile] = File(None), archive: UploadFile = File(None)):
+    """
+    Creates profiles for many uploaded images, given as multipart files and/or a zip/tar archive
+
+    Args:
+        files (list[File]): Files containing images, one profile per image
+        archive (File): Zip or tar archive containing images, one profile per image
+
+    Return:
+        StreamingResponse: NDJSON stream with one line per image holding its filename and
+            either its profile id or an error, in completion order
+
+    Error:
+        HTTPException: If no images are given or the archive is not a zip/tar archive
+    """
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="No images provided")
+    if archive is not None and not archive.filename.endswith((".zip", ".tar", ".tar.gz", ".tgz")):
+        raise HTTPException(status_code=400, detail="Invalid Archive Format")
+
+    def iter_images():
+        for file in files or []:
+            if file.filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield file.filename, file.file.read(UPLOAD_MAX_BYTES + 1)
+            else:
+                yield file.filename, UploadRejectedError(f"Unsupported file extension, expected {', '.join(IMAGE_EXTENSIONS)}")
+        if archive is not None:
+            yield from iter_archive_images(archive.file, archive.filename)
+
+    async def stream_results():
+        async for filename, result in stream_profiles(iter_images()):
+            if isinstance(result, Exception):
+                line = {"filename": filename, "error": str(result)}
+            else:
+                line = {"filename": filename, "profile_id": store_profile(result)}
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@router.post(
+    "/profile/verify/video/{profile_id}",
+    response_model=VideoVerificationResponse,
+    description="Uses an existing facial profile to verify legitimacy of the face in a video clip",
+    summary="Verifies video",
+    tags=["profile"])
+async def verify_video(profile_id: str, response: Response, file: UploadFile = File(...)):
+    """
+    Verifies the legitimacy of the face in an uploaded video based on a previously uploaded profile
+
+    Args:
+        profile_id (str): String containing reference profile id
+        file (File): File containing video of the face corresponding to profile
+
+    Return:
+        VideoVerificationResponse: Deepfake status and mean confidence with its confidence interval,
+            frame counts, and per-frame confidence with face boxes
+
+    Error:
+        HTTPException: If file is not in correct format, profile not found, verification fails, or the server is saturated
+    """
+    if profile_id not in profile_db:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if not file.filename.lower().endswith(VIDEO_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Invalid Video Format")
+
+    if file.size is not None and file.size > VIDEO_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the limit of {VIDEO_MAX_BYTES} bytes")
+
+    # OpenCV decodes from a path, so the upload is spooled to a temporary file off the event loop
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file.filename)[1], delete=False) as video_file:
+        try:
+            await asyncio.to_thread(spool_upload, file.file, video_file, VIDEO_MAX_BYTES)
+        except UploadRejectedError as e:
+            video_file.close()
+            os.remove(video_file.name)
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+    try:
+        timings = {}
+        result = await verify_video_async(video_file.name, profile_db[profile_id], timings)
+        set_server_timing(response, timings)
+
+        is_deepfaked = result["confidence"] < CONFIDENCE_THRESHOLD
+        if is_deepfaked:
+            message = "Video is deepfaked with confidence of " + str(result["confidence"])
+        else:
+            message = "Video is not deepfaked with confidence of " + str(result["confidence"])
+        frames = [FrameVerificationResult(**{**frame, "box": face_box(frame["box"])}) for frame in result.pop("frames")]
+        return VideoVerificationResponse(message=message, is_deepfaked=is_deepfaked, frames=frames, **result)
+    except ServerOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        os.remove(video_file.name)
 
 @router.post(
     "/profile/verify/{profile_id}",
@@ -106,7 +435,7 @@ async def create_profile(file: UploadFile = File(...)):
     description="Uses an existing facial profile to verify legitimacy of photo",
     summary="Verifies image",
     tags=["profile"])
-async def verify_photo(profile_id: str, file: UploadFile = File(...)):
+async def verify_photo(profile_id: str, response: Response, file: UploadFile = File(...)):
     """
     Verifies the legitimacy of an uploaded photo based on a previously uploaded profile
 
@@ -115,10 +444,10 @@ async def verify_photo(profile_id: str, file: UploadFile = File(...)):
         file (File): File containing image corresponding to profile
 
     Return:
-        dict: Dictionary containing success message, deepfake status, and confidence level regarding deepfake status
+        dict: Dictionary containing success message, deepfake status, and confidence level regarding deepfake status (a bound on it when the cascade skipped stages)
 
     Error:
-        HTTPException: If file is not in correct format, profile not found, or verification fails
+        HTTPException: If file is not in correct format, profile not found, verification fails, or the server is saturated
     """
     if profile_id not in profile_db:
         raise HTTPException(status_code=404, detail="Profile not found")
@@ -126,24 +455,166 @@ async def verify_photo(profile_id: str, file: UploadFile = File(...)):
     if not file.filename.endswith((".jpg", ".jpeg", ".png")):
         raise HTTPException(status_code=400, details="Invalid Image Format")
     try:
-        img = Image.open(BytesIO(await file.read()))
+        start = time.perf_counter()
+        image_bytes = await read_upload(file)
         profile1 = profile_db[profile_id]
-        profile2 = generate_profile(img)
-        confidence = compare_profiles(profile1, profile2)
+        timings = {"upload": time.perf_counter() - start}
+        STAGE_LATENCY.observe(timings["upload"], stage="upload")
+        profile2, bound = await verify_profile_from_bytes(image_bytes, profile1, timings)
+        skipped_stages = []
+        if profile2 is None:
+            # The cascade settled the verdict before FaceNet, report the bound that settled it
+            confidence = bound
+            skipped_stages = ["facenet"]
+        else:
+            start = time.perf_counter()
+            confidence = compare_profiles(profile1, profile2)
+            timings["compare"] = time.perf_counter() - start
+        set_server_timing(response, timings)
         is_deepfaked = False
         message = ""
         if confidence < CONFIDENCE_THRESHOLD:
-            message = "Image is deepfaked with confidence of " + str(confidence)
+            message = "Image is deepfaked with confidence of " + ("at most " if skipped_stages else "") + str(confidence)
             is_deepfaked = True
         else:
-            message = "Image is not deepfaked with confidence of " + str(confidence)
+            message = "Image is not deepfaked with confidence of " + ("at least " if skipped_stages else "") + str(confidence)
             
         return VerificationResponse(
             message=message,
             is_deepfaked=is_deepfaked,
-            confidence=confidence
+            confidence=confidence,
+            skipped_stages=skipped_stages
         )
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ServerOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post(
+    "/profile/verify/{profile_id}/faces",
+    response_model=MultiFaceVerificationResponse,
+    description="Verifies every face in a photo, such as a group photo, against an existing facial profile",
+    summary="Verifies every face in image",
+    tags=["profile"])
+async def verify_photo_faces(profile_id: str, response: Response, file: UploadFile = File(...)):
+    """
+    Verifies each face in an uploaded photo against a previously uploaded profile
+
+    Args:
+        profile_id (str): String containing reference profile id
+        file (File): File containing image with one or more faces
+
+    Return:
+        MultiFaceVerificationResponse: Deepfake status and confidence per face with its bounding box,
+            along with the index of the most confident face
+
+    Error:
+        HTTPException: If file is not in correct format, profile not found, verification fails, or the server is saturated
+    """
+    if profile_id not in profile_db:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if not file.filename.endswith((".jpg", ".jpeg", ".png")):
+        raise HTTPException(status_code=400, detail="Invalid Image Format")
+    try:
+        reference = profile_db[profile_id]
+        timings = {}
+        face_profiles = await generate_face_profiles_async(await read_upload(file), timings)
+        set_server_timing(response, timings)
 
+        # Score every face against the reference in one pass
+        confidences = compare_profile_batch(reference, *stack_profiles([profile for _, profile in face_profiles]))
+        faces = [
+            FaceVerificationResult(box=face_box(box), is_deepfaked=bool(confidence < CONFIDENCE_THRESHOLD), confidence=float(confidence))
+            for (box, _), confidence in zip(face_profiles, confidences)
+        ]
+        best_face = max(range(len(faces)), key=lambda i: faces[i].confidence)
+
+        if faces[best_face].is_deepfaked:
+            message = "No face matches the profile, best confidence of " + str(faces[best_face].confidence)
+        else:
+            message = "Face " + str(best_face) + " is not deepfaked with confidence of " + str(faces[best_face].confidence)
+        return MultiFaceVerificationResponse(
+            message=message,
+            match_found=not faces[best_face].is_deepfaked,
+            best_face=best_face,
+            faces=faces,
+        )
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ServerOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/profile/identify",
+    response_model=IdentificationResponse,
+    description="Searches every catalogued profile for the one matching the face in a photo",
+    summary="Identifies image",
+    tags=["profile"])
+async def identify_photo(file: UploadFile = File(...), top_k: int = IDENTIFY_TOP_K):
+    """
+    Identifies which stored profile, if any, matches an uploaded photo
+
+    Candidates are found with a cosine search over the embedding index, then only those
+    candidates are re-ranked with the full landmark, deep feature and LBP comparison
+
+    Args:
+        file (File): File containing image to identify
+        top_k (int): Number of embedding search candidates to re-rank
+
+    Return:
+        IdentificationResponse: Best matching profile id and confidence if above threshold, along with ranked candidates
+
+    Error:
+        HTTPException: If file is not in correct format, identification fails, or the server is saturated
+    """
+    if not file.filename.endswith((".jpg", ".jpeg", ".png")):
+        raise HTTPException(status_code=400, detail="Invalid Image Format")
+    try:
+        probe = await generate_profile_from_bytes(await read_upload(file))
+
+        # Pick up profiles written by other workers before searching
+        profile_db.refresh()
+        matches, profiles = [], []
+        for profile_id, similarity in profile_index.search(probe.embedding, top_k):
+            profile = profile_db.get(profile_id)
+            if profile is None:
+                continue
+            matches.append((profile_id, similarity))
+            profiles.append(profile)
+
+        # Re-rank all candidates against the probe in one pass
+        candidates = []
+        if profiles:
+            confidences = compare_profile_batch(probe, *stack_profiles(profiles))
+            candidates = [
+                IdentificationCandidate(profile_id=profile_id, confidence=float(confidence), embedding_confidence=(similarity + 1) / 2 * 100)
+                for (profile_id, similarity), confidence in zip(matches, confidences)
+            ]
+        candidates.sort(key=lambda candidate: candidate.confidence, reverse=True)
+
+        if candidates and candidates[0].confidence >= CONFIDENCE_THRESHOLD:
+            best = candidates[0]
+            return IdentificationResponse(
+                message="Image matches profile " + best.profile_id + " with confidence of " + str(best.confidence),
+                match_found=True,
+                profile_id=best.profile_id,
+                confidence=best.confidence,
+                candidates=candidates,
+            )
+        return IdentificationResponse(
+            message="Image does not match any profile",
+            match_found=False,
+            candidates=candidates,
+        )
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ServerOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
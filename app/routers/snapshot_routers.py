@@ -0,0 +1,55 @@
+import asyncio
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.models import SnapshotImportResponse
+from app.utils.compact_profile import BINARY_MEDIA_TYPE
+from app.utils.snapshot import SnapshotError, IncompatibleSnapshotError, iter_snapshot, import_snapshot
+from app.routers.profile_routers import profile_db
+
+router = APIRouter()
+
+@router.get(
+    "/snapshot",
+    response_class=StreamingResponse,
+    description="Streams every profile, or the changes since a sequence number, as a binary snapshot for replicas.",
+    summary="Exports profile snapshot",
+    tags=["snapshots"])
+async def export_snapshot(since: int = Query(0, ge=0)):
+    """
+    Exports the profile store as a chunked binary snapshot
+
+    Args:
+        since (int): Sequence number already imported by the replica, 0 exports every profile
+
+    Return:
+        StreamingResponse: Snapshot stream, a full snapshot if the changes since `since` are no longer known
+    """
+    return StreamingResponse(iter_snapshot(profile_db, since), media_type=BINARY_MEDIA_TYPE)
+
+@router.post(
+    "/snapshot",
+    response_model=SnapshotImportResponse,
+    description="Bulk-loads a binary snapshot exported by another node, without re-extracting any image.",
+    summary="Imports profile snapshot",
+    tags=["snapshots"])
+async def import_profile_snapshot(file: UploadFile = File(...), force: bool = Query(False)):
+    """
+    Imports a binary snapshot into the profile store
+
+    Args:
+        file (File): Snapshot exported by GET /snapshot or `python -m app.snapshot export`
+        force (bool): Import even if the snapshot was exported with other feature settings
+
+    Return:
+        SnapshotImportResponse: Snapshot kind, its sequence number to request the next delta from, and profiles imported and deleted
+
+    Error:
+        HTTPException: If the snapshot is incompatible with this node, or malformed
+    """
+    try:
+        result = await asyncio.to_thread(import_snapshot, profile_db, file.file, force)
+    except IncompatibleSnapshotError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SnapshotImportResponse(**result)
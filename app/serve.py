@@ -0,0 +1,164 @@
+"""
+Preforking server: models load once in a parent process, and uvicorn workers are forked
+from it so they share the loaded weights copy-on-write and are ready almost immediately.
+
+The parent imports the app and loads and warms up every model with a single torch
+thread (an OpenMP thread pool does not survive fork), freezes the garbage collector so
+shared objects stay untouched, binds the listening socket and forks the workers. Each
+worker sets its own torch thread budget and serves on the inherited socket. Workers
+that exit are re-forked from the parent, which still holds the loaded models.
+
+Usage:
+    python -m app.serve --workers 4 --host 0.0.0.0 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+import uvicorn
+from app.utils.analysis_params import PREFORK_WORKERS, PREFORK_RESTART_DELAY, TORCH_NUM_THREADS
+from app.utils.startup import startup_report
+
+def preload():
+    """
+    Import the app and load every model in the parent process.
+
+    Returns:
+        FastAPI: Application shared by the forked workers.
+    """
+    from app.main import app
+    from app.utils import model_registry
+
+    startup_report.mode = "prefork"
+    model_registry.load(num_threads=1)
+    startup_report.mark("models_loaded")
+
+    # Keep startup objects out of collections so workers never write to their shared pages
+    gc.collect()
+    gc.freeze()
+    return app
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """
+    Bind the listening socket shared by every worker.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind.
+
+    Returns:
+        socket.socket: Listening, inheritable socket.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app, sock: socket.socket, torch_threads: int, log_level: str):
+    """
+    Serve requests in a forked worker until it is told to stop.
+
+    Args:
+        app (FastAPI): Preloaded application.
+        sock (socket.socket): Inherited listening socket.
+        torch_threads (int): Intra-op thread budget for torch in this worker.
+        log_level (str): uvicorn log level.
+    """
+    import torch
+
+    # Undo the parent's handlers, uvicorn installs its own for graceful shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    startup_report.start_worker()
+    torch.set_num_threads(torch_threads)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, lifespan="on"))
+    server.run(sockets=[sock])
+
+def fork_worker(app, sock: socket.socket, torch_threads: int, log_level: str) -> int:
+    """
+    Fork one worker process.
+
+    Returns:
+        int: Pid of the worker.
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, torch_threads, log_level)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+def serve(host: str, port: int, workers: int, torch_threads: int = 0, log_level: str = "info"):
+    """
+    Run the preforking server until SIGTERM or SIGINT.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind.
+        workers (int): Number of worker processes.
+        torch_threads (int): torch threads per worker, 0 splits the CPUs evenly between workers.
+        log_level (str): uvicorn log level.
+    """
+    app = preload()
+    sock = bind_socket(host, port)
+    torch_threads = torch_threads or TORCH_NUM_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+    children = set()
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children.add(fork_worker(app, sock, torch_threads, log_level))
+    startup_report.mark("workers_forked")
+    print(f"Preforked {workers} workers in {startup_report.phases['workers_forked']:.2f}s on http://{host}:{port}", file=sys.stderr, flush=True)
+
+    # Replace workers that exit unexpectedly until asked to stop
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting", file=sys.stderr, flush=True)
+            time.sleep(PREFORK_RESTART_DELAY)
+            if not stopping:
+                children.add(fork_worker(app, sock, torch_threads, log_level))
+    sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind")
+    parser.add_argument("--workers", type=int, default=PREFORK_WORKERS, help="Number of worker processes")
+    parser.add_argument("--torch-threads", type=int, default=0, help="torch threads per worker (0 splits the CPUs evenly)")
+    parser.add_argument("--log-level", default="info", help="uvicorn log level")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.torch_threads, args.log_level)
+
+if __name__ == "__main__":
+    main()
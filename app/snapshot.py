@@ -0,0 +1,67 @@
+"""
+Export and import profile snapshots, so a new node loads its gallery without re-extracting images.
+
+`export` writes the local store, or only its changes since a sequence number, to a
+snapshot file. `import` bulk-loads a snapshot file, or streams one straight from a
+running node with `--url`. Import prints the snapshot's sequence number as JSON; pass it
+as `--since` next time to catch up with a small delta snapshot. Both commands work on the
+memory-mapped store directly, so they can run next to a live server.
+
+Usage:
+    python -m app.snapshot export gallery.snapshot
+    python -m app.snapshot import gallery.snapshot --store ./profile_store
+    python -m app.snapshot import --url http://primary:8000 --since 1200
+"""
+import argparse
+import json
+import sys
+import urllib.request
+from app.utils.analysis_params import PROFILE_STORE_PATH
+from app.utils.profile_store import MmapProfileStore
+from app.utils.snapshot import SnapshotError, iter_snapshot, import_snapshot
+
+def export_command(args) -> dict:
+    store = MmapProfileStore(args.store)
+    size = 0
+    with open(args.path, "wb") as f:
+        for chunk in iter_snapshot(store, args.since):
+            f.write(chunk)
+            size += len(chunk)
+    return {"path": args.path, "bytes": size}
+
+def import_command(args) -> dict:
+    store = MmapProfileStore(args.store)
+    if args.url:
+        with urllib.request.urlopen(f"{args.url.rstrip('/')}/snapshot?since={args.since}") as response:
+            return import_snapshot(store, response, args.force)
+    if not args.path:
+        raise SnapshotError("Give a snapshot file or --url")
+    with open(args.path, "rb") as f:
+        return import_snapshot(store, f, args.force)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write the local store to a snapshot file")
+    export_parser.add_argument("path", help="Snapshot file to write")
+    export_parser.add_argument("--since", type=int, default=0, help="Only export changes after this sequence number")
+    export_parser.add_argument("--store", default=PROFILE_STORE_PATH, help="Profile store directory")
+    export_parser.set_defaults(run=export_command)
+
+    import_parser = commands.add_parser("import", help="Load a snapshot file or a running node's snapshot into the local store")
+    import_parser.add_argument("path", nargs="?", help="Snapshot file to read")
+    import_parser.add_argument("--url", help="Base URL of a node to stream the snapshot from")
+    import_parser.add_argument("--since", type=int, default=0, help="With --url, only fetch changes after this sequence number")
+    import_parser.add_argument("--force", action="store_true", help="Import even if the feature settings differ")
+    import_parser.add_argument("--store", default=PROFILE_STORE_PATH, help="Profile store directory")
+    import_parser.set_defaults(run=import_command)
+
+    args = parser.parse_args()
+    try:
+        print(json.dumps(args.run(args)))
+    except SnapshotError as e:
+        sys.exit(f"error: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,14 @@
-from .profile import generate_profile, compare_profiles
-from .analysis_params import CONFIDENCE_THRESHOLD
\ No newline at end of file
+from .profile import generate_profile, generate_profile_async, generate_profile_from_bytes, generate_face_profiles_async, compare_profiles, compare_profile_batch, stack_profiles
+from .profile import verify_profile_async, verify_profile_from_bytes
+from .analysis_params import CONFIDENCE_THRESHOLD
+from .model_registry import model_registry
+from .batching import embedding_batcher
+from .executor import profile_executor, ServerOverloadedError
+from .embedding_index import EmbeddingIndex
+from .ann_index import IVFFlatIndex, create_embedding_index
+from .profile_store import MmapProfileStore, MemoryProfileStore, open_profile_store
+from .compact_profile import CompactProfile, as_compact
+from .metrics import metrics_registry
+from .feature_cache import feature_cache
+from .ingest import ImageUpload, UploadRejectedError, inspect_image, read_upload
+from .face_detection import FaceDetector, create_face_detector
\ No newline at end of file
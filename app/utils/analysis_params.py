@@ -1,11 +1,141 @@
+import hashlib
+import os
+
 # ANALYSIS CONSTANTS
 LANDMARK_MAX_DIFFERENCE = 200 # Normalization factor for landmark analysis
 LANDMARK_MODEL_PATH = './dlib_models/shape_predictor_68_face_landmarks_GTX.dat' # Current landmark model
+FEATURE_PIPELINE_VERSION = 2 # Bumped when the extraction code changes features, so cached profiles and snapshots of older versions are not reused
 LBP_TEXTURE_LEVELS = (24, 3) # Defines default parameters for lbph computation
 LBP_MAX_DISTANCE = 20 # Maximum expected chi square distance
+TEMPLATE_LANDMARK_TOLERANCE = 1.0 # Landmark differences within this many standard deviations of enrolled templates are ignored
+ENROLL_MAX_FILES = 32 # Maximum number of images added to a profile per enrollment request
+LBP_ENGINE = os.environ.get("LBP_ENGINE", "numpy") # LBP implementation ("numpy" for the vectorized engine or "skimage")
+LBP_MULTI_SCALE = os.environ.get("LBP_MULTI_SCALE", "0") == "1" # Concatenate histograms of LBP_MULTI_SCALE_LEVELS ahead of LBP_TEXTURE_LEVELS
+LBP_MULTI_SCALE_LEVELS = ((8, 1), (16, 2)) # Finer (P, R) levels added in multi-scale mode
+LBP_LEVELS = (*LBP_MULTI_SCALE_LEVELS, LBP_TEXTURE_LEVELS) if LBP_MULTI_SCALE else (LBP_TEXTURE_LEVELS,) # (P, R) levels making up the LBP descriptor
+LBP_GRID_SIZE = int(os.environ.get("LBP_GRID_SIZE", 1)) # Cells per side of the spatial histogram grid (1 histograms the whole image)
+
+# PREPROCESSING SETTINGS
+ANALYSIS_SIZE = (160, 160) # Resolution face crops are resized to for landmarks and FaceNet
+LBP_SIZE = (128, 128) # Resolution of the grayscale face crop used for LBP
+DECODE_DRAFT_SIZE = int(os.environ.get("DECODE_DRAFT_SIZE", 0)) # Minimum side length for reduced-resolution JPEG decoding (0 decodes at full resolution)
+FACE_CROP_MARGIN = 0.2 # Margin added around the detected face box, as a fraction of its size
+MULTI_FACE_DETECT_SIZE = 640 # Longest side of the view searched for faces in multi-face mode
+MULTI_FACE_MAX_FACES = 16 # Maximum number of faces analyzed per image in multi-face mode
+
+# FACE DETECTION SETTINGS
+FACE_DETECTOR = os.environ.get("FACE_DETECTOR", "dlib") # Face detector ("dlib" HOG, "haar" cascade, "dnn" ResNet SSD or "mtcnn")
+FACE_ALIGNMENT = os.environ.get("FACE_ALIGNMENT", "0") == "1" # Rotate every face crop about the eyes so they are level before FaceNet and LBP
+FACE_DETECT_SIZE = int(os.environ.get("FACE_DETECT_SIZE", 240)) # Longest side of the view searched for the face of single-face profiles
+FACE_HAAR_MODEL_PATH = os.environ.get("FACE_HAAR_MODEL_PATH", "") # Haar cascade XML ("" uses the cascade bundled with OpenCV)
+FACE_DNN_MODEL_PATH = os.environ.get("FACE_DNN_MODEL_PATH", "./dlib_models/res10_300x300_ssd_iter_140000.caffemodel") # OpenCV DNN detector weights
+FACE_DNN_CONFIG_PATH = os.environ.get("FACE_DNN_CONFIG_PATH", "./dlib_models/deploy.prototxt") # OpenCV DNN detector network definition
+FACE_DNN_MIN_CONFIDENCE = 0.5 # Minimum score of OpenCV DNN detections
+FACE_MTCNN_MIN_CONFIDENCE = 0.9 # Minimum probability of MTCNN detections
+
+# UPLOAD SETTINGS
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 20 * 1024 * 1024)) # Largest accepted image upload in bytes
+UPLOAD_MAX_PIXELS = int(os.environ.get("UPLOAD_MAX_PIXELS", 40_000_000)) # Largest accepted image in pixels, checked from the header before decoding
+UPLOAD_FORMATS = ("JPEG", "PNG", "WEBP") # Image formats accepted, sniffed from the file content
+UPLOAD_HEADER_BYTES = 1024 * 1024 # Bytes read at most while looking for the image dimensions
+UPLOAD_CHUNK_SIZE = 64 * 1024 # Bytes read per chunk from uploads
+FACE_PRECHECK_MIN_PIXELS = int(os.environ.get("FACE_PRECHECK_MIN_PIXELS", 4_000_000)) # Images this large are searched for a face on a reduced decode before the full decode (0 disables)
+FACE_PRECHECK_UPSAMPLE = 1 # Detector upsampling of the pre-check view, finding smaller faces than the analysis search
 
 # CONFIDENCE WEIGHTS
 LM_WEIGHT = 0.50
 DF_WEIGHT = 0.395
 LBPH_WEIGHT = 0.10
-CONFIDENCE_THRESHOLD = 65 # Threshold for deepfake confidence (out of 100)
\ No newline at end of file
+CONFIDENCE_THRESHOLD = 65 # Threshold for deepfake confidence (out of 100)
+IDENTIFY_TOP_K = 10 # Embedding search candidates re-ranked with the full profile comparison
+
+# CASCADE SETTINGS
+CASCADE_MODE = os.environ.get("CASCADE_MODE", "off") # Early exit of single-image verification ("off", "exact" skips FaceNet only when no embedding score could change the verdict, or "fast" assumes CASCADE_FACENET_RANGE)
+CASCADE_FACENET_RANGE = tuple(float(v) for v in os.environ.get("CASCADE_FACENET_RANGE", "50,100").split(",")) # FaceNet confidences assumed in "fast" mode (50 is a cosine similarity of 0)
+
+# EMBEDDING INDEX SETTINGS
+INDEX_BACKEND = os.environ.get("INDEX_BACKEND", "exact") # Embedding index used for identification ("exact" or "ivf")
+IVF_NLIST = int(os.environ.get("IVF_NLIST", 256)) # Number of k-means partitions of the IVF index
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", 16)) # Partitions scanned per search, higher trades latency for recall
+IVF_MIN_TRAIN_SIZE = 10000 # Gallery size below which the IVF index searches exhaustively
+IVF_TRAIN_SAMPLE = 65536 # Maximum number of embeddings sampled to train centroids
+IVF_TRAIN_ITERATIONS = 20 # k-means iterations per training run
+IVF_RETRAIN_INTERVAL = 300 # Seconds between background checks for centroid re-training
+IVF_RETRAIN_GROWTH = 0.5 # Fractional gallery growth since last training that triggers re-training
+
+# MODEL SETTINGS
+FACENET_PRETRAINED = 'vggface2' # Pretrained weights for the FaceNet model
+FACENET_BACKEND = os.environ.get("FACENET_BACKEND", "eager") # FaceNet inference backend ("eager", or a comma-separated combination of "channels_last", "int8" and "torchscript")
+FACENET_PARITY_MIN_COSINE = 0.999 # Minimum cosine similarity to fp32 embeddings for an optimized backend to pass the parity check
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", 0)) # Intra-op thread budget for torch (0 keeps torch default)
+
+# MICRO-BATCHING SETTINGS
+MICRO_BATCHING_ENABLED = os.environ.get("MICRO_BATCHING_ENABLED", "1") == "1" # Route FaceNet inference through the micro-batcher
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", 16)) # Maximum number of images per batched forward pass
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", 5)) # Maximum time a request waits for its batch to fill
+
+# EXECUTION SETTINGS
+EXECUTOR_BACKEND = os.environ.get("EXECUTOR_BACKEND", "thread") # Worker pool running profile generation ("thread" or "process")
+EXECUTOR_MAX_WORKERS = int(os.environ.get("EXECUTOR_MAX_WORKERS", min(4, os.cpu_count() or 1))) # Number of workers in the pool
+EXECUTOR_MAX_QUEUE = int(os.environ.get("EXECUTOR_MAX_QUEUE", 32)) # Admitted requests allowed to wait for a worker before returning 503
+EXECUTOR_RETRY_AFTER = 1 # Seconds sent in the Retry-After header when saturated
+PREFORK_WORKERS = int(os.environ.get("PREFORK_WORKERS", min(4, os.cpu_count() or 1))) # Worker processes forked by `python -m app.serve`
+PREFORK_RESTART_DELAY = 1 # Seconds before the preforking parent replaces a worker that exited
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", 8)) # Images in flight per bulk profile creation request
+
+# PROFILE STORE SETTINGS
+PROFILE_STORE_BACKEND = os.environ.get("PROFILE_STORE_BACKEND", "mmap") # Profile storage ("mmap" for durable memory-mapped files or "memory")
+PROFILE_STORE_PATH = os.environ.get("PROFILE_STORE_PATH", "./profile_store") # Directory of the memory-mapped profile store
+PROFILE_STORE_SHARDS = int(os.environ.get("PROFILE_STORE_SHARDS", 64)) # Lock-striped shards of the memory profile store
+BULK_MAX_IDS = 1000 # Maximum number of profile ids per bulk get or delete request
+STORE_COMPACTION_RATIO = 0.3 # Fraction of deleted rows that triggers compaction
+STORE_COMPACTION_MIN_ROWS = 1024 # Minimum number of deleted rows before compacting
+SNAPSHOT_CHUNK_ROWS = 1024 # Profiles per frame of exported snapshots (about 2.3 MB)
+
+# JOB QUEUE SETTINGS
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", "./job_queue.sqlite3") # SQLite database holding queued verification jobs
+JOB_BATCH_SIZE = int(os.environ.get("JOB_BATCH_SIZE", 16)) # Tasks leased per scheduling round, across jobs
+JOB_MAX_IN_FLIGHT = int(os.environ.get("JOB_MAX_IN_FLIGHT", max(1, EXECUTOR_MAX_WORKERS // 2))) # Job images generated at once, leaving workers for synchronous requests
+JOB_MAX_TASKS = int(os.environ.get("JOB_MAX_TASKS", 10000)) # Maximum (profile, image) pairs per job
+JOB_SUBMIT_BATCH = 32 # Images written per transaction while a job is submitted, bounding the images held in memory
+JOB_LEASE_SECONDS = 120 # Seconds before tasks held by a worker that died are handed out again
+JOB_POLL_INTERVAL = 0.2 # Seconds between queue checks while idle or long-polling
+JOB_MAX_WAIT = 30 # Maximum seconds a status request long-polls for a job to finish
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", 24 * 3600)) # Seconds finished jobs and their results are kept
+
+# METRICS SETTINGS
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "1") == "1" # Send per-stage timings in a Server-Timing response header
+
+# VIDEO SETTINGS
+VIDEO_SAMPLE_FPS = 4 # Initial frames analyzed per second of video
+VIDEO_MIN_SAMPLE_FPS = 1 # Sampling rate reached while the confidence stays stable
+VIDEO_MAX_SAMPLE_FPS = 10 # Sampling rate reached while the confidence changes quickly
+VIDEO_STABLE_DELTA = 5 # Confidence spread within a batch below which sampling slows down
+VIDEO_DETECT_SIZE = 480 # Longest side of the frame view used for face detection and tracking
+VIDEO_KEYFRAME_INTERVAL = 5 # Sampled frames between full face detections, the face is tracked in between
+VIDEO_TRACKING_MIN_PSR = 7 # Tracker peak-to-sidelobe ratio below which the face is re-detected
+VIDEO_BATCH_SIZE = 8 # Sampled frames analyzed per batched forward pass
+VIDEO_MIN_FRAMES = 8 # Frames analyzed before the verdict may settle early
+VIDEO_MAX_FRAMES = 300 # Maximum number of frames analyzed per video
+VIDEO_CONFIDENCE_Z = 2.58 # z-score separating the mean confidence from the threshold for the verdict to settle (99%)
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm") # Accepted video file extensions
+VIDEO_MAX_BYTES = int(os.environ.get("VIDEO_MAX_BYTES", 200 * 1024 * 1024)) # Largest accepted video upload in bytes
+
+# FEATURE CACHE SETTINGS
+FEATURE_CACHE_ENABLED = os.environ.get("FEATURE_CACHE_ENABLED", "1") == "1" # Reuse profiles generated from identical upload bytes
+FEATURE_CACHE_MAX_BYTES = int(os.environ.get("FEATURE_CACHE_MAX_BYTES", 64 * 1024 * 1024)) # Memory budget of the cache (about 2 KB per profile)
+FEATURE_CACHE_PATH = os.environ.get("FEATURE_CACHE_PATH", "") # Directory persisting cached profiles across restarts ("" keeps them in memory only)
+
+def feature_fingerprint() -> str:
+    """
+    Hash of every setting that changes extracted features, used to version cached profiles.
+
+    Returns:
+        str: Hex digest that changes whenever a feature-affecting setting changes.
+    """
+    settings = (
+        FEATURE_PIPELINE_VERSION, LANDMARK_MODEL_PATH, LBP_LEVELS, LBP_GRID_SIZE, ANALYSIS_SIZE, LBP_SIZE, DECODE_DRAFT_SIZE,
+        FACE_CROP_MARGIN, FACENET_PRETRAINED, FACENET_BACKEND,
+        FACE_DETECTOR, FACE_ALIGNMENT, FACE_DETECT_SIZE,
+    )
+    return hashlib.sha256(repr(settings).encode()).hexdigest()[:16]
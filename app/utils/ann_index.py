@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+import weakref
+import numpy as np
+from .analysis_params import (
+    INDEX_BACKEND, IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN_SIZE, IVF_TRAIN_SAMPLE,
+    IVF_TRAIN_ITERATIONS, IVF_RETRAIN_INTERVAL, IVF_RETRAIN_GROWTH,
+)
+from .embedding_index import EmbeddingIndex, _normalize
+
+class IVFFlatIndex:
+    """
+    Approximate cosine search using an inverted file (IVF-flat) index.
+
+    Embeddings are partitioned by spherical k-means into `nlist` inverted lists, each
+    stored as its own contiguous EmbeddingIndex. A search only scans the `nprobe`
+    lists whose centroids are closest to the probe. Until the gallery reaches
+    `min_train_size` embeddings the index stays untrained and searches exhaustively.
+
+    Centroids are re-trained in a background thread once the gallery has grown by
+    `retrain_growth` since the last training. Writes made while re-training are
+    journaled and replayed onto the rebuilt lists before they are swapped in.
+
+    Args:
+        dim (int): Embedding dimension.
+        nlist (int): Number of inverted lists (k-means partitions).
+        nprobe (int): Default number of lists scanned per search.
+        min_train_size (int): Gallery size needed before centroids are trained.
+        retrain_interval (float): Seconds between background re-training checks, 0 disables the thread.
+        retrain_growth (float): Fractional growth since last training that triggers re-training.
+    """
+    def __init__(self, dim: int = 512, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE,
+                 min_train_size: int = IVF_MIN_TRAIN_SIZE, retrain_interval: float = IVF_RETRAIN_INTERVAL,
+                 retrain_growth: float = IVF_RETRAIN_GROWTH):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = max(min_train_size, nlist)
+        self.retrain_growth = retrain_growth
+        self.centroids = None
+        self.trained_size = 0
+        self._lists = [EmbeddingIndex(dim, initial_capacity=1024)]
+        self._list_of = {}
+        self._journal = None
+        self._lock = threading.RLock()
+        self._train_lock = threading.Lock()
+
+        if retrain_interval > 0:
+            self._stop = threading.Event()
+            self._start_retraining(retrain_interval)
+
+            # Threads do not survive fork, so preforked workers restart their own re-training thread
+            index = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: index() is not None and index()._restart_after_fork(retrain_interval))
+
+    def __len__(self) -> int:
+        return len(self._list_of)
+
+    def __contains__(self, profile_id: str) -> bool:
+        return profile_id in self._list_of
+
+    def add(self, profile_id: str, embedding) -> None:
+        """
+        Insert or replace the embedding of a profile.
+
+        Args:
+            profile_id (str): Id of the profile.
+            embedding (array-like): Embedding of the profile with `dim` elements.
+        """
+        vector = _normalize(embedding)
+        with self._lock:
+            self._remove_locked(profile_id)
+            list_number = self._assign(vector[None, :])[0] if self.centroids is not None else 0
+            self._lists[list_number].add(profile_id, vector)
+            self._list_of[profile_id] = list_number
+            if self._journal is not None:
+                self._journal.append((profile_id, vector))
+
+    def remove(self, profile_id: str) -> None:
+        """
+        Remove a profile from the index, ignoring unknown ids.
+
+        Args:
+            profile_id (str): Id of the profile.
+        """
+        with self._lock:
+            self._remove_locked(profile_id)
+            if self._journal is not None:
+                self._journal.append((profile_id, None))
+
+    def search(self, embedding, k: int, nprobe: int = None) -> list[tuple[str, float]]:
+        """
+        Find the approximately most similar profiles to the probe.
+
+        Args:
+            embedding (array-like): Probe embedding with `dim` elements.
+            k (int): Number of candidates to return.
+            nprobe (int): Number of lists to scan, defaults to the index setting.
+
+        Returns:
+            list[tuple[str, float]]: Up to k (profile id, cosine similarity) pairs, most similar first.
+        """
+        query = _normalize(embedding)
+        with self._lock:
+            if self.centroids is None:
+                probed = self._lists
+            else:
+                nprobe = min(nprobe or self.nprobe, self.nlist)
+                closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+                probed = [self._lists[i] for i in closest]
+
+            results = []
+            for inverted_list in probed:
+                results.extend(inverted_list.search(query, k))
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:k]
+
+    def vectors(self) -> tuple[list[str], np.ndarray]:
+        """
+        Copy out every stored profile id and its normalized embedding.
+
+        Returns:
+            tuple[list[str], numpy.ndarray]: Profile ids and the matching (N, dim) embedding matrix.
+        """
+        with self._lock:
+            ids, matrices = [], []
+            for inverted_list in self._lists:
+                list_ids, matrix = inverted_list.vectors()
+                ids.extend(list_ids)
+                matrices.append(matrix)
+        return ids, np.concatenate(matrices) if matrices else np.empty((0, self.dim), dtype=np.float32)
+
+    def train(self, seed: int = 0) -> None:
+        """
+        Train centroids on the current gallery and rebuild the inverted lists.
+
+        Training and list assignment run without blocking searches or writes.
+
+        Args:
+            seed (int): Seed for centroid initialization and sampling.
+        """
+        with self._train_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                ids, vectors = self.vectors()
+                if len(ids) < self.min_train_size:
+                    return
+
+                # Train on a sample, then assign every embedding to its closest centroid
+                rng = np.random.default_rng(seed)
+                sample = vectors[rng.choice(len(vectors), min(len(vectors), IVF_TRAIN_SAMPLE), replace=False)]
+                centroids = spherical_kmeans(sample, self.nlist, IVF_TRAIN_ITERATIONS, rng)
+                assignments = _assign_to(centroids, vectors)
+
+                lists = [EmbeddingIndex(self.dim, initial_capacity=max(16, int(count))) for count in np.bincount(assignments, minlength=self.nlist)]
+                list_of = {}
+                for profile_id, vector, list_number in zip(ids, vectors, assignments):
+                    lists[list_number].add(profile_id, vector)
+                    list_of[profile_id] = int(list_number)
+
+                with self._lock:
+                    # Replay writes made while training, then swap in the rebuilt lists
+                    for profile_id, vector in self._journal:
+                        if profile_id in list_of:
+                            lists[list_of.pop(profile_id)].remove(profile_id)
+                        if vector is not None:
+                            list_number = int(_assign_to(centroids, vector[None, :])[0])
+                            lists[list_number].add(profile_id, vector)
+                            list_of[profile_id] = list_number
+                    self.centroids = centroids
+                    self._lists = lists
+                    self._list_of = list_of
+                    self.trained_size = len(list_of)
+            finally:
+                with self._lock:
+                    self._journal = None
+
+    def needs_training(self) -> bool:
+        """
+        Check whether the gallery is large enough and has grown enough to (re-)train centroids.
+
+        Returns:
+            bool: True if training is due.
+        """
+        size = len(self)
+        if size < self.min_train_size:
+            return False
+        return self.centroids is None or size >= self.trained_size * (1 + self.retrain_growth)
+
+    def close(self):
+        """
+        Stop the background re-training thread.
+        """
+        if hasattr(self, "_stop"):
+            self._stop.set()
+
+    def _remove_locked(self, profile_id: str):
+        list_number = self._list_of.pop(profile_id, None)
+        if list_number is not None:
+            self._lists[list_number].remove(profile_id)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return _assign_to(self.centroids, vectors)
+
+    def _start_retraining(self, interval: float):
+        thread = threading.Thread(target=self._retrain_loop, args=(interval,), daemon=True, name="ivf-retrain")
+        thread.start()
+
+    def _restart_after_fork(self, interval: float):
+        # Locks may have been held by the parent's re-training thread, and its journal is abandoned
+        self._lock = threading.RLock()
+        self._train_lock = threading.Lock()
+        self._journal = None
+        self._stop = threading.Event()
+        self._start_retraining(interval)
+
+    def _retrain_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            if self.needs_training():
+                self.train(seed=int(time.time()))
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Cluster unit vectors by cosine similarity.
+
+    Args:
+        vectors (numpy.ndarray): (N, dim) matrix of L2-normalized vectors.
+        k (int): Number of clusters.
+        iterations (int): Number of assignment/update rounds.
+        rng (numpy.random.Generator): Random generator for initialization.
+
+    Returns:
+        numpy.ndarray: (k, dim) matrix of L2-normalized centroids.
+    """
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign_to(centroids, vectors)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+
+        # Reseed empty clusters with random vectors
+        empty = np.bincount(assignments, minlength=k) == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+def _assign_to(centroids: np.ndarray, vectors: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    # Closest centroid per vector, chunked to bound the similarity matrix size
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        assignments[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+    return assignments
+
+def create_embedding_index(backend: str = INDEX_BACKEND):
+    """
+    Create the embedding index selected for identification.
+
+    Args:
+        backend (str): "exact" for brute-force search or "ivf" for the approximate IVF-flat index.
+
+    Returns:
+        EmbeddingIndex | IVFFlatIndex: Empty embedding index.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "exact":
+        return EmbeddingIndex()
+    if backend == "ivf":
+        return IVFFlatIndex()
+    raise ValueError(f"Unknown index backend: {backend}")
@@ -0,0 +1,193 @@
+from __future__ import annotations
+import asyncio
+import threading
+import time
+import numpy as np
+from .analysis_params import MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS
+from .deep_analysis import embed_image_tensors
+from .lazy_imports import lazy_import
+from .metrics import BATCH_SIZE, BATCH_QUEUE_WAIT
+
+torch = lazy_import("torch")
+
+class BatcherStats:
+    """
+    Running statistics for the embedding micro-batcher.
+
+    Attributes:
+        batches (int): Number of batched forward passes executed.
+        items (int): Number of images embedded.
+        batch_sizes (dict): Histogram of batch sizes (size -> number of batches).
+        total_queue_wait (float): Summed seconds items spent queued before their forward pass.
+        max_queue_wait (float): Longest queue wait observed in seconds.
+        total_inference_time (float): Summed seconds spent in batched forward passes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all collected statistics.
+        """
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = {}
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_inference_time = 0.0
+
+    def record(self, batch_size: int, queue_waits: list[float], inference_time: float):
+        """
+        Record one executed batch.
+
+        Args:
+            batch_size (int): Number of images in the batch.
+            queue_waits (list[float]): Seconds each item waited in the queue.
+            inference_time (float): Seconds spent in the forward pass.
+        """
+        BATCH_SIZE.observe(batch_size)
+        for wait in queue_waits:
+            BATCH_QUEUE_WAIT.observe(wait)
+        with self._lock:
+            self.batches += 1
+            self.items += batch_size
+            self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+            self.total_queue_wait += sum(queue_waits)
+            self.max_queue_wait = max(self.max_queue_wait, max(queue_waits))
+            self.total_inference_time += inference_time
+
+    def snapshot(self) -> dict:
+        """
+        Summarize the collected statistics.
+
+        Returns:
+            dict: Batch counts, batch size histogram, mean batch size and queue wait figures in milliseconds.
+        """
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "mean_queue_wait_ms": 1000 * self.total_queue_wait / self.items if self.items else 0.0,
+                "max_queue_wait_ms": 1000 * self.max_queue_wait,
+                "mean_inference_ms": 1000 * self.total_inference_time / self.batches if self.batches else 0.0,
+            }
+
+class EmbeddingBatcher:
+    """
+    Async micro-batcher in front of the FaceNet model.
+
+    Preprocessed tensors submitted by concurrent requests are collected until either
+    `max_batch_size` items are queued or the oldest item has waited `max_wait_ms`,
+    then embedded with a single batched forward pass off the event loop.
+
+    Args:
+        max_batch_size (int): Maximum number of images per forward pass.
+        max_wait_ms (float): Maximum time the first queued image waits for its batch to fill.
+
+    Attributes:
+        stats (BatcherStats): Batch size and queue wait statistics.
+    """
+    def __init__(self, max_batch_size: int = MICRO_BATCH_MAX_SIZE, max_wait_ms: float = MICRO_BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = BatcherStats()
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of images waiting for a forward pass.
+        """
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        """
+        Start the batching worker on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._worker = loop.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the batching worker, failing any requests still queued.
+        """
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher stopped"))
+        self._worker = None
+
+    async def embed(self, image_tensor: torch.Tensor) -> np.ndarray:
+        """
+        Queue a preprocessed image for the next batched forward pass.
+
+        Args:
+            image_tensor (torch.Tensor): Preprocessed image with shape (1, 3, 160, 160).
+
+        Returns:
+            numpy.ndarray: Embeddings with shape (1, 512).
+        """
+        # Worker is bound to an event loop, restart it when called from a new one
+        if self._loop is not asyncio.get_running_loop() or self._worker is None or self._worker.done():
+            await self.start()
+
+        future = self._loop.create_future()
+        await self._queue.put((image_tensor, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        # Block for the first item, then fill the batch until full or the deadline passes
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            dequeued_at = time.perf_counter()
+            tensors = torch.cat([tensor for tensor, _, _ in batch])
+
+            try:
+                start = time.perf_counter()
+                embeddings = await asyncio.to_thread(embed_image_tensors, tensors)
+                inference_time = time.perf_counter() - start
+            except (Exception, asyncio.CancelledError) as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e if isinstance(e, Exception) else RuntimeError("Embedding batcher stopped"))
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                continue
+
+            self.stats.record(len(batch), [dequeued_at - queued_at for _, _, queued_at in batch], inference_time)
+
+            # Fan embeddings back out to the awaiting requests
+            for i, (_, future, _) in enumerate(batch):
+                if not future.done():
+                    future.set_result(embeddings[i:i + 1])
+
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,93 @@
+import asyncio
+import tarfile
+import zipfile
+from .analysis_params import BULK_CONCURRENCY, UPLOAD_MAX_BYTES
+from .executor import ServerOverloadedError
+from .profile import generate_profile_from_bytes
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+def iter_archive_images(archive_file, filename: str):
+    """
+    Lazily iterate over the images stored in a zip or tar archive.
+
+    Args:
+        archive_file (file-like): Seekable binary file containing the archive.
+        filename (str): Name of the uploaded archive, used to pick the archive format.
+
+    Yields:
+        tuple[str, bytes]: Member name and raw image bytes, one image at a time. Reads stop one byte past
+            UPLOAD_MAX_BYTES, so oversized members are rejected without being fully decompressed.
+
+    Raises:
+        ValueError: If the archive is neither a zip nor a tar archive.
+    """
+    if filename.endswith(".zip"):
+        with zipfile.ZipFile(archive_file) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    with archive.open(member) as image_file:
+                        yield member.filename, image_file.read(UPLOAD_MAX_BYTES + 1)
+    elif filename.endswith((".tar", ".tar.gz", ".tgz")):
+        # Streaming mode reads members sequentially without seeking
+        with tarfile.open(fileobj=archive_file, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield member.name, archive.extractfile(member).read(UPLOAD_MAX_BYTES + 1)
+    else:
+        raise ValueError("Invalid Archive Format")
+
+async def _generate_with_backoff(image_bytes: bytes):
+    # Bulk work waits for capacity instead of failing like interactive requests
+    while True:
+        try:
+            return await generate_profile_from_bytes(image_bytes)
+        except ServerOverloadedError as e:
+            await asyncio.sleep(e.retry_after)
+
+async def stream_profiles(images, concurrency: int = BULK_CONCURRENCY):
+    """
+    Generate profiles for many images with a bounded number in flight.
+
+    Images overlap in the worker pool (decode, detection, LBP) and share batched
+    FaceNet forward passes through the micro-batcher. Only `concurrency` images are
+    held in memory at a time. Images are pulled from `images` in a thread, so reading
+    uploads and decompressing archives never blocks the event loop.
+
+    Args:
+        images (iterable): Iterable of (name, image bytes) pairs. An exception in place of
+            the bytes marks a skipped entry and is reported as its result.
+        concurrency (int): Maximum number of images processed at once.
+
+    Yields:
+        tuple: Image name and either the generated Profile or the exception raised for it,
+            in completion order.
+    """
+    async def run(name, image_bytes):
+        try:
+            return name, await _generate_with_backoff(image_bytes)
+        except Exception as e:
+            return name, e
+
+    iterator = iter(images)
+    pending = set()
+    try:
+        while (item := await asyncio.to_thread(next, iterator, None)) is not None:
+            name, image_bytes = item
+            if isinstance(image_bytes, Exception):
+                yield name, image_bytes
+                continue
+            pending.add(asyncio.ensure_future(run(name, image_bytes)))
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Client went away, drop work that has not completed
+        for task in pending:
+            task.cancel()
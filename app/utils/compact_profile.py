@@ -0,0 +1,189 @@
+import struct
+import numpy as np
+from app.models import Profile
+from .analysis_params import LBP_LEVELS, LBP_GRID_SIZE
+from .landmark_analysis import DISTANCE_KEYS
+
+EMBEDDING_SIZE = 512
+LBP_BINS = sum(P + 2 for P, _ in LBP_LEVELS) * LBP_GRID_SIZE ** 2
+
+# Binary wire format: magic, version, vector lengths, enrollment count, then little-endian float32 vectors
+BINARY_MAGIC = b"IDFP"
+BINARY_VERSION = 2
+BINARY_HEADER_V1 = struct.Struct("<4sBxHHH")
+BINARY_HEADER = struct.Struct("<4sBxHHHI")
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+class CompactProfile:
+    """
+    Internal facial profile held as fixed-order float32 vectors.
+
+    Used everywhere profiles are stored or compared. The Pydantic `Profile` is only
+    built at the API boundary for JSON responses.
+
+    A profile enrolled from several images is a template: its vectors are the means over
+    those images, and the per-distance landmark variance records how much the face varied
+    between them. A profile from a single image has a count of one and zero variance.
+
+    Attributes:
+        landmarks (numpy.ndarray): Landmark distances ordered as DISTANCE_KEYS, or their mean.
+        embedding (numpy.ndarray): FaceNet embedding, or the mean embedding.
+        lbp (numpy.ndarray): Normalized LBP histogram, or the mean histogram.
+        count (int): Number of images enrolled into the profile.
+        landmark_variance (numpy.ndarray): Population variance of each landmark distance across enrolled images.
+    """
+    __slots__ = ("landmarks", "embedding", "lbp", "count", "landmark_variance")
+
+    def __init__(self, landmarks, embedding, lbp, count: int = 1, landmark_variance=None):
+        self.landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1)
+        self.embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        self.lbp = np.asarray(lbp, dtype=np.float32).reshape(-1)
+        self.count = int(count)
+        if landmark_variance is None:
+            self.landmark_variance = np.zeros_like(self.landmarks)
+        else:
+            self.landmark_variance = np.asarray(landmark_variance, dtype=np.float32).reshape(-1)
+
+    def __getstate__(self):
+        return (self.landmarks, self.embedding, self.lbp, self.count, self.landmark_variance)
+
+    def __setstate__(self, state):
+        self.landmarks, self.embedding, self.lbp, self.count, self.landmark_variance = state
+
+    def merge(self, other) -> "CompactProfile":
+        """
+        Combine two profiles into the template of all their enrolled images.
+
+        Means are updated incrementally and the landmark variance is combined with the
+        parallel form of Welford's algorithm, so adding images one at a time or merging
+        whole templates gives the same template as computing it from every image at once.
+
+        Args:
+            other (CompactProfile | Profile): Profile or template to add.
+
+        Returns:
+            CompactProfile: New template over the images of both profiles.
+        """
+        other = as_compact(other)
+        count = self.count + other.count
+        weight = other.count / count
+
+        def mean(a, b):
+            a = a.astype(np.float64)
+            return a + (b.astype(np.float64) - a) * weight
+
+        delta = other.landmarks.astype(np.float64) - self.landmarks.astype(np.float64)
+        squares = (
+            self.landmark_variance.astype(np.float64) * self.count
+            + other.landmark_variance.astype(np.float64) * other.count
+            + delta ** 2 * self.count * weight
+        )
+        return CompactProfile(
+            landmarks=mean(self.landmarks, other.landmarks),
+            embedding=mean(self.embedding, other.embedding),
+            lbp=mean(self.lbp, other.lbp),
+            count=count,
+            landmark_variance=squares / count,
+        )
+
+    @classmethod
+    def from_profile(cls, profile: Profile) -> "CompactProfile":
+        """
+        Build a compact profile from its Pydantic representation.
+
+        Args:
+            profile (Profile): Profile with landmark distance dict and float lists.
+
+        Returns:
+            CompactProfile: Equivalent compact profile.
+        """
+        variance = profile.landmark_variance
+        return cls(
+            landmarks=[profile.landmark_distances[key] for key in DISTANCE_KEYS],
+            embedding=profile.deep_features,
+            lbp=profile.lbp_histogram,
+            count=profile.enrollment_count,
+            landmark_variance=None if variance is None else [variance[key] for key in DISTANCE_KEYS],
+        )
+
+    def to_profile(self) -> Profile:
+        """
+        Build the Pydantic representation used in JSON responses.
+
+        Returns:
+            Profile: Profile with landmark distance dict and float lists.
+        """
+        return Profile(
+            landmark_distances=dict(zip(DISTANCE_KEYS, self.landmarks.tolist())),
+            deep_features=[self.embedding.tolist()],
+            lbp_histogram=self.lbp.tolist(),
+            enrollment_count=self.count,
+            landmark_variance=dict(zip(DISTANCE_KEYS, self.landmark_variance.tolist())),
+        )
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize to the binary wire format.
+
+        Returns:
+            bytes: Header followed by the raw float32 landmark, embedding, LBP and landmark variance vectors.
+        """
+        header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(self.landmarks), len(self.embedding), len(self.lbp), self.count)
+        vectors = (self.landmarks, self.embedding, self.lbp, self.landmark_variance)
+        return b"".join([header] + [np.ascontiguousarray(vector, dtype="<f4").data for vector in vectors])
+
+    @classmethod
+    def from_bytes(cls, data) -> "CompactProfile":
+        """
+        Deserialize from the binary wire format without copying the vectors.
+
+        Version 1 profiles, written before templates, load as single-image profiles.
+
+        Args:
+            data (bytes-like): Serialized profile.
+
+        Returns:
+            CompactProfile: Profile whose vectors are read-only views into `data`.
+
+        Raises:
+            ValueError: If the data is not a serialized profile.
+        """
+        if len(data) < BINARY_HEADER_V1.size:
+            raise ValueError("Invalid binary profile")
+        magic, version = BINARY_HEADER_V1.unpack_from(data)[:2]
+        if magic != BINARY_MAGIC or version not in (1, BINARY_VERSION):
+            raise ValueError("Invalid binary profile")
+        if version == 1:
+            header = BINARY_HEADER_V1
+            _, _, n_landmarks, n_embedding, n_lbp = header.unpack_from(data)
+            count, n_variance = 1, 0
+        else:
+            header = BINARY_HEADER
+            if len(data) < header.size:
+                raise ValueError("Invalid binary profile")
+            _, _, n_landmarks, n_embedding, n_lbp, count = header.unpack_from(data)
+            n_variance = n_landmarks
+        if len(data) != header.size + 4 * (n_landmarks + n_embedding + n_lbp + n_variance):
+            raise ValueError("Invalid binary profile length")
+
+        vectors = np.frombuffer(data, dtype="<f4", offset=header.size)
+        profile = cls.__new__(cls)
+        offsets = np.cumsum([0, n_landmarks, n_embedding, n_lbp])
+        profile.landmarks = vectors[:offsets[1]]
+        profile.embedding = vectors[offsets[1]:offsets[2]]
+        profile.lbp = vectors[offsets[2]:offsets[3]]
+        profile.count = count
+        profile.landmark_variance = vectors[offsets[3]:] if n_variance else np.zeros(n_landmarks, dtype=np.float32)
+        return profile
+
+def as_compact(profile) -> CompactProfile:
+    """
+    Return a profile as a CompactProfile, converting Pydantic profiles.
+
+    Args:
+        profile (CompactProfile | Profile): Profile in either representation.
+
+    Returns:
+        CompactProfile: Compact profile.
+    """
+    return profile if isinstance(profile, CompactProfile) else CompactProfile.from_profile(profile)
@@ -1,9 +1,21 @@
-from facenet_pytorch import InceptionResnetV1
-import torch
+from __future__ import annotations
+from functools import lru_cache
 import cv2
 import numpy as np
-from torchvision import transforms
-from sklearn.metrics.pairwise import cosine_similarity
+from .analysis_params import ANALYSIS_SIZE
+from .lazy_imports import lazy_import
+from .model_registry import model_registry
+
+torch = lazy_import("torch")
+transforms = lazy_import("torchvision.transforms")
+
+@lru_cache(maxsize=None)
+def facenet_transform():
+    # Tensor conversion and normalization expected by FaceNet, built on first use
+    return transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
+    ])
 
 def image_preprocess(image):
     """
@@ -17,16 +29,22 @@ def image_preprocess(image):
     """
     # Convert to RGB and resize
     image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image_rgb = cv2.resize(image, (160, 160))
+    image_rgb = cv2.resize(image_rgb, ANALYSIS_SIZE)
 
-    # Convert to tensor and normalize
-    transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-    ])
-    image_tensor = transform(image_rgb)
+    return rgb_to_tensor(image_rgb)
 
-    # Add a batch dimension
+def rgb_to_tensor(image_rgb):
+    """
+    Convert an RGB image already at FaceNet input resolution into a model input tensor.
+
+    Args:
+        image_rgb (numpy.ndarray): Input image in RGB format at ANALYSIS_SIZE.
+
+    Returns:
+        torch.Tensor: Normalized image tensor with a batch dimension.
+    """
+    # Convert to tensor, normalize and add a batch dimension
+    image_tensor = facenet_transform()(image_rgb)
     image_tensor = image_tensor.unsqueeze(0)
 
     return image_tensor
@@ -41,14 +59,25 @@ def extract_deep_features(image):
     Returns:
         numpy.ndarray: Embeddings extracted from the image.
     """
-    # Load FaceNet model
-    model = InceptionResnetV1(pretrained='vggface2').eval()
-
     image_tensor = image_preprocess(image)
 
+    return embed_image_tensors(image_tensor)
+
+def embed_image_tensors(image_tensors: torch.Tensor) -> np.ndarray:
+    """
+    Run a batched FaceNet forward pass over preprocessed image tensors.
+
+    Args:
+        image_tensors (torch.Tensor): Batch of preprocessed images with shape (N, 3, 160, 160).
+
+    Returns:
+        numpy.ndarray: Embeddings with shape (N, 512), one row per input image.
+    """
+    # Use resident FaceNet model through the configured inference backend
+    model = model_registry.facenet
+
     # Calculate Embeddings
-    with torch.no_grad():
-        embeddings = model(image_tensor)
+    embeddings = model(image_tensors)
 
     embeddings_np = embeddings.numpy()
     return embeddings_np
@@ -64,14 +93,36 @@ def compare_embeddings(face1_embeddings: list[float], face2_embeddings: list[flo
     Returns:
         float: Confidence score based on the similarity of the embeddings.
     """
+    face1_embedding = np.atleast_2d(np.asarray(face1_embeddings))[0]
+    face2_embedding = np.atleast_2d(np.asarray(face2_embeddings))[:1]
+
+    return float(compare_embedding_matrix(face1_embedding, face2_embedding)[0])
+
+def compare_embedding_matrix(probe_embedding: np.ndarray, gallery_embeddings: np.ndarray) -> np.ndarray:
+    """
+    Compare the embedding of one face against many embeddings at once using cosine similarity.
+
+    Args:
+        probe_embedding (numpy.ndarray): Embedding of the probe face.
+        gallery_embeddings (numpy.ndarray): Embeddings of the gallery faces with shape (N, 512).
+
+    Returns:
+        numpy.ndarray: Confidence score against each gallery face, with shape (N,).
+    """
     # Convert to numpy arrays
-    face1_embeddings = np.array(face1_embeddings)
-    face2_embeddings = np.array(face2_embeddings)
+    probe_embedding = np.asarray(probe_embedding, dtype=np.float64)
+    gallery_embeddings = np.asarray(gallery_embeddings, dtype=np.float64)
+
+    # Normalize to unit length, leaving zero vectors unchanged
+    probe_norm = np.sqrt(np.sum(probe_embedding * probe_embedding))
+    gallery_norms = np.sqrt(np.sum(gallery_embeddings * gallery_embeddings, axis=1, keepdims=True))
+    probe_embedding = probe_embedding / (probe_norm if probe_norm else 1.0)
+    gallery_embeddings = gallery_embeddings / np.where(gallery_norms == 0, 1.0, gallery_norms)
 
-    # Calculate cosine similarity between embeddings
-    similarity = cosine_similarity(face1_embeddings, face2_embeddings)
+    # Calculate cosine similarity row by row, so each row gets the same result at any N
+    similarity = np.sum(gallery_embeddings * probe_embedding, axis=1)
 
     # Calculate confidence level
-    confidence = (similarity[0][0] + 1) / 2 * 100
+    confidence = (similarity + 1) / 2 * 100
 
     return confidence
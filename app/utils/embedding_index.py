@@ -0,0 +1,110 @@
+import threading
+import numpy as np
+
+class EmbeddingIndex:
+    """
+    Exact cosine search over profile embeddings stored in one contiguous matrix.
+
+    Embeddings are L2-normalized on insert into a preallocated float32 matrix, so
+    scoring a probe against every profile is a single matrix-vector product.
+    Removal moves the last row into the freed slot to keep the matrix dense.
+
+    Args:
+        dim (int): Embedding dimension.
+        initial_capacity (int): Number of rows allocated up front, doubled when full.
+    """
+    def __init__(self, dim: int = 512, initial_capacity: int = 1024):
+        self.dim = dim
+        self._matrix = np.empty((initial_capacity, dim), dtype=np.float32)
+        self._ids = []
+        self._rows = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, profile_id: str) -> bool:
+        return profile_id in self._rows
+
+    def add(self, profile_id: str, embedding) -> None:
+        """
+        Insert or replace the embedding of a profile.
+
+        Args:
+            profile_id (str): Id of the profile.
+            embedding (array-like): Embedding of the profile, any shape with `dim` elements.
+        """
+        vector = _normalize(embedding)
+        with self._lock:
+            row = self._rows.get(profile_id)
+            if row is None:
+                row = len(self._ids)
+                if row == len(self._matrix):
+                    self._grow()
+                self._ids.append(profile_id)
+                self._rows[profile_id] = row
+            self._matrix[row] = vector
+
+    def remove(self, profile_id: str) -> None:
+        """
+        Remove a profile from the index, ignoring unknown ids.
+
+        Args:
+            profile_id (str): Id of the profile.
+        """
+        with self._lock:
+            row = self._rows.pop(profile_id, None)
+            if row is None:
+                return
+            last_row = len(self._ids) - 1
+            last_id = self._ids.pop()
+            if row != last_row:
+                self._matrix[row] = self._matrix[last_row]
+                self._ids[row] = last_id
+                self._rows[last_id] = row
+
+    def search(self, embedding, k: int) -> list[tuple[str, float]]:
+        """
+        Find the profiles whose embeddings are most similar to the probe.
+
+        Args:
+            embedding (array-like): Probe embedding with `dim` elements.
+            k (int): Number of candidates to return.
+
+        Returns:
+            list[tuple[str, float]]: Up to k (profile id, cosine similarity) pairs, most similar first.
+        """
+        query = _normalize(embedding)
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or k <= 0:
+                return []
+            similarities = self._matrix[:n] @ query
+            k = min(k, n)
+
+            # Partial sort for the top-k, then order only those
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            return [(self._ids[i], float(similarities[i])) for i in top]
+
+    def vectors(self) -> tuple[list[str], np.ndarray]:
+        """
+        Copy out every stored profile id and its normalized embedding.
+
+        Returns:
+            tuple[list[str], numpy.ndarray]: Profile ids and the matching (N, dim) embedding matrix.
+        """
+        with self._lock:
+            n = len(self._ids)
+            return list(self._ids), self._matrix[:n].copy()
+
+    def _grow(self):
+        matrix = np.empty((2 * len(self._matrix), self.dim), dtype=np.float32)
+        matrix[:len(self._matrix)] = self._matrix
+        self._matrix = matrix
+
+def _normalize(embedding) -> np.ndarray:
+    # Flatten to a float32 unit vector
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
@@ -0,0 +1,131 @@
+import asyncio
+import multiprocessing
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from .analysis_params import EXECUTOR_BACKEND, EXECUTOR_MAX_WORKERS, EXECUTOR_MAX_QUEUE, EXECUTOR_RETRY_AFTER, TORCH_NUM_THREADS
+
+class ServerOverloadedError(Exception):
+    """
+    Raised when the profile executor has no free worker or queue slot.
+
+    Args:
+        retry_after (int): Seconds the client should wait before retrying.
+    """
+    def __init__(self, retry_after: int = EXECUTOR_RETRY_AFTER):
+        super().__init__("Server is at capacity, retry later")
+        self.retry_after = retry_after
+
+def _init_process_worker():
+    # Preload models once per worker process so tasks never pay the load
+    import torch
+    from .model_registry import model_registry
+
+    torch.set_num_threads(TORCH_NUM_THREADS or 1)
+    model_registry.load()
+
+class ProfileExecutor:
+    """
+    Runs CPU-bound profile generation off the event loop with admission control.
+
+    The thread backend relies on torch, dlib and OpenCV releasing the GIL, while the
+    process backend runs each task in a worker process with its own preloaded models.
+    At most `max_workers + max_queue` tasks are admitted at once, later requests are
+    rejected with a ServerOverloadedError instead of queueing without bound.
+
+    Args:
+        backend (str): Either "thread" or "process".
+        max_workers (int): Number of worker threads or processes.
+        max_queue (int): Number of admitted tasks allowed to wait for a free worker.
+
+    Attributes:
+        in_flight (int): Number of currently admitted tasks.
+        rejected (int): Number of tasks rejected because the executor was saturated.
+    """
+    def __init__(self, backend: str = EXECUTOR_BACKEND, max_workers: int = EXECUTOR_MAX_WORKERS, max_queue: int = EXECUTOR_MAX_QUEUE):
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown executor backend: {backend}")
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def pool(self) -> Executor:
+        """
+        Underlying worker pool, created on first use.
+        """
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.backend == "process":
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            mp_context=multiprocessing.get_context("spawn"),
+                            initializer=_init_process_worker,
+                        )
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="profile")
+        return self._pool
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Reserve a slot for one request for the duration of the context.
+
+        Raises:
+            ServerOverloadedError: If every worker and queue slot is taken.
+        """
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ServerOverloadedError()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def run(self, fn, *args):
+        """
+        Run a function in the worker pool without blocking the event loop.
+
+        Args:
+            fn (callable): Picklable function to run (module-level for the process backend).
+            *args: Arguments passed to the function.
+
+        Returns:
+            Any: Return value of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, fn, *args)
+
+    def stats(self) -> dict:
+        """
+        Report executor configuration and load.
+
+        Returns:
+            dict: Backend, capacity, in-flight and rejected task counts.
+        """
+        return {
+            "backend": self.backend,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        """
+        Shut down the worker pool, waiting for running tasks to finish.
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+profile_executor = ProfileExecutor()
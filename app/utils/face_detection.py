@@ -0,0 +1,186 @@
+import os
+import threading
+import cv2
+import dlib
+import numpy as np
+from .analysis_params import (
+    FACE_DETECTOR, FACE_HAAR_MODEL_PATH, FACE_DNN_MODEL_PATH, FACE_DNN_CONFIG_PATH, FACE_DNN_MIN_CONFIDENCE,
+    FACE_MTCNN_MIN_CONFIDENCE,
+)
+from .lazy_imports import lazy_import
+
+facenet_pytorch = lazy_import("facenet_pytorch")
+
+# Relative model paths are resolved against this directory, like the dlib shape predictor
+relative_path = os.path.dirname(os.path.abspath(__file__))
+
+def resolve_model_path(path: str) -> str:
+    """
+    Resolve a model file path, checking that the file exists.
+
+    Args:
+        path (str): Absolute path, or path relative to `app/utils`.
+
+    Returns:
+        str: Absolute path of the model file.
+
+    Raises:
+        FileNotFoundError: If the model file does not exist.
+    """
+    resolved = os.path.join(relative_path, path)
+    if not os.path.isfile(resolved):
+        raise FileNotFoundError(f"Face detector model not found: {resolved}")
+    return resolved
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def to_bgr(image: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+
+def to_rectangles(boxes, width: int, height: int) -> list:
+    # Clamp (left, top, right, bottom) boxes to the image and drop empty ones
+    rectangles = []
+    for left, top, right, bottom in boxes:
+        left, top = max(0, int(left)), max(0, int(top))
+        right, bottom = min(width - 1, int(right)), min(height - 1, int(bottom))
+        if right > left and bottom > top:
+            rectangles.append(dlib.rectangle(left, top, right, bottom))
+    return rectangles
+
+class FaceDetector:
+    """
+    Face detector returning boxes in the coordinates of the image it is given.
+
+    Detectors accept grayscale or BGR images and return dlib rectangles, most confident
+    (or largest, for detectors without scores) first, so they are interchangeable with
+    the dlib detector wherever boxes feed the shape predictor or tracker.
+
+    Attributes:
+        name (str): Detector name, as given to FACE_DETECTOR.
+    """
+    name = None
+
+    def __call__(self, image: np.ndarray) -> list:
+        """
+        Detect every face within an image.
+
+        Args:
+            image (numpy.ndarray): Grayscale or BGR image.
+
+        Returns:
+            list[dlib.rectangle]: Detected face boxes, best first. Empty if no face is found.
+        """
+        raise NotImplementedError
+
+class DlibHogDetector(FaceDetector):
+    """
+    dlib's HOG frontal face detector, run on the grayscale image.
+
+    Args:
+        upsample (int): Times the image is upsampled before detection, finding smaller faces at a higher cost.
+    """
+    name = "dlib"
+
+    def __init__(self, upsample: int = 0):
+        self.upsample = upsample
+        self.detector = dlib.get_frontal_face_detector()
+
+    def __call__(self, image: np.ndarray) -> list:
+        return list(self.detector(to_gray(image), self.upsample))
+
+class HaarCascadeDetector(FaceDetector):
+    """
+    OpenCV's Viola-Jones Haar cascade, the fastest detector but the least robust to pose and lighting.
+
+    Args:
+        model_path (str): Cascade XML file, "" uses the frontal face cascade bundled with OpenCV.
+    """
+    name = "haar"
+
+    def __init__(self, model_path: str = FACE_HAAR_MODEL_PATH):
+        # OpenCV 5 moved the cascade classifier out of the main package
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise RuntimeError(f"Haar cascades are not available in OpenCV {cv2.__version__}")
+        model_path = model_path or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.cascade = cv2.CascadeClassifier(resolve_model_path(model_path))
+        if self.cascade.empty():
+            raise ValueError(f"Invalid Haar cascade: {model_path}")
+
+    def __call__(self, image: np.ndarray) -> list:
+        gray = to_gray(image)
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(20, 20))
+        boxes = sorted(((x, y, x + w, y + h) for x, y, w, h in faces), key=lambda box: (box[2] - box[0]) * (box[3] - box[1]), reverse=True)
+        return to_rectangles(boxes, gray.shape[1], gray.shape[0])
+
+class DnnDetector(FaceDetector):
+    """
+    OpenCV DNN face detector, the ResNet-10 SSD trained at 300x300.
+
+    Args:
+        model_path (str): Caffe weights file.
+        config_path (str): Caffe prototxt file.
+        min_confidence (float): Minimum detection score kept.
+    """
+    name = "dnn"
+
+    def __init__(self, model_path: str = FACE_DNN_MODEL_PATH, config_path: str = FACE_DNN_CONFIG_PATH, min_confidence: float = FACE_DNN_MIN_CONFIDENCE):
+        self.net = cv2.dnn.readNet(resolve_model_path(model_path), resolve_model_path(config_path))
+        self.min_confidence = min_confidence
+        # OpenCV networks keep per-forward state, so concurrent workers take turns
+        self._lock = threading.Lock()
+
+    def __call__(self, image: np.ndarray) -> list:
+        bgr = to_bgr(image)
+        height, width = bgr.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(bgr, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()[0, 0]
+
+        # Rows are (image, class, confidence, left, top, right, bottom) with relative coordinates
+        detections = detections[detections[:, 2] >= self.min_confidence]
+        detections = detections[np.argsort(-detections[:, 2])]
+        return to_rectangles(detections[:, 3:7] * [width, height, width, height], width, height)
+
+class MtcnnDetector(FaceDetector):
+    """
+    facenet_pytorch's MTCNN cascade of convolutional networks, the most robust and slowest detector.
+
+    Args:
+        min_confidence (float): Minimum detection probability kept.
+    """
+    name = "mtcnn"
+
+    def __init__(self, min_confidence: float = FACE_MTCNN_MIN_CONFIDENCE):
+        self.mtcnn = facenet_pytorch.MTCNN(keep_all=True, device="cpu")
+        self.min_confidence = min_confidence
+
+    def __call__(self, image: np.ndarray) -> list:
+        rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB) if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        boxes, probabilities = self.mtcnn.detect(rgb)
+        if boxes is None:
+            return []
+        order = [i for i in np.argsort(-probabilities) if probabilities[i] >= self.min_confidence]
+        return to_rectangles(boxes[order], rgb.shape[1], rgb.shape[0])
+
+FACE_DETECTORS = {detector.name: detector for detector in (DlibHogDetector, HaarCascadeDetector, DnnDetector, MtcnnDetector)}
+
+def create_face_detector(name: str = FACE_DETECTOR) -> FaceDetector:
+    """
+    Build the face detector selected by name.
+
+    Args:
+        name (str): One of FACE_DETECTORS ("dlib", "haar", "dnn" or "mtcnn").
+
+    Returns:
+        FaceDetector: Detector with its models loaded.
+
+    Raises:
+        ValueError: If the detector name is unknown.
+        FileNotFoundError: If the detector's model files are missing.
+        RuntimeError: If the installed OpenCV does not support the detector.
+    """
+    if name not in FACE_DETECTORS:
+        raise ValueError(f"Unknown face detector {name!r}, expected one of {', '.join(FACE_DETECTORS)}")
+    return FACE_DETECTORS[name]()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import copy
+import warnings
+from .analysis_params import FACENET_BACKEND, ANALYSIS_SIZE
+from .lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+F = lazy_import("torch.nn.functional")
+
+# Optimizations in the order they are applied, quantization must precede tracing
+FACENET_OPTIMIZATIONS = ("channels_last", "int8", "torchscript")
+
+def parse_facenet_backend(spec: str) -> tuple[str, ...]:
+    """
+    Parse a FaceNet backend specification.
+
+    Args:
+        spec (str): "eager", or a comma-separated combination of FACENET_OPTIMIZATIONS.
+
+    Returns:
+        tuple[str, ...]: Requested optimizations in application order, empty for eager.
+
+    Raises:
+        ValueError: If the specification names an unknown optimization.
+    """
+    names = {name.strip() for name in spec.split(",") if name.strip()} - {"eager"}
+    unknown = names - set(FACENET_OPTIMIZATIONS)
+    if unknown:
+        raise ValueError(f"Unknown FaceNet backend {', '.join(sorted(unknown))}, expected eager or a combination of {', '.join(FACENET_OPTIMIZATIONS)}")
+    return tuple(name for name in FACENET_OPTIMIZATIONS if name in names)
+
+class FacenetBackend:
+    """
+    FaceNet inference backend built from an fp32 eager InceptionResnetV1.
+
+    Optimizations:
+        channels_last: Weights and inputs in NHWC memory format, favoured by oneDNN convolutions.
+        int8: Dynamic int8 quantization of the linear layers (PyTorch only quantizes linear
+            layers dynamically, convolutions would need calibrated static quantization).
+        torchscript: Traced and frozen graph with inference-time operator fusion.
+
+    Args:
+        model (InceptionResnetV1): fp32 model in eval mode, left unchanged.
+        spec (str): Backend specification, see `parse_facenet_backend`.
+
+    Attributes:
+        name (str): Normalized backend name.
+        optimizations (tuple[str, ...]): Applied optimizations.
+        nbytes (int): Bytes held by the model weights and buffers.
+    """
+    def __init__(self, model: torch.nn.Module, spec: str = FACENET_BACKEND):
+        self.optimizations = parse_facenet_backend(spec)
+        self.name = ",".join(self.optimizations) or "eager"
+        self.channels_last = "channels_last" in self.optimizations
+
+        if self.optimizations:
+            model = copy.deepcopy(model)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        if "int8" in self.optimizations:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", (DeprecationWarning, UserWarning))
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        # Count weights before tracing, frozen graphs hold them as constants
+        self.nbytes = sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in _flatten_tensors(model.state_dict().values())
+        )
+
+        if "torchscript" in self.optimizations:
+            example = self._prepare(torch.zeros(1, 3, *ANALYSIS_SIZE))
+            with warnings.catch_warnings(), torch.no_grad():
+                warnings.simplefilter("ignore", FutureWarning)
+                model = torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.trace(model, example).eval()))
+        self.model = model
+
+    def __call__(self, image_tensors: torch.Tensor) -> torch.Tensor:
+        """
+        Embed a batch of preprocessed images.
+
+        Args:
+            image_tensors (torch.Tensor): Batch of preprocessed images with shape (N, 3, 160, 160).
+
+        Returns:
+            torch.Tensor: fp32 embeddings with shape (N, 512).
+        """
+        with torch.no_grad():
+            return self.model(self._prepare(image_tensors))
+
+    def _prepare(self, image_tensors: torch.Tensor) -> torch.Tensor:
+        if self.channels_last:
+            return image_tensors.contiguous(memory_format=torch.channels_last)
+        return image_tensors
+
+def _flatten_tensors(values) -> list[torch.Tensor]:
+    # Quantized linear layers store packed weights as (weight, bias) tuples
+    tensors = []
+    for value in values:
+        if isinstance(value, torch.Tensor):
+            tensors.append(value)
+        elif isinstance(value, (tuple, list)):
+            tensors += _flatten_tensors(value)
+    return tensors
+
+def embedding_parity(reference: torch.Tensor, candidate: torch.Tensor) -> dict:
+    """
+    Compare embeddings from an optimized backend with the fp32 reference embeddings.
+
+    Args:
+        reference (torch.Tensor): fp32 eager embeddings with shape (N, 512).
+        candidate (torch.Tensor): Backend embeddings of the same images.
+
+    Returns:
+        dict: Minimum and mean cosine similarity and maximum absolute difference.
+    """
+    cosine = F.cosine_similarity(reference, candidate, dim=1)
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float((reference - candidate).abs().max()),
+    }
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from .analysis_params import FEATURE_CACHE_MAX_BYTES, FEATURE_CACHE_PATH, feature_fingerprint
+from .compact_profile import BINARY_VERSION, CompactProfile
+from .metrics import FEATURE_CACHE_LOOKUPS, FEATURE_CACHE_EVICTIONS
+
+class FeatureCache:
+    """
+    Bounded LRU cache of generated profiles keyed by the content of the uploaded image.
+
+    Keys hash the image bytes together with the feature settings fingerprint, so changing
+    a model or analysis parameter never serves stale profiles. Profiles are held in their
+    binary wire format, which bounds memory use by `max_bytes`. With a `path`, entries are
+    also written to disk, which lets them survive restarts and be shared between workers.
+
+    Args:
+        max_bytes (int): Memory budget for cached profiles.
+        path (str): Optional directory persisting cached profiles.
+
+    Attributes:
+        hits (int): Lookups served from memory or disk.
+        misses (int): Lookups that required generating the profile.
+        evictions (int): Entries dropped to stay within `max_bytes`.
+    """
+    def __init__(self, max_bytes: int = FEATURE_CACHE_MAX_BYTES, path: str = FEATURE_CACHE_PATH):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._version = f"{feature_fingerprint()}:{BINARY_VERSION}".encode()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._warm()
+
+    def key(self, image_bytes: bytes) -> str:
+        """
+        Compute the cache key of an uploaded image.
+
+        Args:
+            image_bytes (bytes): Raw uploaded file content.
+
+        Returns:
+            str: Hex digest of the feature settings version and image bytes.
+        """
+        digest = hashlib.sha256(self._version)
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> CompactProfile:
+        """
+        Look up a cached profile, marking it as most recently used.
+
+        Args:
+            key (str): Cache key from `key`.
+
+        Returns:
+            CompactProfile: Cached profile, or None on a miss.
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                FEATURE_CACHE_LOOKUPS.inc(result="memory_hit")
+                return CompactProfile.from_bytes(data)
+
+        # Another worker or a previous run may have persisted it
+        data = self._read(key)
+        if data is not None:
+            self._insert(key, data)
+            with self._lock:
+                self.hits += 1
+            FEATURE_CACHE_LOOKUPS.inc(result="disk_hit")
+            return CompactProfile.from_bytes(data)
+
+        with self._lock:
+            self.misses += 1
+        FEATURE_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def put(self, key: str, profile: CompactProfile):
+        """
+        Cache a generated profile, evicting least recently used entries past the budget.
+
+        Args:
+            key (str): Cache key from `key`.
+            profile (CompactProfile): Profile generated from the keyed image.
+        """
+        data = profile.to_bytes()
+        self._insert(key, data)
+        if self.path:
+            # Write then rename so readers never see a partial entry
+            tmp_path = self._file(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._file(key))
+
+    def clear(self):
+        """
+        Drop every cached entry from memory and disk.
+        """
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self.nbytes = 0
+        for key in keys:
+            self._remove_file(key)
+
+    def stats(self) -> dict:
+        """
+        Report cache usage.
+
+        Returns:
+            dict: Entry count, bytes used and budget, hit/miss/eviction counts and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "persistent": bool(self.path),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _insert(self, key: str, data: bytes):
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes and self._entries:
+                evicted_key, evicted_data = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted_data)
+                self.evictions += 1
+                evicted.append(evicted_key)
+        FEATURE_CACHE_EVICTIONS.inc(len(evicted))
+        for evicted_key in evicted:
+            self._remove_file(evicted_key)
+
+    def _warm(self):
+        # Load the most recently used persisted entries that fit the budget, pruning the rest
+        files = []
+        for name in os.listdir(self.path):
+            file_path = os.path.join(self.path, name)
+            if name.endswith(".tmp"):
+                os.remove(file_path)
+            elif name.endswith(".bin"):
+                files.append((os.path.getmtime(file_path), name[:-len(".bin")]))
+        for _, key in sorted(files, reverse=True):
+            data = self._read(key)
+            if data is None:
+                continue
+            if self.nbytes + len(data) > self.max_bytes:
+                self._remove_file(key)
+                continue
+            self._entries[key] = data
+            self._entries.move_to_end(key, last=False)
+            self.nbytes += len(data)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".bin")
+
+    def _read(self, key: str) -> bytes:
+        if not self.path:
+            return None
+        try:
+            with open(self._file(key), "rb") as f:
+                data = f.read()
+            # Refresh the modification time so warm-up keeps recently used entries
+            os.utime(self._file(key))
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _remove_file(self, key: str):
+        if self.path:
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+
+feature_cache = FeatureCache()
@@ -0,0 +1,219 @@
+import warnings
+from io import BytesIO
+import cv2
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+from .analysis_params import (
+    UPLOAD_MAX_BYTES, UPLOAD_MAX_PIXELS, UPLOAD_HEADER_BYTES, UPLOAD_CHUNK_SIZE, UPLOAD_FORMATS,
+    FACE_PRECHECK_MIN_PIXELS, FACE_PRECHECK_UPSAMPLE, FACE_DETECT_SIZE, FACE_DETECTOR,
+)
+from .landmark_analysis import NoFaceDetectedError
+from .model_registry import model_registry
+
+class UploadRejectedError(ValueError):
+    """
+    Raised when an upload is rejected before decoding.
+
+    Args:
+        message (str): Reason for the rejection.
+        status_code (int): HTTP status to respond with (413 for oversized, 415 for unsupported uploads).
+    """
+    def __init__(self, message: str, status_code: int = 415):
+        super().__init__(message)
+        self.status_code = status_code
+
+class ImageUpload:
+    """
+    Uploaded image bytes with the format and dimensions read from their header.
+
+    Holding the compressed bytes rather than a decoded image keeps uploads cheap to
+    cache, hash and send to process workers. Pixels are only decoded by `open`.
+
+    Attributes:
+        data (bytes): Raw uploaded file content.
+        format (str): PIL format name, one of UPLOAD_FORMATS.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+    """
+    __slots__ = ("data", "format", "width", "height")
+
+    def __init__(self, data: bytes, format: str, width: int, height: int):
+        self.data = data
+        self.format = format
+        self.width = width
+        self.height = height
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def open(self, draft_size: int = 0) -> Image.Image:
+        """
+        Open the image for decoding.
+
+        Args:
+            draft_size (int): Minimum side length for reduced-resolution JPEG decoding, 0 decodes at full resolution.
+
+        Returns:
+            PIL.Image.Image: Lazily decoded image.
+        """
+        image = Image.open(BytesIO(self.data))
+        if draft_size and self.format == "JPEG":
+            image.draft("RGB", (draft_size, draft_size))
+        return image
+
+def sniff_image(header: bytes) -> tuple[str, int, int]:
+    """
+    Read the format and dimensions of an image from the start of its file.
+
+    Args:
+        header (bytes): Leading bytes of the file.
+
+    Returns:
+        tuple: PIL format name, width and height, or None if the header is incomplete or unrecognized.
+
+    Raises:
+        UploadRejectedError: If the declared dimensions exceed PIL's decompression bomb limit.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            image = Image.open(BytesIO(header))
+    except Image.DecompressionBombError as e:
+        raise UploadRejectedError(str(e), status_code=413)
+    except (UnidentifiedImageError, SyntaxError, OSError, ValueError, IndexError):
+        return None
+    return image.format, image.width, image.height
+
+def check_image(format: str, width: int, height: int, max_pixels: int = UPLOAD_MAX_PIXELS):
+    """
+    Enforce the accepted formats and pixel limit on sniffed image dimensions.
+
+    Raises:
+        UploadRejectedError: If the format is not accepted or the image has too many pixels.
+    """
+    if format not in UPLOAD_FORMATS:
+        raise UploadRejectedError(f"Unsupported image format {format}, expected {', '.join(UPLOAD_FORMATS)}", status_code=415)
+    if width * height > max_pixels:
+        raise UploadRejectedError(f"Image of {width}x{height} pixels exceeds the limit of {max_pixels} pixels", status_code=413)
+
+def inspect_image(data: bytes, max_bytes: int = UPLOAD_MAX_BYTES, max_pixels: int = UPLOAD_MAX_PIXELS) -> ImageUpload:
+    """
+    Validate already buffered image bytes from their header, without decoding pixels.
+
+    Args:
+        data (bytes): Raw file content.
+        max_bytes (int): Maximum accepted file size.
+        max_pixels (int): Maximum accepted width times height.
+
+    Returns:
+        ImageUpload: Validated upload.
+
+    Raises:
+        UploadRejectedError: If the file is too large, unrecognized, unsupported or has too many pixels.
+    """
+    if len(data) > max_bytes:
+        raise UploadRejectedError(f"Upload exceeds the limit of {max_bytes} bytes", status_code=413)
+    sniffed = sniff_image(data[:UPLOAD_HEADER_BYTES])
+    if sniffed is None:
+        raise UploadRejectedError("Invalid Image Format", status_code=415)
+    check_image(*sniffed, max_pixels=max_pixels)
+    return ImageUpload(data, *sniffed)
+
+async def read_upload(file, max_bytes: int = UPLOAD_MAX_BYTES, max_pixels: int = UPLOAD_MAX_PIXELS) -> ImageUpload:
+    """
+    Read an uploaded image in chunks, rejecting it as soon as its header or size is unacceptable.
+
+    The header is sniffed from the first chunks, so oversized or unsupported images are
+    rejected before the rest of the file is read and long before anything is decoded.
+
+    Args:
+        file (UploadFile): Uploaded file.
+        max_bytes (int): Maximum accepted file size.
+        max_pixels (int): Maximum accepted width times height.
+
+    Returns:
+        ImageUpload: Validated upload.
+
+    Raises:
+        UploadRejectedError: If the file is too large, unrecognized, unsupported or has too many pixels.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadRejectedError(f"Upload exceeds the limit of {max_bytes} bytes", status_code=413)
+
+    # Read until the header reveals format and dimensions
+    buffer = bytearray()
+    sniffed = None
+    while sniffed is None:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        buffer += chunk
+        sniffed = sniff_image(bytes(buffer))
+        if sniffed is None and (not chunk or len(buffer) >= UPLOAD_HEADER_BYTES):
+            raise UploadRejectedError("Invalid Image Format", status_code=415)
+    check_image(*sniffed, max_pixels=max_pixels)
+
+    # Read the rest within the byte limit
+    while len(buffer) <= max_bytes:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return ImageUpload(bytes(buffer), *sniffed)
+        buffer += chunk
+    raise UploadRejectedError(f"Upload exceeds the limit of {max_bytes} bytes", status_code=413)
+
+def spool_upload(source, destination, max_bytes: int) -> int:
+    """
+    Copy an upload to a file in chunks, stopping as soon as it exceeds the byte limit.
+
+    Args:
+        source (file-like): Binary stream of the upload.
+        destination (file-like): Binary file the upload is written to.
+        max_bytes (int): Maximum accepted upload size.
+
+    Returns:
+        int: Number of bytes copied.
+
+    Raises:
+        UploadRejectedError: If the upload exceeds `max_bytes`.
+    """
+    copied = 0
+    while chunk := source.read(UPLOAD_CHUNK_SIZE):
+        copied += len(chunk)
+        if copied > max_bytes:
+            raise UploadRejectedError(f"Upload exceeds the limit of {max_bytes} bytes", status_code=413)
+        destination.write(chunk)
+    return copied
+
+def precheck_face(upload: ImageUpload, detect_size: int = FACE_DETECT_SIZE, min_pixels: int = FACE_PRECHECK_MIN_PIXELS, upsample: int = FACE_PRECHECK_UPSAMPLE):
+    """
+    Reject large images without a face from a reduced-resolution decode, before the full decode.
+
+    Baseline JPEGs are draft-decoded straight to a fraction of their size and downscaled,
+    keeping the aspect ratio, to the view size the calling path detects on. That view is
+    searched with `upsample` extra pyramid levels, so the check also finds faces somewhat
+    smaller than the pipeline's own search does. It only looks for a face at the size the
+    caller searches, so paths detecting on a larger view must not be gated by it. Other
+    images skip the check, as do small ones whose full decode is cheap. The check uses dlib's
+    HOG detector, so it is skipped when FACE_DETECTOR is another detector that may find faces HOG misses.
+
+    Args:
+        upload (ImageUpload): Validated upload.
+        detect_size (int): Longest side of the view the calling path searches for faces.
+        min_pixels (int): Pixel count from which images are checked, 0 disables the check.
+        upsample (int): Times the detection view is upsampled by the detector.
+
+    Raises:
+        NoFaceDetectedError: If no face is found in the reduced view.
+    """
+    if not min_pixels or upload.pixels < min_pixels or upload.format != "JPEG" or FACE_DETECTOR != "dlib":
+        return
+
+    # Progressive JPEGs decode every coefficient even in draft mode, saving too little to pay off
+    image = upload.open()
+    if image.info.get("progressive"):
+        return
+    image.draft("RGB", (detect_size, detect_size))
+    gray = np.asarray(image.convert("L"))
+    scale = min(1.0, detect_size / max(gray.shape))
+    view = cv2.resize(gray, (round(gray.shape[1] * scale), round(gray.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    if not len(model_registry.landmark_analyzer.dlib_detector(view, upsample)):
+        raise NoFaceDetectedError("No faces detected within image")
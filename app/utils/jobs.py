@@ -0,0 +1,574 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections import defaultdict
+from .analysis_params import (
+    CONFIDENCE_THRESHOLD, JOB_QUEUE_PATH, JOB_BATCH_SIZE, JOB_MAX_IN_FLIGHT, JOB_MAX_TASKS,
+    JOB_SUBMIT_BATCH, JOB_LEASE_SECONDS, JOB_POLL_INTERVAL, JOB_RETENTION_SECONDS,
+)
+from .executor import profile_executor, ServerOverloadedError
+from .ingest import UploadRejectedError, inspect_image
+from .metrics import JOB_TASKS
+from .profile import generate_profile_from_bytes, compare_profiles
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    created REAL NOT NULL,
+    finished REAL,
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    profile_id TEXT NOT NULL,
+    image TEXT NOT NULL,
+    digest TEXT,
+    state TEXT NOT NULL,
+    lease_until REAL,
+    confidence REAL,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state);
+CREATE INDEX IF NOT EXISTS tasks_digest ON tasks (digest);
+CREATE TABLE IF NOT EXISTS images (
+    digest TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+def parse_manifest(manifest: str, max_tasks: int = JOB_MAX_TASKS) -> list[tuple[str, str]]:
+    """
+    Parse a job manifest.
+
+    Args:
+        manifest (str): JSON list of {"profile_id": ..., "image": ...} objects, where
+            image names a file or archive member uploaded with the manifest.
+        max_tasks (int): Maximum number of pairs in one job.
+
+    Returns:
+        list[tuple[str, str]]: (profile id, image name) pairs in manifest order.
+
+    Raises:
+        ValueError: If the manifest is not valid JSON, not a list of pairs, empty or too long.
+    """
+    try:
+        entries = json.loads(manifest)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid manifest: {e}")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("Manifest must be a non-empty list of {\"profile_id\", \"image\"} objects")
+    if len(entries) > max_tasks:
+        raise ValueError(f"Manifest has {len(entries)} entries, the limit is {max_tasks}")
+
+    pairs = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("profile_id"), str) or not isinstance(entry.get("image"), str):
+            raise ValueError("Manifest must be a non-empty list of {\"profile_id\", \"image\"} objects")
+        pairs.append((entry["profile_id"], entry["image"]))
+    return pairs
+
+class JobQueue:
+    """
+    Durable queue of verification jobs, stored in a local SQLite database.
+
+    A job is a list of (profile id, image) tasks. Images are stored once per content
+    digest, however many tasks or jobs use them, and dropped once no pending task needs
+    them. Workers lease tasks with `claim`, so tasks held by a worker that dies are
+    handed out again once their lease expires, and queued jobs survive restarts.
+    Several processes can share one database.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        lease_seconds (float): Seconds a claimed task is held before it can be claimed again.
+    """
+    def __init__(self, path: str = JOB_QUEUE_PATH, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect()
+        with self._lock:
+            self._db.executescript(SCHEMA)
+
+        # SQLite connections must not be used across fork, so each child opens its own
+        queue = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: queue() is not None and queue()._connect())
+
+    def submit(self, pairs: list[tuple[str, str]], images, priority: int = 0, batch_size: int = JOB_SUBMIT_BATCH) -> str:
+        """
+        Store a new job with the images its tasks refer to.
+
+        The job and its tasks are stored first, in an "uploading" state that workers skip.
+        Images are then validated from their header, hashed and written in short transactions
+        of `batch_size` images as they are read, so neither the whole upload nor the write
+        lock is held while reading. A final transaction queues the tasks whose image arrived
+        and fails those whose image is missing or rejected. If reading fails, the job is
+        deleted, which also drops the images it stored.
+
+        Args:
+            pairs (list[tuple[str, str]]): (profile id, image name) pairs from `parse_manifest`.
+            images (iterable): (image name, image bytes) pairs, read one at a time.
+            priority (int): Jobs with higher priority are processed first.
+            batch_size (int): Images written per transaction.
+
+        Returns:
+            str: Id of the new job.
+        """
+        job_id = uuid.uuid4().hex
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO jobs (id, priority, created, finished, total, failed) VALUES (?, ?, ?, NULL, ?, 0)",
+                (job_id, priority, time.time(), len(pairs)),
+            )
+            db.executemany(
+                "INSERT INTO tasks (job_id, idx, profile_id, image, state) VALUES (?, ?, ?, ?, 'uploading')",
+                [(job_id, index, profile_id, image) for index, (profile_id, image) in enumerate(pairs)],
+            )
+
+        wanted = {image for _, image in pairs}
+        digests = {}
+        errors = {}
+        batch = []
+
+        def write(batch):
+            # Tasks reference their digest in the same transaction, so image cleanup never drops it
+            with self._transaction() as db:
+                db.executemany("INSERT OR IGNORE INTO images (digest, data) VALUES (?, ?)", [(digest, data) for _, digest, data in batch])
+                db.executemany("UPDATE tasks SET digest = ? WHERE job_id = ? AND image = ?", [(digest, job_id, name) for name, digest, _ in batch])
+
+        try:
+            for name, data in images:
+                if name not in wanted or name in digests or name in errors:
+                    continue
+                try:
+                    inspect_image(data)
+                except UploadRejectedError as e:
+                    errors[name] = str(e)
+                    continue
+                digests[name] = hashlib.sha256(data).hexdigest()
+                batch.append((name, digests[name], data))
+                if len(batch) >= batch_size:
+                    write(batch)
+                    batch = []
+            if batch:
+                write(batch)
+        except BaseException:
+            self.delete(job_id)
+            raise
+
+        rows = []
+        failed = 0
+        for index, (_, image) in enumerate(pairs):
+            if image in digests:
+                rows.append(("queued", None, job_id, index))
+            else:
+                failed += 1
+                rows.append(("failed", errors.get(image, "Image not found in upload"), job_id, index))
+        with self._transaction() as db:
+            db.executemany("UPDATE tasks SET state = ?, error = ? WHERE job_id = ? AND idx = ?", rows)
+            db.execute(
+                "UPDATE jobs SET failed = ?, finished = ? WHERE id = ?",
+                (failed, time.time() if failed == len(pairs) else None, job_id),
+            )
+        JOB_TASKS.inc(len(pairs) - failed, state="queued")
+        JOB_TASKS.inc(failed, state="failed")
+        return job_id
+
+    def claim(self, limit: int = JOB_BATCH_SIZE) -> list[dict]:
+        """
+        Lease the next tasks to process.
+
+        Tasks are taken by job priority, then job age. Other waiting tasks sharing their
+        images are leased along with them, so each image is processed once per claim
+        however many jobs ask for it.
+
+        Args:
+            limit (int): Maximum number of tasks taken by priority, before adding tasks sharing their images.
+
+        Returns:
+            list[dict]: Leased tasks with their job id, index, profile id and image digest.
+        """
+        now = time.time()
+        available = "(t.state = 'queued' OR (t.state = 'running' AND t.lease_until < :now))"
+        with self._transaction() as db:
+            rows = db.execute(
+                f"SELECT t.job_id, t.idx, t.profile_id, t.digest FROM tasks t JOIN jobs j ON j.id = t.job_id "
+                f"WHERE {available} ORDER BY j.priority DESC, j.created, t.idx LIMIT :limit",
+                {"now": now, "limit": limit},
+            ).fetchall()
+            if not rows:
+                return []
+
+            # Add other jobs' tasks for the same images
+            digests = sorted({digest for *_, digest in rows})
+            placeholders = ",".join("?" * len(digests))
+            rows += db.execute(
+                f"SELECT t.job_id, t.idx, t.profile_id, t.digest FROM tasks t "
+                f"WHERE t.digest IN ({placeholders}) AND {available.replace(':now', '?')} LIMIT ?",
+                (*digests, now, limit * 4),
+            ).fetchall()
+            tasks = {(job_id, index): {"job_id": job_id, "index": index, "profile_id": profile_id, "digest": digest} for job_id, index, profile_id, digest in rows}
+            db.executemany(
+                "UPDATE tasks SET state = 'running', lease_until = ? WHERE job_id = ? AND idx = ?",
+                [(now + self.lease_seconds, job_id, index) for job_id, index in tasks],
+            )
+        return list(tasks.values())
+
+    def image(self, digest: str) -> bytes:
+        """
+        Read a stored image.
+
+        Args:
+            digest (str): SHA-256 digest of the image bytes.
+
+        Returns:
+            bytes: Image bytes, or None if no pending task needs them anymore.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT data FROM images WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def complete(self, results: list[tuple[dict, float, str]]):
+        """
+        Record the outcome of leased tasks, finishing jobs with no task left.
+
+        Args:
+            results (list[tuple]): Leased task, confidence (None on failure) and error message (None on success).
+        """
+        now = time.time()
+        counts = defaultdict(lambda: [0, 0])
+        with self._transaction() as db:
+            for task, confidence, error in results:
+                updated = db.execute(
+                    "UPDATE tasks SET state = ?, confidence = ?, error = ?, lease_until = NULL "
+                    "WHERE job_id = ? AND idx = ? AND state = 'running'",
+                    ("failed" if error else "completed", confidence, error, task["job_id"], task["index"]),
+                ).rowcount
+                # A task whose lease expired may have been finished by another worker already
+                if updated:
+                    counts[task["job_id"]][1 if error else 0] += 1
+            for job_id, (completed, failed) in counts.items():
+                db.execute(
+                    "UPDATE jobs SET completed = completed + ?, failed = failed + ?, "
+                    "finished = CASE WHEN completed + failed + ? + ? = total THEN ? END WHERE id = ?",
+                    (completed, failed, completed, failed, now, job_id),
+                )
+            # Drop images that no waiting task needs anymore
+            digests = sorted({task["digest"] for task, *_ in results})
+            db.executemany(
+                "DELETE FROM images WHERE digest = ? AND NOT EXISTS "
+                "(SELECT 1 FROM tasks WHERE tasks.digest = images.digest AND tasks.state IN ('uploading', 'queued', 'running'))",
+                [(digest,) for digest in digests],
+            )
+        JOB_TASKS.inc(sum(completed for completed, _ in counts.values()), state="completed")
+        JOB_TASKS.inc(sum(failed for _, failed in counts.values()), state="failed")
+
+    def release(self, tasks: list[dict]):
+        """
+        Return leased tasks to the queue without an outcome.
+
+        Args:
+            tasks (list[dict]): Leased tasks from `claim`.
+        """
+        with self._transaction() as db:
+            db.executemany(
+                "UPDATE tasks SET state = 'queued', lease_until = NULL WHERE job_id = ? AND idx = ? AND state = 'running'",
+                [(task["job_id"], task["index"]) for task in tasks],
+            )
+
+    def status(self, job_id: str) -> dict:
+        """
+        Report the progress of a job.
+
+        Args:
+            job_id (str): Id of the job.
+
+        Returns:
+            dict: Job id, state ("queued", "running" or "finished"), priority, task counts and
+                timestamps, or None if the job does not exist.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT priority, created, finished, total, completed, failed FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            priority, created, finished, total, completed, failed = row
+            running = self._db.execute("SELECT COUNT(*) FROM tasks WHERE job_id = ? AND state = 'running'", (job_id,)).fetchone()[0]
+
+        if finished is not None:
+            state = "finished"
+        elif running or completed or failed:
+            state = "running"
+        else:
+            state = "queued"
+        return {
+            "job_id": job_id,
+            "state": state,
+            "priority": priority,
+            "total": total,
+            "completed": completed,
+            "failed": failed,
+            "pending": total - completed - failed,
+            "created": created,
+            "finished": finished,
+        }
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 1000) -> list[dict]:
+        """
+        List the tasks of a job with their outcome, in manifest order.
+
+        Args:
+            job_id (str): Id of the job.
+            offset (int): Index of the first task returned.
+            limit (int): Maximum number of tasks returned.
+
+        Returns:
+            list[dict]: Index, profile id, image name, state, confidence, deepfake verdict and error of each task.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT idx, profile_id, image, state, confidence, error FROM tasks WHERE job_id = ? AND idx >= ? ORDER BY idx LIMIT ?",
+                (job_id, offset, limit),
+            ).fetchall()
+        return [
+            {
+                "index": index,
+                "profile_id": profile_id,
+                "image": image,
+                "state": state,
+                "confidence": confidence,
+                "is_deepfaked": None if confidence is None else confidence < CONFIDENCE_THRESHOLD,
+                "error": error,
+            }
+            for index, profile_id, image, state, confidence, error in rows
+        ]
+
+    def delete(self, job_id: str) -> bool:
+        """
+        Delete a job with its tasks and results, cancelling tasks not yet processed.
+
+        Args:
+            job_id (str): Id of the job.
+
+        Returns:
+            bool: Whether the job existed.
+        """
+        with self._transaction() as db:
+            if not db.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount:
+                return False
+            digests = [row[0] for row in db.execute("SELECT DISTINCT digest FROM tasks WHERE job_id = ? AND digest IS NOT NULL", (job_id,))]
+            db.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+            db.executemany(
+                "DELETE FROM images WHERE digest = ? AND NOT EXISTS (SELECT 1 FROM tasks WHERE tasks.digest = images.digest)",
+                [(digest,) for digest in digests],
+            )
+        return True
+
+    def purge(self, max_age: float = JOB_RETENTION_SECONDS) -> int:
+        """
+        Delete jobs that finished more than `max_age` seconds ago, and jobs whose submission
+        was interrupted (by a crash) more than `max_age` seconds ago.
+
+        Returns:
+            int: Number of jobs deleted.
+        """
+        cutoff = time.time() - max_age
+        with self._lock:
+            job_ids = [row[0] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE finished < ? OR (finished IS NULL AND created < ? AND EXISTS "
+                "(SELECT 1 FROM tasks WHERE tasks.job_id = jobs.id AND tasks.state = 'uploading'))",
+                (cutoff, cutoff),
+            )]
+        return sum(self.delete(job_id) for job_id in job_ids)
+
+    def pending(self) -> int:
+        """
+        Count tasks waiting to be processed or being processed.
+        """
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tasks WHERE state IN ('queued', 'running')").fetchone()[0]
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+
+    def _transaction(self):
+        queue = self
+
+        class _Transaction:
+            def __enter__(self):
+                # Take the write lock up front so concurrent claims never lease the same task
+                queue._lock.acquire()
+                queue._db.execute("BEGIN IMMEDIATE")
+                return queue._db
+
+            def __exit__(self, exc_type, *exc):
+                try:
+                    queue._db.execute("ROLLBACK" if exc_type else "COMMIT")
+                finally:
+                    queue._lock.release()
+
+        return _Transaction()
+
+class JobScheduler:
+    """
+    Processes queued verification jobs in the background of the serving process.
+
+    Each round leases a batch of tasks across jobs and generates one profile per
+    distinct image concurrently, so the FaceNet passes of different jobs share
+    micro-batches and repeated images are analyzed once. Job work only starts while the
+    worker pool has an idle worker and is capped at `max_in_flight` images, so
+    synchronous requests are never stuck behind bulk jobs.
+
+    Args:
+        queue (JobQueue): Queue the jobs are read from.
+        profiles (MmapProfileStore | MemoryProfileStore): Store holding the reference profiles.
+        batch_size (int): Tasks leased per round.
+        max_in_flight (int): Images of jobs generated at once.
+
+    Attributes:
+        processed (int): Tasks finished by this process.
+    """
+    def __init__(self, queue: JobQueue, profiles, batch_size: int = JOB_BATCH_SIZE, max_in_flight: int = JOB_MAX_IN_FLIGHT):
+        self.queue = queue
+        self.profiles = profiles
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.processed = 0
+        self._worker = None
+        self._loop = None
+        self._wake = None
+        self._slots = None
+
+    async def start(self):
+        """
+        Start processing jobs on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._worker = loop.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop processing jobs. Tasks leased by the current round are returned to the queue.
+        """
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def notify(self):
+        """
+        Wake the scheduler after a job was submitted.
+        """
+        if self._wake is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def wait(self, job_id: str, timeout: float) -> dict:
+        """
+        Wait until a job finishes or the timeout expires.
+
+        Args:
+            job_id (str): Id of the job.
+            timeout (float): Maximum seconds to wait.
+
+        Returns:
+            dict: Latest job status from `JobQueue.status`, or None if the job does not exist.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            status = await asyncio.to_thread(self.queue.status, job_id)
+            remaining = deadline - time.monotonic()
+            if status is None or status["state"] == "finished" or remaining <= 0:
+                return status
+            await asyncio.sleep(min(JOB_POLL_INTERVAL, remaining))
+
+    async def _run(self):
+        last_purge = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_purge > 60:
+                    await asyncio.to_thread(self.queue.purge)
+                    last_purge = time.monotonic()
+                tasks = await asyncio.to_thread(self.queue.claim, self.batch_size)
+            except sqlite3.Error:
+                logger.exception("Could not read the job queue")
+                tasks = []
+
+            if not tasks:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL * 5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                results = await self._process(tasks)
+                await asyncio.to_thread(self.queue.complete, results)
+                self.processed += len(results)
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self.queue.release, tasks)
+                raise
+            except sqlite3.Error:
+                # Leases expire, so the tasks are processed again later
+                logger.exception("Could not record job results")
+
+    async def _process(self, tasks: list[dict]) -> list[tuple[dict, float, str]]:
+        by_digest = defaultdict(list)
+        for task in tasks:
+            by_digest[task["digest"]].append(task)
+
+        async def verify(digest, image_tasks):
+            try:
+                probe = await self._generate(digest)
+            except Exception as e:
+                return [(task, None, str(e) or type(e).__name__) for task in image_tasks]
+            results = []
+            for task in image_tasks:
+                reference = self.profiles.get(task["profile_id"])
+                if reference is None:
+                    results.append((task, None, "Profile not found"))
+                else:
+                    results.append((task, float(compare_profiles(reference, probe)), None))
+            return results
+
+        groups = await asyncio.gather(*(verify(digest, image_tasks) for digest, image_tasks in by_digest.items()))
+        return [result for group in groups for result in group]
+
+    async def _generate(self, digest: str):
+        async with self._slots:
+            image_bytes = await asyncio.to_thread(self.queue.image, digest)
+            if image_bytes is None:
+                raise ValueError("Image no longer stored")
+            while True:
+                # Yield to synchronous requests, only take a worker that is idle
+                while profile_executor.in_flight >= profile_executor.max_workers:
+                    await asyncio.sleep(JOB_POLL_INTERVAL / 4)
+                try:
+                    return await generate_profile_from_bytes(image_bytes)
+                except ServerOverloadedError as e:
+                    await asyncio.sleep(e.retry_after)
@@ -1,23 +1,40 @@
 import cv2
 import dlib
 import numpy as np
-from .analysis_params import LANDMARK_MAX_DIFFERENCE
+from .analysis_params import LANDMARK_MAX_DIFFERENCE, ANALYSIS_SIZE
+from .face_detection import FaceDetector, DlibHogDetector
+
+# Fixed order of the distances computed by compute_distance_values
+DISTANCE_KEYS = (
+    "inter_eye", "left_eye_to_left_brow", "right_eye_to_right_brow", "nose_to_left_eye",
+    "nose_to_right_eye", "nose_width", "mouth_width", "upper_lip_to_lower_lip",
+    "chin_to_jaw_left", "chin_to_jaw_right", "nose_to_chin",
+    "eye_symmetry", "brow_symmetry", "mouth_symmetry", "jaw_symmetry",
+)
+
+class NoFaceDetectedError(TypeError):
+    """
+    Raised when no face is detected within an image.
+    """
 
 class LandmarkAnalyzer:
     """
-    Analyzes facial landmarks using dlib's face detector and shape predictor.
+    Analyzes facial landmarks using a face detector and dlib's shape predictor.
 
     Args:
         model_filepath (str): Path to dlib's shape predictor model file.
+        face_detector (FaceDetector): Detector finding faces, defaults to dlib's HOG detector.
 
     Attributes:
         dlib_predictor (dlib.shape_predictor): dlib shape predictor.
-        dlib_detector (dlib.get_frontal_face_detector): dlib face detector.
+        dlib_detector (dlib.get_frontal_face_detector): dlib face detector, used directly by the upload pre-check.
+        face_detector (FaceDetector): Detector used for analysis.
     """
-    def __init__(self, model_filepath: str):
+    def __init__(self, model_filepath: str, face_detector: FaceDetector = None):
         # Initalize dlib face detector and predictor
         self.dlib_predictor = dlib.shape_predictor(model_filepath)
-        self.dlib_detector = dlib.get_frontal_face_detector()
+        self.face_detector = face_detector or DlibHogDetector()
+        self.dlib_detector = self.face_detector.detector if isinstance(self.face_detector, DlibHogDetector) else dlib.get_frontal_face_detector()
 
     def extract_landmarks(self, image):
         """
@@ -30,29 +47,72 @@ class LandmarkAnalyzer:
             dlib.full_object_detection: Detected facial landmarks.
 
         Raises:
-            TypeError: If no faces are detected within the image.
+            NoFaceDetectedError: If no faces are detected within the image.
         """
-        # Convert image to grayscale
-        image_grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        image_grayscale = cv2.resize(image, (160, 160))
+        # Resize image to the analysis resolution
+        image_resized = cv2.resize(image, ANALYSIS_SIZE)
+
+        # Extract facial landmarks of the first detected face
+        face = self.detect_face(image_resized)
+        landmarks = self.dlib_predictor(image_resized, face)
+
+        return landmarks
+
+    def detect_face(self, image) -> dlib.rectangle:
+        """
+        Detect the face used for analysis within an image at analysis resolution.
+
+        Args:
+            image (numpy.ndarray): Image resized to ANALYSIS_SIZE.
+
+        Returns:
+            dlib.rectangle: Bounding box of the first detected face.
 
+        Raises:
+            NoFaceDetectedError: If no faces are detected within the image.
+        """
         # Detect faces in image, will use first one for analysis
-        detected_faces = self.dlib_detector(image_grayscale)
+        return self.detect_faces(image)[0]
+
+    def detect_faces(self, image) -> list:
+        """
+        Detect every face within an image.
+
+        Args:
+            image (numpy.ndarray): Input image, grayscale or BGR.
 
-        # Extract facial landmarks
+        Returns:
+            list[dlib.rectangle]: Bounding boxes of the detected faces, in detector order.
+
+        Raises:
+            NoFaceDetectedError: If no faces are detected within the image.
+        """
+        detected_faces = self.face_detector(image)
         if not len(detected_faces):
-            raise TypeError("No faces detected within image")
-        
-        landmarks = self.dlib_predictor(image_grayscale, detected_faces[0])
+            raise NoFaceDetectedError("No faces detected within image")
+
+        return list(detected_faces)
 
+def landmark_points(landmarks) -> np.ndarray:
+    """
+    Convert detected facial landmarks to an array of points.
+
+    Args:
+        landmarks (dlib.full_object_detection | numpy.ndarray): Detected facial landmarks, or their points.
+
+    Returns:
+        numpy.ndarray: Landmark (x, y) coordinates with shape (68, 2).
+    """
+    if isinstance(landmarks, np.ndarray):
         return landmarks
+    return np.array([(p.x, p.y) for p in landmarks.parts()])
 
 def compute_distance_values(landmarks):
     """
     Compute euclidean distances between facial landmarks.
 
     Args:
-        landmarks (dlib.full_object_detection): Detected facial landmarks.
+        landmarks (dlib.full_object_detection | numpy.ndarray): Detected facial landmarks, or their points.
 
     Returns:
         dict: Dictionary of calculated distances between key facial landmarks.
@@ -61,7 +121,7 @@ def compute_distance_values(landmarks):
         ValueError: If the landmark array shape is unexpected.
     """
     # Convert landmarks to numpy array
-    landmark_np = np.array([(p.x, p.y) for p in landmarks.parts()])
+    landmark_np = landmark_points(landmarks)
 
     # Ensure landmark_np has the expected shape (68, 2)
     if landmark_np.shape != (68, 2):
@@ -107,14 +167,49 @@ def compare_distances(face1_distances: dict, face2_distances: dict) -> float:
     Returns:
         float: Confidence score based on the similarity of the distances.
     """
-    # Calculate differences between each face's distances
-    differences = {key: abs(face1_distances[key] - face2_distances[key]) for key in face1_distances}
+    keys = list(face1_distances)
+    return compare_distance_vectors(
+        np.array([face1_distances[key] for key in keys]),
+        np.array([face2_distances[key] for key in keys]),
+    )
+
+def compare_distance_vectors(face1_distances: np.ndarray, face2_distances: np.ndarray) -> float:
+    """
+    Compare distances between two sets of facial landmarks stored in the same key order.
+
+    Args:
+        face1_distances (numpy.ndarray): Distances for the first face.
+        face2_distances (numpy.ndarray): Distances for the second face.
+
+    Returns:
+        float: Confidence score based on the similarity of the distances.
+    """
+    return float(compare_distance_matrix(face1_distances, np.asarray(face2_distances)[None, :])[0])
+
+def compare_distance_matrix(probe_distances: np.ndarray, gallery_distances: np.ndarray, tolerance: np.ndarray = None) -> np.ndarray:
+    """
+    Compare the landmark distances of one face against many faces at once.
+
+    Args:
+        probe_distances (numpy.ndarray): Distances of the probe face, ordered as DISTANCE_KEYS.
+        gallery_distances (numpy.ndarray): Distances of the gallery faces with shape (N, 15).
+        tolerance (numpy.ndarray): Optional per-distance differences ignored, broadcastable to (N, 15),
+            such as the spread of enrolled templates.
+
+    Returns:
+        numpy.ndarray: Confidence score against each gallery face, with shape (N,).
+    """
+    probe_distances = np.asarray(probe_distances, dtype=np.float64)
+    gallery_distances = np.asarray(gallery_distances, dtype=np.float64)
 
-    # Sum of differences to get a single similarity measure
-    total_difference = sum(differences.values())
+    # Sum of differences to get a single similarity measure per face
+    differences = np.abs(gallery_distances - probe_distances)
+    if tolerance is not None:
+        differences = np.maximum(0, differences - tolerance)
+    total_difference = np.sum(differences, axis=1)
 
     # Normalize the total difference and compute confidence score
     normalized_difference = total_difference / LANDMARK_MAX_DIFFERENCE
-    confidence_score = max(0, 100 * (1 - normalized_difference))
+    confidence_scores = np.maximum(0, 100 * (1 - normalized_difference))
 
-    return confidence_score
+    return confidence_scores
@@ -0,0 +1,57 @@
+import importlib
+import threading
+import time
+import types
+
+# Seconds spent importing each lazily imported module, in load order
+import_times = {}
+_import_lock = threading.RLock()
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is only imported on first attribute access.
+
+    Heavy libraries (torch, torchvision, facenet_pytorch) take seconds to import, so
+    modules bind them through `lazy_import` and endpoints that never touch a model
+    never pay for them.
+
+    Args:
+        name (str): Fully qualified module name.
+    """
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            with _import_lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    import_times.setdefault(self.__name__, time.perf_counter() - start)
+                    self.__dict__["_module"] = module
+        return module
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Bind a module that is imported on first attribute access.
+
+    Args:
+        name (str): Fully qualified module name, e.g. "torch.nn.functional".
+
+    Returns:
+        LazyModule: Proxy forwarding attribute access to the imported module.
+    """
+    return LazyModule(name)
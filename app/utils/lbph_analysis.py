@@ -1,12 +1,18 @@
+from functools import lru_cache
 import cv2
 import numpy as np
-from skimage.feature import local_binary_pattern
-from .analysis_params import LBP_TEXTURE_LEVELS, LBP_MAX_DISTANCE
+from .analysis_params import LBP_TEXTURE_LEVELS, LBP_MAX_DISTANCE, LBP_SIZE, LBP_ENGINE, LBP_LEVELS, LBP_GRID_SIZE
+from .lazy_imports import lazy_import
+
+skimage_feature = lazy_import("skimage.feature")
 
 def extract_lbp_histogram(image, P=LBP_TEXTURE_LEVELS[0], R=LBP_TEXTURE_LEVELS[1]) -> np.array:
     """
     Extract Local Binary Pattern (LBP) histogram from the input image.
 
+    With the default (P, R) the full LBP descriptor is returned, which includes the
+    multi-scale levels and spatial grid when those are enabled.
+
     Args:
         image (numpy.ndarray): Input image in BGR format.
         P (int): Number of circularly symmetric neighbor set points (default from LBP_TEXTURE_LEVELS).
@@ -17,18 +23,220 @@ def extract_lbp_histogram(image, P=LBP_TEXTURE_LEVELS[0], R=LBP_TEXTURE_LEVELS[1
     """
     # Convert image to grayscale
     image_grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    image_grayscale = cv2.resize(image_grayscale, (128, 128))
+    image_grayscale = cv2.resize(image_grayscale, LBP_SIZE)
     image_grayscale = cv2.equalizeHist(image_grayscale)
 
-    # Generate LBP of image and its histogram
-    image_lbp = local_binary_pattern(image_grayscale, P, R, method="uniform")
-    image_lbp_hist, _ = np.histogram(image_lbp.ravel(), bins=np.arange(0, P + 3), range=(0, P + 2))
+    if (P, R) == tuple(LBP_TEXTURE_LEVELS):
+        return lbp_descriptor_from_gray(image_grayscale)
+    return lbp_histogram_from_gray(image_grayscale, P, R)
+
+@lru_cache(maxsize=None)
+def _sampling_weights(P: int, R: float, height: int, width: int) -> list[tuple]:
+    # Neighbor offsets rounded like skimage, with its per-row and per-column bilinear weights
+    angles = 2 * np.pi * np.arange(P) / P
+    row_offsets = np.round(-R * np.sin(angles), 5)
+    col_offsets = np.round(R * np.cos(angles), 5)
+    rows, cols = np.arange(height, dtype=np.float64), np.arange(width, dtype=np.float64)
+
+    samples = []
+    for row_offset, col_offset in zip(row_offsets, col_offsets):
+        sample_rows, sample_cols = rows + row_offset, cols + col_offset
+        row_fraction = (sample_rows - np.floor(sample_rows))[:, None]
+        col_fraction = (sample_cols - np.floor(sample_cols))[None, :]
+        samples.append((
+            int(np.floor(row_offset)), int(np.ceil(row_offset)), int(np.floor(col_offset)), int(np.ceil(col_offset)),
+            1 - row_fraction, row_fraction, 1 - col_fraction, col_fraction,
+            bool(row_fraction.any()), bool(col_fraction.any()),
+        ))
+    return samples
+
+@lru_cache(maxsize=None)
+def _uniform_table(P: int) -> np.ndarray:
+    # Uniform code indexed by (min(transitions, 3), ones): the ones count if at most 2 transitions, else P + 1
+    table = np.empty((4, P + 1), dtype=np.uint8)
+    table[:] = np.arange(P + 1)
+    table[3] = P + 1
+    return table.ravel()
+
+def uniform_lbp_codes(image_grayscale: np.ndarray, P=LBP_TEXTURE_LEVELS[0], R=LBP_TEXTURE_LEVELS[1]) -> np.ndarray:
+    """
+    Compute uniform LBP codes with vectorized NumPy, identical to skimage's "uniform" method.
+
+    Each of the P neighbors is sampled for the whole image at once from shifted views of a
+    zero-padded copy, using bilinear weights precomputed per (P, R) and image size with
+    skimage's arithmetic. Ones and 0-1 transitions are accumulated per neighbor, then mapped
+    to uniform codes through a lookup table.
+
+    Args:
+        image_grayscale (numpy.ndarray): Grayscale image.
+        P (int): Number of circularly symmetric neighbor set points (default from LBP_TEXTURE_LEVELS).
+        R (int): Radius of circle (default from LBP_TEXTURE_LEVELS).
+
+    Returns:
+        numpy.ndarray: Uniform LBP code of every pixel, from 0 to P + 1.
+    """
+    image = np.asarray(image_grayscale, dtype=np.float64)
+    height, width = image.shape
+    pad = int(np.ceil(R)) + 1
+    padded = np.zeros((height + 2 * pad, width + 2 * pad))
+    padded[pad:pad + height, pad:pad + width] = image
+
+    def view(row_offset, col_offset):
+        return padded[pad + row_offset:pad + row_offset + height, pad + col_offset:pad + col_offset + width]
+
+    top, bottom, term = np.empty_like(image), np.empty_like(image), np.empty_like(image)
+    bits, previous = np.empty(image.shape, dtype=bool), np.empty(image.shape, dtype=bool)
+    ones, transitions = np.zeros(image.shape, dtype=np.uint8), np.zeros(image.shape, dtype=np.uint8)
+
+    for i, (r0, r1, c0, c1, w_r0, w_r1, w_c0, w_c1, row_fractional, col_fractional) in enumerate(_sampling_weights(P, R, height, width)):
+        # Bilinear interpolation, skipped along axes where the neighbor falls on whole pixels
+        if col_fractional:
+            np.multiply(w_c0, view(r0, c0), out=top)
+            top += np.multiply(w_c1, view(r0, c1), out=term)
+        else:
+            top[...] = view(r0, c0)
+        if row_fractional:
+            if col_fractional:
+                np.multiply(w_c0, view(r1, c0), out=bottom)
+                bottom += np.multiply(w_c1, view(r1, c1), out=term)
+            else:
+                bottom[...] = view(r1, c0)
+            top *= w_r0
+            bottom *= w_r1
+            top += bottom
+
+        # Threshold against the center pixel and count transitions with the previous neighbor
+        np.greater_equal(top, image, out=bits)
+        ones += bits
+        if i:
+            transitions += np.not_equal(bits, previous, out=previous)
+        bits, previous = previous, bits
+
+    np.minimum(transitions, 3, out=transitions)
+    return _uniform_table(P)[transitions.astype(np.intp) * (P + 1) + ones]
+
+def lbp_codes(images_grayscale: np.ndarray, P=LBP_TEXTURE_LEVELS[0], R=LBP_TEXTURE_LEVELS[1]) -> np.ndarray:
+    """
+    Compute uniform LBP codes of several grayscale images with the LBP_ENGINE implementation.
+
+    The skimage engine stacks the images into one mosaic separated by zero rows at least
+    R + 1 high. Samples outside an image then read zeros, exactly like at the border of a
+    standalone image, so a single LBP call gives the same codes as one call per image.
+
+    Args:
+        images_grayscale (numpy.ndarray): Grayscale images with shape (N, H, W).
+        P (int): Number of circularly symmetric neighbor set points (default from LBP_TEXTURE_LEVELS).
+        R (int): Radius of circle (default from LBP_TEXTURE_LEVELS).
+
+    Returns:
+        numpy.ndarray: Integer codes with shape (N, H, W).
+    """
+    if LBP_ENGINE == "numpy":
+        return np.stack([uniform_lbp_codes(image, P, R) for image in images_grayscale]).astype(np.int64)
+
+    count, height, width = images_grayscale.shape
+    gap = int(np.ceil(R)) + 1
+
+    # Generate LBP of the mosaic and cut out each image's codes
+    mosaic = np.zeros((count * (height + gap), width), dtype=images_grayscale.dtype)
+    mosaic.reshape(count, height + gap, width)[:, :height] = images_grayscale
+    mosaic_lbp = skimage_feature.local_binary_pattern(mosaic, P, R, method="uniform")
+    return mosaic_lbp.reshape(count, height + gap, width)[:, :height].astype(np.int64)
+
+def lbp_histograms_from_codes(codes: np.ndarray, P=LBP_TEXTURE_LEVELS[0], grid_size: int = 1) -> np.ndarray:
+    """
+    Compute normalized LBP histograms per cell of a spatial grid.
+
+    Args:
+        codes (numpy.ndarray): Uniform LBP codes with shape (N, H, W).
+        P (int): Number of neighbor set points the codes were computed with.
+        grid_size (int): Cells per side of the grid, 1 histograms the whole image.
+
+    Returns:
+        numpy.ndarray: Histograms with shape (N, grid_size ** 2 * (P + 2)), each cell normalized separately.
+    """
+    count, height, width = codes.shape
+    bins = P + 2
+    cells = grid_size * grid_size
+
+    # Histogram every image and cell with one bincount by offsetting codes per image and cell
+    cell_rows = (np.arange(height) * grid_size // height)[:, None]
+    cell_cols = (np.arange(width) * grid_size // width)[None, :]
+    offsets = (cell_rows * grid_size + cell_cols) * bins + (np.arange(count) * cells * bins)[:, None, None]
+    histograms = np.bincount((codes + offsets).ravel(), minlength=count * cells * bins).reshape(count * cells, bins)
+
+    # Normalize the histograms
+    histograms = histograms.astype("float")
+    histograms /= (histograms.sum(axis=1, keepdims=True) + 1e-6)
 
-    # Normalize the histogram
-    image_lbp_hist = image_lbp_hist.astype("float")
-    image_lbp_hist /= (image_lbp_hist.sum() + 1e-6)
+    return histograms.reshape(count, cells * bins)
 
-    return image_lbp_hist
+def lbp_histogram_from_gray(image_grayscale, P=LBP_TEXTURE_LEVELS[0], R=LBP_TEXTURE_LEVELS[1]) -> np.array:
+    """
+    Compute the normalized LBP histogram of an equalized grayscale image.
+
+    Args:
+        image_grayscale (numpy.ndarray): Histogram-equalized grayscale image at LBP_SIZE.
+        P (int): Number of circularly symmetric neighbor set points (default from LBP_TEXTURE_LEVELS).
+        R (int): Radius of circle (default from LBP_TEXTURE_LEVELS).
+
+    Returns:
+        numpy.ndarray: Normalized histogram of the LBP of the image.
+    """
+    return lbp_histograms_from_gray(np.asarray(image_grayscale)[None], P, R)[0]
+
+def lbp_histograms_from_gray(images_grayscale: np.ndarray, P=LBP_TEXTURE_LEVELS[0], R=LBP_TEXTURE_LEVELS[1]) -> np.ndarray:
+    """
+    Compute the normalized LBP histograms of several equalized grayscale images in one pass.
+
+    Args:
+        images_grayscale (numpy.ndarray): Histogram-equalized grayscale images with shape (N, H, W).
+        P (int): Number of circularly symmetric neighbor set points (default from LBP_TEXTURE_LEVELS).
+        R (int): Radius of circle (default from LBP_TEXTURE_LEVELS).
+
+    Returns:
+        numpy.ndarray: Normalized histograms with shape (N, P + 2).
+    """
+    return lbp_histograms_from_codes(lbp_codes(images_grayscale, P, R), P)
+
+def lbp_descriptor_from_gray(image_grayscale: np.ndarray) -> np.ndarray:
+    """
+    Compute the LBP descriptor stored in profiles for an equalized grayscale image.
+
+    Args:
+        image_grayscale (numpy.ndarray): Histogram-equalized grayscale image at LBP_SIZE.
+
+    Returns:
+        numpy.ndarray: Descriptor with LBP_BINS values, see `lbp_descriptors_from_gray`.
+    """
+    return lbp_descriptors_from_gray(np.asarray(image_grayscale)[None])[0]
+
+def lbp_descriptors_from_gray(images_grayscale: np.ndarray, levels=LBP_LEVELS, grid_size: int = LBP_GRID_SIZE) -> np.ndarray:
+    """
+    Compute the LBP descriptors of several equalized grayscale images.
+
+    The descriptor concatenates the grid cell histograms of every (P, R) level. Every
+    cell histogram is normalized, then the whole descriptor is scaled to sum to one, so
+    chi-square distances stay on the scale of a single histogram. With one level and a
+    1x1 grid it is exactly the LBP_TEXTURE_LEVELS histogram.
+
+    Args:
+        images_grayscale (numpy.ndarray): Histogram-equalized grayscale images with shape (N, H, W).
+        levels (tuple): (P, R) levels, defaults to LBP_LEVELS.
+        grid_size (int): Cells per side of the spatial grid, defaults to LBP_GRID_SIZE.
+
+    Returns:
+        numpy.ndarray: Descriptors with shape (N, sum(P + 2) * grid_size ** 2).
+    """
+    descriptors = np.concatenate([
+        lbp_histograms_from_codes(lbp_codes(images_grayscale, P, R), P, grid_size)
+        for P, R in levels
+    ], axis=1)
+
+    blocks = len(levels) * grid_size * grid_size
+    if blocks > 1:
+        descriptors /= blocks
+    return descriptors
 
 def compare_lbp_histograms(face1_histogram: list[float], face2_histogram: list[float]) -> float:
     """
@@ -41,11 +249,24 @@ def compare_lbp_histograms(face1_histogram: list[float], face2_histogram: list[f
     Returns:
         float: Confidence score based on the similarity of the histograms.
     """
+    return float(compare_lbp_histogram_matrix(face1_histogram, np.asarray(face2_histogram)[None, :])[0])
+
+def compare_lbp_histogram_matrix(probe_histogram: np.ndarray, gallery_histograms: np.ndarray) -> np.ndarray:
+    """
+    Compare the LBP histogram of one face against many histograms at once using the chi-square distance.
+
+    Args:
+        probe_histogram (numpy.ndarray): LBP histogram of the probe face.
+        gallery_histograms (numpy.ndarray): LBP histograms of the gallery faces with shape (N, P + 2).
+
+    Returns:
+        numpy.ndarray: Confidence score against each gallery face, with shape (N,).
+    """
     # Convert to numpy arrays
-    face1_histogram = np.array(face1_histogram)
-    face2_histogram = np.array(face2_histogram)
+    probe_histogram = np.asarray(probe_histogram, dtype=np.float64)
+    gallery_histograms = np.asarray(gallery_histograms, dtype=np.float64)
 
-    chi_sq_dist = 0.5 * np.sum(((face1_histogram - face2_histogram) ** 2) / (face1_histogram + face2_histogram + 1e-6))
-    confidence_score = max(0, 100 * (1 - (chi_sq_dist / LBP_MAX_DISTANCE)))
+    chi_sq_dist = 0.5 * np.sum(((gallery_histograms - probe_histogram) ** 2) / (gallery_histograms + probe_histogram + 1e-6), axis=1)
+    confidence_scores = np.maximum(0, 100 * (1 - (chi_sq_dist / LBP_MAX_DISTANCE)))
 
-    return confidence_score
\ No newline at end of file
+    return confidence_scores
@@ -0,0 +1,186 @@
+import bisect
+import threading
+
+# Latency buckets in seconds, from sub-millisecond scoring up to multi-second uploads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered in the Prometheus text exposition format.
+    """
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """
+        Add a metric to the registry.
+
+        Args:
+            metric (Counter | Gauge | Histogram): Metric to add.
+
+        Returns:
+            Counter | Gauge | Histogram: The registered metric.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Render every metric.
+
+        Returns:
+            str: Metrics in the Prometheus text exposition format.
+        """
+        return "".join(metric.render() for metric in self._metrics)
+
+class _Metric:
+    # Shared name, help text and label handling
+    kind = None
+
+    def __init__(self, name: str, description: str, labelnames: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _header(self) -> str:
+        return f"# HELP {self.name} {self.description}\n# TYPE {self.name} {self.kind}\n"
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, optionally split by labels.
+    """
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> str:
+        with self._lock:
+            values = self._values if self._values or self.labelnames else {(): 0}
+            lines = [f"{self.name}{self._labels(key)} {value}\n" for key, value in values.items()]
+        return self._header() + "".join(lines)
+
+class Gauge(_Metric):
+    """
+    Point-in-time value, either set explicitly or read from a callback at render time.
+
+    Args:
+        function (callable): Optional callback returning the current value.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, function=None):
+        super().__init__(name, description)
+        self.function = function
+
+    def set(self, value: float):
+        with self._lock:
+            self._values[()] = value
+
+    def render(self) -> str:
+        value = self.function() if self.function is not None else self._values.get((), 0)
+        return self._header() + f"{self.name} {value}\n"
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed cumulative buckets.
+
+    Args:
+        buckets (tuple[float]): Upper bounds of the buckets, in increasing order.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for key, (bucket_counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}\n")
+                lines.append(f"{self.name}_sum{self._labels(key)} {total}\n")
+                lines.append(f"{self.name}_count{self._labels(key)} {count}\n")
+        return self._header() + "".join(lines)
+
+def format_server_timing(timings: dict) -> str:
+    """
+    Format per-stage timings as a Server-Timing header value.
+
+    Args:
+        timings (dict): Seconds spent per stage.
+
+    Returns:
+        str: Header value with one metric per stage, durations in milliseconds.
+    """
+    return ", ".join(f"{stage};dur={1000 * seconds:.2f}" for stage, seconds in timings.items())
+
+metrics_registry = MetricsRegistry()
+
+STAGE_LATENCY = metrics_registry.register(Histogram(
+    "profile_stage_duration_seconds", "Time spent per profile generation and comparison stage", ("stage",)))
+REQUEST_LATENCY = metrics_registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+REQUESTS = metrics_registry.register(Counter(
+    "http_requests_total", "HTTP requests by response status", ("method", "route", "status")))
+FACES_NOT_FOUND = metrics_registry.register(Counter(
+    "faces_not_found_total", "Images in which no face was detected"))
+PROFILE_ERRORS = metrics_registry.register(Counter(
+    "profile_generation_errors_total", "Profile generation failures by exception type", ("error",)))
+BATCH_SIZE = metrics_registry.register(Histogram(
+    "facenet_batch_size", "Images per batched FaceNet forward pass", buckets=(1, 2, 4, 8, 16, 32, 64)))
+BATCH_QUEUE_WAIT = metrics_registry.register(Histogram(
+    "facenet_batch_queue_wait_seconds", "Time images wait in the micro-batcher queue"))
+FEATURE_CACHE_LOOKUPS = metrics_registry.register(Counter(
+    "feature_cache_lookups_total", "Feature cache lookups by result (memory_hit, disk_hit or miss)", ("result",)))
+FEATURE_CACHE_EVICTIONS = metrics_registry.register(Counter(
+    "feature_cache_evictions_total", "Profiles evicted from the feature cache"))
+JOB_TASKS = metrics_registry.register(Counter(
+    "job_tasks_total", "Verification job tasks by state reached (queued, completed or failed)", ("state",)))
+CASCADE_STAGES = metrics_registry.register(Counter(
+    "verification_cascade_stages_total", "Verification cascade stages by outcome (run or skipped)", ("stage", "outcome")))
+
+def record_stage_timings(timings: dict):
+    """
+    Observe a set of per-stage timings in the stage latency histogram.
+
+    Args:
+        timings (dict): Seconds spent per stage.
+    """
+    for stage, seconds in timings.items():
+        STAGE_LATENCY.observe(seconds, stage=stage)
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+import dlib
+import numpy as np
+from .analysis_params import LANDMARK_MODEL_PATH, FACENET_PRETRAINED, FACENET_BACKEND, TORCH_NUM_THREADS, FACE_DETECTOR
+from .face_detection import create_face_detector
+from .facenet_backends import FacenetBackend
+from .lazy_imports import lazy_import
+from .landmark_analysis import LandmarkAnalyzer
+
+# Path to dlib models
+relative_path = os.path.dirname(os.path.abspath(__file__))
+dlib_predictor_filepath = os.path.join(relative_path, LANDMARK_MODEL_PATH)
+
+torch = lazy_import("torch")
+facenet_pytorch = lazy_import("facenet_pytorch")
+
+class ModelRegistry:
+    """
+    Process-wide registry holding the models used for profile generation.
+
+    Models are loaded once (at startup through the FastAPI lifespan hook, or lazily on
+    first use) and shared by every request instead of being rebuilt per call.
+
+    Attributes:
+        ready (bool): True once every model has been loaded and warmed up.
+        load_times (dict): Seconds spent loading and warming each model.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._facenet = None
+        self._landmark_analyzer = None
+        self.ready = False
+        self.load_times = {}
+
+    @property
+    def facenet(self) -> FacenetBackend:
+        """
+        FaceNet model wrapped in the FACENET_BACKEND inference backend, loaded on first access if startup did not load it.
+        """
+        if self._facenet is None:
+            with self._lock:
+                if self._facenet is None:
+                    self._facenet = self._load_facenet()
+        return self._facenet
+
+    @property
+    def landmark_analyzer(self) -> LandmarkAnalyzer:
+        """
+        Landmark analyzer wrapping the FACE_DETECTOR face detector and dlib shape predictor.
+        """
+        if self._landmark_analyzer is None:
+            with self._lock:
+                if self._landmark_analyzer is None:
+                    self._landmark_analyzer = self._load_landmark_analyzer()
+        return self._landmark_analyzer
+
+    def load(self, num_threads: int = TORCH_NUM_THREADS):
+        """
+        Load and warm up every model, then mark the registry as ready.
+
+        Args:
+            num_threads (int): Intra-op thread budget for torch (0 keeps torch default).
+        """
+        with self._lock:
+            if num_threads > 0:
+                torch.set_num_threads(num_threads)
+            self.facenet
+            self.landmark_analyzer
+            self.ready = True
+
+    def status(self) -> dict:
+        """
+        Report the readiness state of the registry.
+
+        Returns:
+            dict: Readiness flag, loaded models, per-model load times and torch thread budget.
+        """
+        return {
+            "ready": self.ready,
+            "models": {
+                "facenet": self._facenet is not None,
+                "landmark_analyzer": self._landmark_analyzer is not None,
+            },
+            "load_times": dict(self.load_times),
+            "facenet_backend": self._facenet.name if self._facenet is not None else FACENET_BACKEND,
+            "face_detector": FACE_DETECTOR,
+            "torch_num_threads": torch.get_num_threads() if self._facenet is not None else None,
+        }
+
+    def memory_bytes(self) -> int:
+        """
+        Estimate the memory held by the loaded models.
+
+        Returns:
+            int: FaceNet weight and buffer bytes plus the size of the dlib shape predictor file.
+        """
+        total = 0
+        if self._facenet is not None:
+            total += self._facenet.nbytes
+        if self._landmark_analyzer is not None:
+            total += os.path.getsize(dlib_predictor_filepath)
+        return total
+
+    def _load_facenet(self) -> FacenetBackend:
+        start = time.perf_counter()
+        model = FacenetBackend(facenet_pytorch.InceptionResnetV1(pretrained=FACENET_PRETRAINED).eval(), FACENET_BACKEND)
+
+        # Warm up with a dummy forward pass so the first request avoids lazy allocations
+        model(torch.zeros(1, 3, 160, 160))
+
+        self.load_times["facenet"] = time.perf_counter() - start
+        return model
+
+    def _load_landmark_analyzer(self) -> LandmarkAnalyzer:
+        start = time.perf_counter()
+        analyzer = LandmarkAnalyzer(dlib_predictor_filepath, create_face_detector(FACE_DETECTOR))
+
+        # Warm up detector and predictor on a blank frame
+        blank = np.zeros((160, 160), dtype=np.uint8)
+        analyzer.face_detector(blank)
+        analyzer.dlib_predictor(blank, dlib.rectangle(0, 0, 159, 159))
+
+        self.load_times["landmark_analyzer"] = time.perf_counter() - start
+        return analyzer
+
+model_registry = ModelRegistry()
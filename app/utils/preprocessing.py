@@ -0,0 +1,171 @@
+import time
+from contextlib import contextmanager
+import cv2
+import numpy as np
+from .analysis_params import DECODE_DRAFT_SIZE, FACE_CROP_MARGIN, MULTI_FACE_DETECT_SIZE
+
+def scale_box(box: tuple, scale_x: float, scale_y: float, width: int, height: int, margin: float = 0.0) -> tuple:
+    """
+    Map a face box from a resized view to full resolution, optionally adding a margin, clamped to the frame.
+
+    Args:
+        box (tuple[int, int, int, int]): Face box as (left, top, right, bottom) in view coordinates.
+        scale_x (float): Full-resolution pixels per view pixel horizontally.
+        scale_y (float): Full-resolution pixels per view pixel vertically.
+        width (int): Full-resolution frame width.
+        height (int): Full-resolution frame height.
+        margin (float): Margin added on each side, as a fraction of the box size.
+
+    Returns:
+        tuple[int, int, int, int]: Box at full resolution.
+    """
+    left, top, right, bottom = box
+    margin_x, margin_y = margin * (right - left), margin * (bottom - top)
+    return (
+        max(0, int((left - margin_x) * scale_x)),
+        max(0, int((top - margin_y) * scale_y)),
+        min(width, int((right + margin_x) * scale_x)),
+        min(height, int((bottom + margin_y) * scale_y)),
+    )
+
+def alignment_matrix(points: np.ndarray) -> np.ndarray:
+    """
+    Affine matrix rotating a face view about the midpoint of its eyes so that they are level.
+
+    Rotation keeps distances between landmarks unchanged, so landmarks found before
+    alignment still give the same distance features.
+
+    Args:
+        points (numpy.ndarray): 68 landmark points in view coordinates, with shape (68, 2).
+
+    Returns:
+        numpy.ndarray: 2x3 affine matrix for cv2.warpAffine.
+    """
+    left_eye, right_eye = points[36:42].mean(axis=0), points[42:48].mean(axis=0)
+    dx, dy = right_eye - left_eye
+    center = (left_eye + right_eye) / 2
+    return cv2.getRotationMatrix2D((float(center[0]), float(center[1])), float(np.degrees(np.arctan2(dy, dx))), 1.0)
+
+def scale_matrix(matrix: np.ndarray, from_size: tuple, to_size: tuple) -> np.ndarray:
+    """
+    Express an affine matrix given for a view of one size in the coordinates of the same view resized.
+
+    Args:
+        matrix (numpy.ndarray): 2x3 affine matrix in `from_size` coordinates.
+        from_size (tuple[int, int]): Width and height the matrix was computed for.
+        to_size (tuple[int, int]): Width and height of the resized view.
+
+    Returns:
+        numpy.ndarray: 2x3 affine matrix in `to_size` coordinates.
+    """
+    scale = np.diag([to_size[0] / from_size[0], to_size[1] / from_size[1], 1.0])
+    return (scale @ np.vstack([matrix, [0, 0, 1]]) @ np.linalg.inv(scale))[:2]
+
+def align_face(image: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Apply an alignment matrix to a face view, replicating the border into uncovered corners.
+
+    Args:
+        image (numpy.ndarray): Face view.
+        matrix (numpy.ndarray): 2x3 affine matrix in the coordinates of `image`.
+
+    Returns:
+        numpy.ndarray: Aligned view of the same size.
+    """
+    return cv2.warpAffine(image, matrix, (image.shape[1], image.shape[0]), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+class PreparedImage:
+    """
+    Per-request cache of the decoded image and the views derived from it.
+
+    The image is decoded once and each derived view (BGR frame, downscaled detection
+    views) is computed on first use and reused by every stage that needs it. Faces are
+    cropped from the full-resolution RGB frame.
+
+    Args:
+        image_file (PIL.Image.Image): Input image file, decoded lazily by PIL.
+        draft_size (int): Minimum side length for reduced-resolution JPEG decoding, 0 decodes at full resolution.
+
+    Attributes:
+        timings (dict): Seconds spent per preprocessing and analysis stage.
+    """
+    def __init__(self, image_file, draft_size: int = DECODE_DRAFT_SIZE):
+        self.timings = {}
+        self._views = {}
+
+        with self.timed("decode"):
+            # JPEG draft mode decodes straight to a reduced scale that still covers draft_size
+            if draft_size and image_file.format == "JPEG":
+                image_file.draft("RGB", (draft_size, draft_size))
+            self.rgb = np.asarray(image_file.convert("RGB"))
+
+    @contextmanager
+    def timed(self, stage: str):
+        """
+        Accumulate the time spent in a block under a stage name.
+
+        Args:
+            stage (str): Stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def view(self, name: str, compute):
+        """
+        Return a cached view, computing and timing it on first use.
+
+        Args:
+            name (str): View name, also used as its timing stage.
+            compute (callable): Function computing the view.
+
+        Returns:
+            Any: The cached view.
+        """
+        if name not in self._views:
+            with self.timed(name):
+                self._views[name] = compute()
+        return self._views[name]
+
+    @property
+    def detection_bgr(self) -> np.ndarray:
+        """
+        Full frame in BGR format with its longest side at most MULTI_FACE_DETECT_SIZE, keeping the aspect ratio.
+        """
+        return self.downscaled_bgr(MULTI_FACE_DETECT_SIZE)
+
+    def downscaled_bgr(self, max_side: int) -> np.ndarray:
+        """
+        Full frame in BGR format with its longest side at most `max_side`, keeping the aspect ratio.
+
+        Args:
+            max_side (int): Longest side of the view.
+
+        Returns:
+            numpy.ndarray: Downscaled frame, or the full frame if it is already small enough.
+        """
+        def compute():
+            height, width = self.rgb.shape[:2]
+            scale = min(1.0, max_side / max(height, width))
+            # Subsample large frames to about twice the view first, area averaging every full-resolution pixel dominates otherwise
+            step = max(1, int(1 / scale) // 2)
+            view = cv2.resize(self.rgb[::step, ::step], (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+            return cv2.cvtColor(view, cv2.COLOR_RGB2BGR)
+        return self.view(f"detection_bgr_{max_side}", compute)
+
+    def crop_box(self, box: tuple, scale_x: float, scale_y: float) -> tuple:
+        """
+        Map a face box from a resized view to full resolution, adding FACE_CROP_MARGIN and clamping to the frame.
+
+        Args:
+            box (tuple[int, int, int, int]): Face box as (left, top, right, bottom) in view coordinates.
+            scale_x (float): Full-resolution pixels per view pixel horizontally.
+            scale_y (float): Full-resolution pixels per view pixel vertically.
+
+        Returns:
+            tuple[int, int, int, int]: Crop box at full resolution.
+        """
+        height, width = self.rgb.shape[:2]
+        return scale_box(box, scale_x, scale_y, width, height, FACE_CROP_MARGIN)
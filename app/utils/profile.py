@@ -1,77 +1,648 @@
-from app.models import Profile
-from .analysis_params import LANDMARK_MODEL_PATH, LM_WEIGHT, DF_WEIGHT, LBPH_WEIGHT
+from __future__ import annotations
+from .analysis_params import LM_WEIGHT, DF_WEIGHT, LBPH_WEIGHT, TEMPLATE_LANDMARK_TOLERANCE, MICRO_BATCHING_ENABLED, FEATURE_CACHE_ENABLED
+from .analysis_params import ANALYSIS_SIZE, LBP_SIZE, MULTI_FACE_MAX_FACES, FACE_ALIGNMENT, FACE_DETECT_SIZE
+from .analysis_params import CONFIDENCE_THRESHOLD, CASCADE_MODE, CASCADE_FACENET_RANGE
+import asyncio
+import time
+from contextlib import contextmanager, nullcontext
 import numpy as np
-from .deep_analysis import extract_deep_features, compare_embeddings
-from .landmark_analysis import LandmarkAnalyzer, compute_distance_values, compare_distances
-from .lbph_analysis import extract_lbp_histogram, compare_lbp_histograms
+from .deep_analysis import rgb_to_tensor, embed_image_tensors, compare_embedding_matrix
+from .landmark_analysis import DISTANCE_KEYS, NoFaceDetectedError, landmark_points, compute_distance_values, compare_distance_matrix
+from .lbph_analysis import lbp_descriptors_from_gray, compare_lbp_histogram_matrix
+from .model_registry import model_registry
+from .batching import embedding_batcher
+from .executor import profile_executor, ServerOverloadedError
+from .metrics import FACES_NOT_FOUND, PROFILE_ERRORS, STAGE_LATENCY, CASCADE_STAGES, record_stage_timings
+from .compact_profile import CompactProfile, as_compact
+from .preprocessing import PreparedImage, scale_box, alignment_matrix, scale_matrix, align_face
+from .feature_cache import feature_cache
+from .ingest import ImageUpload, inspect_image, precheck_face
+from .lazy_imports import lazy_import
 import cv2
-import os
+import dlib
 
-# Path to dlib models
-relative_path = os.path.dirname(os.path.abspath(__file__))
-dlib_predictor_filepath = os.path.join(relative_path, LANDMARK_MODEL_PATH)
+torch = lazy_import("torch")
 
-lm_analyzer = LandmarkAnalyzer(dlib_predictor_filepath)
+@contextmanager
+def record_failures():
+    """
+    Count profile generation failures by cause in the metrics registry.
+    """
+    try:
+        yield
+    except ServerOverloadedError:
+        raise
+    except NoFaceDetectedError:
+        FACES_NOT_FOUND.inc()
+        raise
+    except Exception as e:
+        PROFILE_ERRORS.inc(error=type(e).__name__)
+        raise
+
+def prepare_image(image_file, precheck_size: int = 0) -> PreparedImage:
+    """
+    Decode an input image into its shared views, first ruling out large uploads without a face.
+
+    Args:
+        image_file (PIL.Image.Image | ImageUpload): Input image file, or validated upload bytes.
+        precheck_size (int): Longest side of the view the caller searches for faces, which large
+            uploads are pre-checked at. 0 skips the pre-check.
+
+    Returns:
+        PreparedImage: Per-request view cache of the decoded image.
+
+    Raises:
+        NoFaceDetectedError: If the reduced-resolution pre-check finds no face.
+    """
+    if not isinstance(image_file, ImageUpload):
+        return PreparedImage(image_file)
+    if not precheck_size:
+        return PreparedImage(image_file.open())
+
+    start = time.perf_counter()
+    precheck_face(image_file, precheck_size)
+    precheck_seconds = time.perf_counter() - start
+    prepared = PreparedImage(image_file.open())
+    prepared.timings["precheck"] = precheck_seconds
+    return prepared
 
-def generate_profile(image_file) -> Profile:
+def detect_face_boxes(prepared: PreparedImage, view: np.ndarray, max_faces: int) -> tuple[list, list]:
+    """
+    Detect faces on a downscaled view and map their boxes back to full resolution.
+
+    Args:
+        prepared (PreparedImage): Decoded image.
+        view (numpy.ndarray): Downscaled view of the full frame searched for faces.
+        max_faces (int): Maximum number of faces kept, in detector order.
+
+    Returns:
+        tuple: Face boxes and crop boxes with FACE_CROP_MARGIN, both at full resolution as (left, top, right, bottom).
+
+    Raises:
+        NoFaceDetectedError: If no faces are detected within the view.
+    """
+    with prepared.timed("detect"):
+        faces = model_registry.landmark_analyzer.detect_faces(view)[:max_faces]
+    height, width = prepared.rgb.shape[:2]
+    scale_x, scale_y = width / view.shape[1], height / view.shape[0]
+
+    boxes = [scale_box((face.left(), face.top(), face.right(), face.bottom()), scale_x, scale_y, width, height) for face in faces]
+    crop_boxes = [prepared.crop_box((face.left(), face.top(), face.right(), face.bottom()), scale_x, scale_y) for face in faces]
+    return boxes, crop_boxes
+
+def extract_profile_inputs(image_file, align: bool = FACE_ALIGNMENT) -> tuple[np.ndarray, torch.Tensor, np.ndarray, dict]:
+    """
+    Run every profile stage except the FaceNet forward pass.
+
+    The image is decoded once and the face detected once, on a view downscaled to
+    FACE_DETECT_SIZE. The face is then cropped at full resolution and analyzed by
+    `analyze_face_crops`, the same path multi-face and video profiles take, so profiles
+    from every endpoint are comparable with each other.
+
+    Args:
+        image_file (PIL.Image.Image | ImageUpload): Input image file.
+        align (bool): Level the eyes of the face crop.
+
+    Returns:
+        tuple: Landmark distance vector (ordered as DISTANCE_KEYS), preprocessed FaceNet input tensor,
+            LBP histogram, and seconds spent per stage.
+    """
+    prepared = prepare_image(image_file, precheck_size=FACE_DETECT_SIZE)
+    boxes, crop_boxes = detect_face_boxes(prepared, prepared.downscaled_bgr(FACE_DETECT_SIZE), max_faces=1)
+    landmark_distances, image_tensors, lbp_histograms = analyze_face_crops(
+        [(prepared.rgb, boxes[0], crop_boxes[0])], prepared.timed, align=align)
+    return landmark_distances[0], image_tensors, lbp_histograms[0], prepared.timings
+
+def generate_profile(image_file, timings: dict = None) -> CompactProfile:
     """
     Generate a facial profile from the input image.
 
     Args:
-        image_file (PIL.Image.Image): Input image file.
+        image_file (PIL.Image.Image | ImageUpload): Input image file.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
 
     Returns:
-        Profile: Generated profile containing landmark distances, deep features, and LBP histogram.
+        CompactProfile: Generated profile containing landmark distances, deep features, and LBP histogram.
     """
-    # Convert the PIL Image to a NumPy array
-    image = np.array(image_file)
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    landmark_distances, image_tensor, lbp_histogram, stage_timings = extract_profile_inputs(image_file)
 
-    # Extract Features
-    landmark_values = lm_analyzer.extract_landmarks(image)
-    landmark_distances = compute_distance_values(landmark_values)
-    deep_features = extract_deep_features(image).tolist()
-    lbp_histogram = extract_lbp_histogram(image).tolist()
+    start = time.perf_counter()
+    deep_features = embed_image_tensors(image_tensor)
+    stage_timings["facenet"] = time.perf_counter() - start
 
     # Generate profile
-    profile = Profile(
-        landmark_distances=landmark_distances,
-        deep_features=deep_features,
-        lbp_histogram=lbp_histogram,
+    profile = CompactProfile(
+        landmarks=landmark_distances,
+        embedding=deep_features,
+        lbp=lbp_histogram,
     )
 
+    if timings is not None:
+        timings.update(stage_timings)
     return profile
 
+def _generate_profile_with_timings(image_file) -> tuple[CompactProfile, dict]:
+    # Process pool entry point, timings cannot be filled in across processes
+    timings = {}
+    return generate_profile(image_file, timings), timings
+
+async def generate_profile_async(image_file, timings: dict = None) -> CompactProfile:
+    """
+    Generate a facial profile in the worker pool, sharing the FaceNet forward pass with concurrent requests.
+
+    Args:
+        image_file (PIL.Image.Image | ImageUpload): Input image file.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
+
+    Returns:
+        CompactProfile: Generated profile containing landmark distances, deep features, and LBP histogram.
+
+    Raises:
+        ServerOverloadedError: If the worker pool and its queue are saturated.
+        NoFaceDetectedError: If no faces are detected within the image.
+    """
+    with record_failures():
+        async with profile_executor.admit():
+            # Process workers hold their own models, so they run the whole pipeline
+            if profile_executor.backend == "process" or not MICRO_BATCHING_ENABLED:
+                profile, stage_timings = await profile_executor.run(_generate_profile_with_timings, image_file)
+            else:
+                # Deep features are embedded by the micro-batcher, timing includes the batch wait
+                landmark_distances, image_tensor, lbp_histogram, stage_timings = await profile_executor.run(extract_profile_inputs, image_file)
+                start = time.perf_counter()
+                deep_features = await embedding_batcher.embed(image_tensor)
+                stage_timings["facenet"] = time.perf_counter() - start
+
+                # Generate profile
+                profile = CompactProfile(
+                    landmarks=landmark_distances,
+                    embedding=deep_features,
+                    lbp=lbp_histogram,
+                )
+
+    record_stage_timings(stage_timings)
+    if timings is not None:
+        timings.update(stage_timings)
+    return profile
+
+def analyze_face_crops(faces: list[tuple], timed=None, align: bool = FACE_ALIGNMENT) -> tuple[np.ndarray, torch.Tensor, np.ndarray]:
+    """
+    Run every profile stage except the FaceNet forward pass on a batch of face crops.
+
+    Each face is analyzed on its own crop. When aligning, each crop is rotated about the
+    eyes found by the shape predictor so they are level, before FaceNet and LBP see it.
+    The FaceNet inputs are stacked into one batch and the LBP histograms are computed in one pass.
+
+    Args:
+        faces (list[tuple]): Per face, the RGB frame it was found in, its face box and its crop box,
+            both boxes at full resolution as (left, top, right, bottom).
+        timed (callable): Optional context manager factory timing each stage by name, such as PreparedImage.timed.
+        align (bool): Level the eyes of each crop.
+
+    Returns:
+        tuple: Landmark distance vectors (N, 15), FaceNet input batch (N, 3, 160, 160) and LBP histograms (N, P + 2).
+    """
+    timed = timed or (lambda stage: nullcontext())
+    analyzer = model_registry.landmark_analyzer
+
+    # Crop each face with its margin at full resolution
+    face_rgbs, face_grays = [], []
+    with timed("crop"):
+        for rgb, _, (left, top, right, bottom) in faces:
+            crop = rgb[top:bottom, left:right]
+            face_rgbs.append(cv2.resize(crop, ANALYSIS_SIZE))
+            face_grays.append(cv2.resize(cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY), LBP_SIZE))
+
+    # Extract Features
+    matrices = []
+    with timed("landmarks"):
+        landmark_distances = np.empty((len(faces), len(DISTANCE_KEYS)))
+        for i, ((_, box, (left, top, right, bottom)), face_rgb) in enumerate(zip(faces, face_rgbs)):
+            # Face box in the coordinates of the crop resized to ANALYSIS_SIZE
+            crop_scale_x, crop_scale_y = ANALYSIS_SIZE[0] / (right - left), ANALYSIS_SIZE[1] / (bottom - top)
+            face = dlib.rectangle(
+                int((box[0] - left) * crop_scale_x), int((box[1] - top) * crop_scale_y),
+                int((box[2] - left) * crop_scale_x), int((box[3] - top) * crop_scale_y),
+            )
+            points = landmark_points(analyzer.dlib_predictor(cv2.cvtColor(face_rgb, cv2.COLOR_RGB2BGR), face))
+            distances = compute_distance_values(points)
+            landmark_distances[i] = [distances[key] for key in DISTANCE_KEYS]
+            if align:
+                matrices.append(alignment_matrix(points))
+
+    # Distances are rotation invariant, so only the FaceNet and LBP views are aligned
+    if align:
+        with timed("align"):
+            face_rgbs = [align_face(face_rgb, matrix) for face_rgb, matrix in zip(face_rgbs, matrices)]
+            face_grays = [align_face(face_gray, scale_matrix(matrix, ANALYSIS_SIZE, LBP_SIZE)) for face_gray, matrix in zip(face_grays, matrices)]
+
+    with timed("facenet_preprocess"):
+        image_tensors = torch.cat([rgb_to_tensor(face_rgb) for face_rgb in face_rgbs])
+
+    with timed("lbp"):
+        lbp_histograms = lbp_descriptors_from_gray(np.stack([cv2.equalizeHist(face_gray) for face_gray in face_grays]))
+
+    return landmark_distances, image_tensors, lbp_histograms
+
+def extract_face_inputs(image_file) -> tuple[list, np.ndarray, torch.Tensor, np.ndarray, dict]:
+    """
+    Run every profile stage except the FaceNet forward pass for every face within an image.
+
+    Faces are detected once on a downscaled view, then cropped at full resolution and
+    analyzed together by `analyze_face_crops`.
+
+    Args:
+        image_file (PIL.Image.Image | ImageUpload): Input image file.
+
+    Returns:
+        tuple: Face boxes at full resolution, landmark distance vectors (N, 15), FaceNet input batch (N, 3, 160, 160),
+            LBP histograms (N, P + 2), and seconds spent per stage.
+
+    Raises:
+        NoFaceDetectedError: If no faces are detected within the image.
+    """
+    # Faces smaller than a single-face search would find still count here, so there is no pre-check
+    prepared = prepare_image(image_file)
+
+    # Detect every face once on the shared detection view
+    boxes, crop_boxes = detect_face_boxes(prepared, prepared.detection_bgr, MULTI_FACE_MAX_FACES)
+    landmark_distances, image_tensors, lbp_histograms = analyze_face_crops(
+        [(prepared.rgb, box, crop_box) for box, crop_box in zip(boxes, crop_boxes)], prepared.timed)
+
+    return boxes, landmark_distances, image_tensors, lbp_histograms, prepared.timings
+
+def generate_face_profiles(image_file, timings: dict = None) -> list[tuple[tuple, CompactProfile]]:
+    """
+    Generate a facial profile for every face within the input image.
+
+    Args:
+        image_file (PIL.Image.Image | ImageUpload): Input image file.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
+
+    Returns:
+        list[tuple]: Face box at full resolution as (left, top, right, bottom) and its CompactProfile, per face.
+
+    Raises:
+        NoFaceDetectedError: If no faces are detected within the image.
+    """
+    boxes, landmark_distances, image_tensors, lbp_histograms, stage_timings = extract_face_inputs(image_file)
+
+    # One batched forward pass for every face
+    start = time.perf_counter()
+    deep_features = embed_image_tensors(image_tensors)
+    stage_timings["facenet"] = time.perf_counter() - start
+
+    profiles = [
+        (box, CompactProfile(landmarks=landmarks, embedding=embedding, lbp=lbp))
+        for box, landmarks, embedding, lbp in zip(boxes, landmark_distances, deep_features, lbp_histograms)
+    ]
+
+    if timings is not None:
+        timings.update(stage_timings)
+    return profiles
+
+def _generate_face_profiles_with_timings(image_file) -> tuple[list, dict]:
+    # Process pool entry point, timings cannot be filled in across processes
+    timings = {}
+    return generate_face_profiles(image_file, timings), timings
+
+async def generate_face_profiles_async(image_file, timings: dict = None) -> list[tuple[tuple, CompactProfile]]:
+    """
+    Generate a facial profile for every face within the input image in the worker pool.
+
+    Args:
+        image_file (PIL.Image.Image | ImageUpload): Input image file.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
+
+    Returns:
+        list[tuple]: Face box at full resolution as (left, top, right, bottom) and its CompactProfile, per face.
+
+    Raises:
+        ServerOverloadedError: If the worker pool and its queue are saturated.
+        NoFaceDetectedError: If no faces are detected within the image.
+    """
+    with record_failures():
+        async with profile_executor.admit():
+            profiles, stage_timings = await profile_executor.run(_generate_face_profiles_with_timings, image_file)
+
+    record_stage_timings(stage_timings)
+    if timings is not None:
+        timings.update(stage_timings)
+    return profiles
+
+# Cache keys being generated, so concurrent retries of the same upload wait for one result
+_pending = {}
+
+async def generate_profile_from_bytes(image_bytes, timings: dict = None) -> CompactProfile:
+    """
+    Generate a facial profile from uploaded image bytes, reusing the cached profile of identical uploads.
+
+    Args:
+        image_bytes (bytes | ImageUpload): Raw uploaded file content, or an upload already validated by `read_upload`.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
+
+    Returns:
+        CompactProfile: Generated or cached profile.
+
+    Raises:
+        UploadRejectedError: If the bytes are too large, not a supported image or have too many pixels.
+        ServerOverloadedError: If the worker pool and its queue are saturated.
+        NoFaceDetectedError: If no faces are detected within the image.
+    """
+    upload = image_bytes if isinstance(image_bytes, ImageUpload) else inspect_image(image_bytes)
+    if not FEATURE_CACHE_ENABLED:
+        return await generate_profile_async(upload, timings)
+
+    start = time.perf_counter()
+    key = feature_cache.key(upload.data)
+    profile = feature_cache.get(key)
+    if profile is None and key in _pending and _pending[key].get_loop() is asyncio.get_running_loop():
+        profile = await asyncio.shield(_pending[key])
+    if profile is not None:
+        record_stage_timings({"cache": time.perf_counter() - start})
+        if timings is not None:
+            timings["cache"] = time.perf_counter() - start
+        return profile
+
+    future = _pending[key] = asyncio.get_running_loop().create_future()
+    try:
+        profile = await generate_profile_async(upload, timings)
+        feature_cache.put(key, profile)
+        future.set_result(profile)
+        return profile
+    except Exception as e:
+        future.set_exception(e)
+        # Waiters re-raise the error, this retrieves it when there are none
+        future.exception()
+        raise
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    finally:
+        del _pending[key]
+
 def compute_combined_confidence(confidences: list[float], weights: list[float]) -> float:
     """
     Compute combined confidence score from individual confidence scores and weights.
 
     Args:
-        confidences (list[float]): List of individual confidence scores.
+        confidences (list[float | numpy.ndarray]): List of individual confidence scores, or arrays of them.
         weights (list[float]): List of weights corresponding to the confidence scores.
 
     Returns:
-        float: Combined confidence score.
+        float | numpy.ndarray: Combined confidence score, elementwise for arrays.
     """
     weighted_sum = sum(c * w for c, w in zip(confidences, weights))
     total_weight = sum(weights)
 
     return weighted_sum / total_weight
 
-def compare_profiles(profile1: Profile, profile2: Profile) -> float:
+def compare_profiles(profile1, profile2) -> float:
     """
     Compare two facial profiles and compute a confidence score.
 
     Args:
-        profile1 (Profile): The first profile.
-        profile2 (Profile): The second profile.
+        profile1 (CompactProfile | Profile): The first profile.
+        profile2 (CompactProfile | Profile): The second profile.
 
     Returns:
         float: Confidence score based on the similarity of the profiles.
     """
-    lm_confidence = compare_distances(profile1.landmark_distances, profile2.landmark_distances)
-    df_confidence = compare_embeddings(profile1.deep_features, profile2.deep_features)
-    lbph_confidence = compare_lbp_histograms(profile1.lbp_histogram, profile2.lbp_histogram)
+    start = time.perf_counter()
+    profile2 = as_compact(profile2)
+    confidence = float(compare_profile_batch(
+        profile1, profile2.landmarks[None, :], profile2.embedding[None, :], profile2.lbp[None, :], profile2.landmark_variance[None, :])[0])
+    STAGE_LATENCY.observe(time.perf_counter() - start, stage="compare")
+    return confidence
+
+def stack_profiles(profiles: list) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Stack profiles into the gallery matrices used by `compare_profile_batch`.
+
+    Args:
+        profiles (list[CompactProfile | Profile]): Profiles to stack.
+
+    Returns:
+        tuple: Landmark distances (N, 15), embeddings (N, 512), LBP histograms (N, P + 2)
+            and landmark distance variances (N, 15).
+    """
+    profiles = [as_compact(profile) for profile in profiles]
+    return (
+        np.stack([profile.landmarks for profile in profiles]),
+        np.stack([profile.embedding for profile in profiles]),
+        np.stack([profile.lbp for profile in profiles]),
+        np.stack([profile.landmark_variance for profile in profiles]),
+    )
+
+def compare_profile_batch(probe, landmarks: np.ndarray, embeddings: np.ndarray, lbp_histograms: np.ndarray, landmark_variances: np.ndarray = None) -> np.ndarray:
+    """
+    Compare one facial profile against a stacked gallery of profiles.
+
+    Every score is computed with NumPy broadcasting over the gallery. `compare_profiles`
+    is this function with a gallery of one, so both give identical results. Templates are
+    compared through their means in the same fixed cost as single images. Landmark
+    differences within TEMPLATE_LANDMARK_TOLERANCE standard deviations of the combined
+    enrollment spread are ignored, which leaves single-image comparisons unchanged.
+
+    Args:
+        probe (CompactProfile | Profile): Profile compared against the gallery.
+        landmarks (numpy.ndarray): Gallery landmark distances with shape (N, 15).
+        embeddings (numpy.ndarray): Gallery embeddings with shape (N, 512).
+        lbp_histograms (numpy.ndarray): Gallery LBP histograms with shape (N, P + 2).
+        landmark_variances (numpy.ndarray): Optional gallery landmark distance variances with shape (N, 15).
+
+    Returns:
+        numpy.ndarray: Confidence score against each gallery profile, with shape (N,).
+    """
+    probe = as_compact(probe)
+    lm_confidence = compare_distance_matrix(probe.landmarks, landmarks, _landmark_tolerance(probe, landmark_variances))
+    df_confidence = compare_embedding_matrix(probe.embedding, embeddings)
+    lbph_confidence = compare_lbp_histogram_matrix(probe.lbp, lbp_histograms)
     weights = [LM_WEIGHT, DF_WEIGHT, LBPH_WEIGHT]
 
     return compute_combined_confidence([lm_confidence, df_confidence, lbph_confidence], weights)
+
+def _landmark_tolerance(probe: CompactProfile, landmark_variances: np.ndarray = None) -> np.ndarray:
+    # Landmark differences ignored within the combined enrollment spread, None for single images
+    variance = probe.landmark_variance.astype(np.float64)
+    if landmark_variances is not None:
+        variance = variance + np.asarray(landmark_variances, dtype=np.float64)
+    return TEMPLATE_LANDMARK_TOLERANCE * np.sqrt(variance) if variance.any() else None
+
+def cascade_ranges(mode: str = CASCADE_MODE) -> dict:
+    """
+    Confidence range assumed for each feature family before it is computed.
+
+    Args:
+        mode (str): "exact" assumes the full [0, 100] range of every family, "fast" assumes
+            CASCADE_FACENET_RANGE for FaceNet.
+
+    Returns:
+        dict: Lowest and highest confidence per family ("landmarks", "facenet" and "lbp").
+    """
+    # Cosine similarities can exceed 1 by rounding, the exact range leaves room for it
+    ranges = {"landmarks": (0.0, 100.0), "facenet": (-1e-6, 100.0 + 1e-6), "lbp": (0.0, 100.0)}
+    if mode == "fast":
+        ranges["facenet"] = CASCADE_FACENET_RANGE
+    return ranges
+
+def confidence_bounds(scores: dict, ranges: dict) -> tuple[float, float]:
+    """
+    Bound the combined confidence from the feature confidences computed so far.
+
+    Args:
+        scores (dict): Confidence of each computed family ("landmarks", "facenet" or "lbp").
+        ranges (dict): Confidence range assumed for the families missing from `scores`.
+
+    Returns:
+        tuple[float, float]: Lowest and highest combined confidence still reachable.
+    """
+    families = ("landmarks", "facenet", "lbp")
+    weights = [LM_WEIGHT, DF_WEIGHT, LBPH_WEIGHT]
+    low = compute_combined_confidence([scores.get(family, ranges[family][0]) for family in families], weights)
+    high = compute_combined_confidence([scores.get(family, ranges[family][1]) for family in families], weights)
+    return low, high
+
+def settled_confidence(scores: dict, ranges: dict, threshold: float = CONFIDENCE_THRESHOLD) -> float | None:
+    """
+    Check whether the verdict is settled by the feature confidences computed so far.
+
+    Args:
+        scores (dict): Confidence of each computed family ("landmarks", "facenet" or "lbp").
+        ranges (dict): Confidence range assumed for the families missing from `scores`.
+        threshold (float): Combined confidence below which an image is deepfaked.
+
+    Returns:
+        float | None: The bound on the verdict's side of the threshold, highest reachable
+            confidence if deepfaked and lowest if not, or None if the verdict is still open.
+    """
+    low, high = confidence_bounds(scores, ranges)
+    if high < threshold:
+        return high
+    if low >= threshold:
+        return low
+    return None
+
+def cascade_bound(reference: CompactProfile, landmark_distances: np.ndarray, lbp_histogram: np.ndarray, ranges: dict) -> float | None:
+    """
+    Settle the verdict of an image from its landmarks and LBP histogram when they suffice.
+
+    Features are rounded to float32 first, like the CompactProfile the full comparison
+    scores, so the bound is computed from exactly the scores `compare_profiles` would give.
+
+    Args:
+        reference (CompactProfile): Profile the image is verified against.
+        landmark_distances (numpy.ndarray): Landmark distances of the image, ordered as DISTANCE_KEYS.
+        lbp_histogram (numpy.ndarray): LBP histogram of the image.
+        ranges (dict): Confidence range assumed for FaceNet (see `cascade_ranges`).
+
+    Returns:
+        float | None: The bound that settles the verdict (see `settled_confidence`), or None if it is still open.
+    """
+    landmarks = np.asarray(landmark_distances, dtype=np.float32)
+    lbp = np.asarray(lbp_histogram, dtype=np.float32)
+    scores = {
+        "landmarks": float(compare_distance_matrix(reference.landmarks, landmarks[None, :], _landmark_tolerance(reference))[0]),
+        "lbp": float(compare_lbp_histogram_matrix(reference.lbp, lbp[None, :])[0]),
+    }
+    return settled_confidence(scores, ranges)
+
+def _cascade_inputs(image_file, reference: CompactProfile, ranges: dict) -> tuple:
+    # Worker entry point, runs the stages before FaceNet and settles the verdict from them when it can
+    landmark_distances, image_tensor, lbp_histogram, stage_timings = extract_profile_inputs(image_file)
+    return landmark_distances, image_tensor, lbp_histogram, stage_timings, cascade_bound(reference, landmark_distances, lbp_histogram, ranges)
+
+def _cascade_profile_with_timings(image_file, reference: CompactProfile, ranges: dict) -> tuple:
+    # Process pool entry point, embeds in the worker only while the verdict is open
+    landmark_distances, image_tensor, lbp_histogram, stage_timings, bound = _cascade_inputs(image_file, reference, ranges)
+    if bound is not None:
+        return None, bound, stage_timings
+
+    start = time.perf_counter()
+    deep_features = embed_image_tensors(image_tensor)
+    stage_timings["facenet"] = time.perf_counter() - start
+    return CompactProfile(landmarks=landmark_distances, embedding=deep_features, lbp=lbp_histogram), None, stage_timings
+
+async def verify_profile_async(image_file, reference, timings: dict = None, mode: str = CASCADE_MODE) -> tuple[CompactProfile | None, float | None]:
+    """
+    Generate the profile of an image verified against a reference, skipping the FaceNet
+    forward pass when landmarks and LBP already settle the verdict.
+
+    Landmarks and LBP come out of the shared prepared image, so they are computed first and
+    bound the combined confidence over the range FaceNet could still score. In "exact" mode
+    that range is every possible score, so the verdict always matches the full comparison.
+
+    Args:
+        image_file (PIL.Image.Image | ImageUpload): Input image file.
+        reference (CompactProfile | Profile): Profile the image is verified against.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
+        mode (str): Cascade mode, "exact" or "fast" (see `cascade_ranges`).
+
+    Returns:
+        tuple: The generated profile and None, or None and the confidence bound that settled the verdict.
+
+    Raises:
+        ServerOverloadedError: If the worker pool and its queue are saturated.
+        NoFaceDetectedError: If no faces are detected within the image.
+    """
+    reference = as_compact(reference)
+    ranges = cascade_ranges(mode)
+    with record_failures():
+        async with profile_executor.admit():
+            # Process workers hold their own models, so they run the whole cascade
+            if profile_executor.backend == "process" or not MICRO_BATCHING_ENABLED:
+                profile, bound, stage_timings = await profile_executor.run(_cascade_profile_with_timings, image_file, reference, ranges)
+            else:
+                landmark_distances, image_tensor, lbp_histogram, stage_timings, bound = await profile_executor.run(_cascade_inputs, image_file, reference, ranges)
+                profile = None
+                if bound is None:
+                    start = time.perf_counter()
+                    deep_features = await embedding_batcher.embed(image_tensor)
+                    stage_timings["facenet"] = time.perf_counter() - start
+                    profile = CompactProfile(landmarks=landmark_distances, embedding=deep_features, lbp=lbp_histogram)
+
+    CASCADE_STAGES.inc(stage="facenet", outcome="skipped" if profile is None else "run")
+    record_stage_timings(stage_timings)
+    if timings is not None:
+        timings.update(stage_timings)
+    return profile, bound
+
+async def verify_profile_from_bytes(image_bytes, reference, timings: dict = None, mode: str = CASCADE_MODE) -> tuple[CompactProfile | None, float | None]:
+    """
+    Generate the profile of uploaded image bytes verified against a reference, through the
+    cascade unless it is off or the upload's profile is cached.
+
+    Args:
+        image_bytes (bytes | ImageUpload): Raw uploaded file content, or an upload already validated by `read_upload`.
+        reference (CompactProfile | Profile): Profile the image is verified against.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
+        mode (str): Cascade mode, "off", "exact" or "fast".
+
+    Returns:
+        tuple: The generated or cached profile and None, or None and the confidence bound that settled the verdict.
+
+    Raises:
+        UploadRejectedError: If the bytes are too large, not a supported image or have too many pixels.
+        ServerOverloadedError: If the worker pool and its queue are saturated.
+        NoFaceDetectedError: If no faces are detected within the image.
+    """
+    upload = image_bytes if isinstance(image_bytes, ImageUpload) else inspect_image(image_bytes)
+    if mode == "off":
+        return await generate_profile_from_bytes(upload, timings), None
+    if not FEATURE_CACHE_ENABLED:
+        return await verify_profile_async(upload, reference, timings, mode)
+
+    start = time.perf_counter()
+    key = feature_cache.key(upload.data)
+    profile = feature_cache.get(key)
+    if profile is not None:
+        record_stage_timings({"cache": time.perf_counter() - start})
+        if timings is not None:
+            timings["cache"] = time.perf_counter() - start
+        return profile, None
+
+    # Only complete profiles are cached, a skipped FaceNet pass leaves nothing to reuse
+    profile, bound = await verify_profile_async(upload, reference, timings, mode)
+    if profile is not None:
+        feature_cache.put(key, profile)
+    return profile, bound
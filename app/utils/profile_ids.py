@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+# Crockford base32 alphabet, without I, L, O and U
+ID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ID_LENGTH = 26
+RANDOM_BITS = 80
+
+class ProfileIdGenerator:
+    """
+    Collision-free, time-ordered profile ids in the ULID layout.
+
+    An id is 26 Crockford base32 characters encoding a 48-bit millisecond timestamp
+    followed by 80 random bits, so ids sort by creation time. Ids made within the same
+    millisecond increment the random part instead of drawing a new one, which keeps them
+    unique and ordered within a process. Workers draw independent random parts, so
+    colliding ids across workers would need 2^40 ids in one millisecond.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+        # Forked workers start from the parent's state, so each redraws its random part
+        os.register_at_fork(after_in_child=self._reset)
+
+    def __call__(self) -> str:
+        """
+        Generate a new profile id.
+
+        Returns:
+            str: 26-character id, greater than every id this generator returned before.
+        """
+        with self._lock:
+            now = time.time_ns() // 1_000_000
+            if now > self._last_ms:
+                self._last_ms = now
+                self._last_random = int.from_bytes(os.urandom(RANDOM_BITS // 8), "big")
+            else:
+                # Same millisecond, or the clock moved back, so step past the previous id
+                self._last_random += 1
+                if self._last_random >> RANDOM_BITS:
+                    self._last_ms += 1
+                    self._last_random = 0
+            value = (self._last_ms << RANDOM_BITS) | self._last_random
+        return "".join(ID_ALPHABET[(value >> shift) & 31] for shift in range(5 * (ID_LENGTH - 1), -1, -5))
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+
+def profile_id_timestamp(profile_id: str) -> float:
+    """
+    Creation time encoded in a profile id.
+
+    Args:
+        profile_id (str): Id made by a ProfileIdGenerator.
+
+    Returns:
+        float: Unix timestamp in seconds, with millisecond resolution.
+
+    Raises:
+        ValueError: If the id is not in the ULID layout.
+    """
+    if len(profile_id) != ID_LENGTH or any(char not in ID_ALPHABET for char in profile_id):
+        raise ValueError(f"Not a time-ordered profile id: {profile_id}")
+    value = 0
+    for char in profile_id:
+        value = value * 32 + ID_ALPHABET.index(char)
+    return (value >> RANDOM_BITS) / 1000
+
+# Shared by every router of this process
+new_profile_id = ProfileIdGenerator()
@@ -0,0 +1,686 @@
+import fcntl
+import json
+import os
+import threading
+import weakref
+from contextlib import ExitStack, contextmanager
+import numpy as np
+from .analysis_params import PROFILE_STORE_BACKEND, PROFILE_STORE_PATH, PROFILE_STORE_SHARDS, STORE_COMPACTION_RATIO, STORE_COMPACTION_MIN_ROWS
+from .compact_profile import CompactProfile, EMBEDDING_SIZE, LBP_BINS, as_compact
+from .landmark_analysis import DISTANCE_KEYS
+
+STORE_VERSION = 2
+
+# Fixed-width float32 columns holding every profile
+COLUMNS = {
+    "embeddings": EMBEDDING_SIZE,
+    "lbp": LBP_BINS,
+    "landmarks": len(DISTANCE_KEYS),
+    "landmark_variance": len(DISTANCE_KEYS),
+    "count": 1,
+}
+
+# Values of the template columns added in version 2 for profiles stored before them
+UPGRADE_DEFAULTS = {"landmark_variance": 0.0, "count": 1.0}
+
+def profile_to_columns(profile) -> dict:
+    """
+    Split a profile into its fixed-order float32 column vectors.
+
+    Args:
+        profile (CompactProfile | Profile): Profile to split.
+
+    Returns:
+        dict: Column name to float32 vector.
+    """
+    profile = as_compact(profile)
+    return {
+        "embeddings": profile.embedding,
+        "lbp": profile.lbp,
+        "landmarks": profile.landmarks,
+        "landmark_variance": profile.landmark_variance,
+        "count": np.array([profile.count], dtype=np.float32),
+    }
+
+def columns_to_profile(columns: dict) -> CompactProfile:
+    """
+    Wrap column vectors as a compact profile without copying them.
+
+    Args:
+        columns (dict): Column name to float32 vector.
+
+    Returns:
+        CompactProfile: Profile viewing the column vectors.
+    """
+    return CompactProfile(
+        landmarks=columns["landmarks"],
+        embedding=columns["embeddings"],
+        lbp=columns["lbp"],
+        count=columns["count"][0],
+        landmark_variance=columns["landmark_variance"],
+    )
+
+class _Shard:
+    # One lock stripe of the memory store
+    def __init__(self):
+        self.profiles = {}
+        self.seqs = {}
+        self.deleted = {}
+        self.lock = threading.RLock()
+
+class MemoryProfileStore:
+    """
+    Non-persistent profile store kept in process-local dicts, sharded by profile id.
+
+    Each shard has its own lock, so concurrent writes to different profiles rarely wait
+    on each other. Sequence numbers are drawn while holding the shard's lock, and
+    operations spanning every shard (change listing and subscriptions) hold all shard
+    locks in order, so they never observe a write without its sequence number. Supports
+    the same mapping interface, change listing and change subscriptions as MmapProfileStore.
+
+    Args:
+        shards (int): Number of lock-striped shards.
+
+    Attributes:
+        sequence (int): Sequence number of the latest write.
+    """
+    def __init__(self, shards: int = PROFILE_STORE_SHARDS):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._listeners = []
+        self._sequence_lock = threading.Lock()
+        self.sequence = 0
+
+    def __contains__(self, profile_id: str) -> bool:
+        return profile_id in self._shard(profile_id).profiles
+
+    def __len__(self) -> int:
+        return sum(len(shard.profiles) for shard in self._shards)
+
+    def __getitem__(self, profile_id: str) -> CompactProfile:
+        return self._shard(profile_id).profiles[profile_id]
+
+    def __setitem__(self, profile_id: str, profile):
+        profile = as_compact(profile)
+        shard = self._shard(profile_id)
+        with shard.lock:
+            shard.profiles[profile_id] = profile
+            shard.seqs[profile_id] = self._next_sequence()
+            shard.deleted.pop(profile_id, None)
+            self._notify(profile_id, profile.embedding)
+
+    def __delitem__(self, profile_id: str):
+        shard = self._shard(profile_id)
+        with shard.lock:
+            del shard.profiles[profile_id]
+            del shard.seqs[profile_id]
+            shard.deleted[profile_id] = self._next_sequence()
+            self._notify(profile_id, None)
+
+    def get(self, profile_id: str, default=None):
+        return self._shard(profile_id).profiles.get(profile_id, default)
+
+    def get_many(self, profile_ids) -> dict:
+        """
+        Look up many profiles at once, skipping unknown ids.
+
+        Args:
+            profile_ids (iterable[str]): Ids of the profiles.
+
+        Returns:
+            dict: Profile id to profile, for the ids found.
+        """
+        found = {}
+        for profile_id in profile_ids:
+            profile = self.get(profile_id)
+            if profile is not None:
+                found[profile_id] = profile
+        return found
+
+    def update(self, profile_id: str, function) -> CompactProfile:
+        """
+        Atomically replace a stored profile with a function of it.
+
+        Args:
+            profile_id (str): Id of the profile.
+            function (callable): Called with the stored profile, returns its replacement.
+
+        Returns:
+            CompactProfile: Stored replacement.
+
+        Raises:
+            KeyError: If the profile does not exist.
+        """
+        shard = self._shard(profile_id)
+        with shard.lock:
+            profile = as_compact(function(shard.profiles[profile_id]))
+            self[profile_id] = profile
+            return profile
+
+    def keys(self) -> list[str]:
+        return [profile_id for shard in self._shards for profile_id in list(shard.profiles)]
+
+    def put_many(self, items) -> int:
+        """
+        Store many profiles at once, each under its own shard's lock.
+
+        Args:
+            items (iterable[tuple[str, CompactProfile | Profile]]): Profile ids and profiles.
+
+        Returns:
+            int: Number of profiles stored.
+        """
+        count = 0
+        for profile_id, profile in items:
+            self[profile_id] = profile
+            count += 1
+        return count
+
+    def delete_many(self, profile_ids) -> int:
+        """
+        Delete many profiles at once, ignoring unknown ids.
+
+        Args:
+            profile_ids (iterable[str]): Ids of the profiles.
+
+        Returns:
+            int: Number of profiles deleted.
+        """
+        count = 0
+        for profile_id in dict.fromkeys(profile_ids):
+            shard = self._shard(profile_id)
+            with shard.lock:
+                if profile_id in shard.profiles:
+                    del self[profile_id]
+                    count += 1
+        return count
+
+    def changes(self, since: int = 0) -> tuple[bool, list[str], list[str], int]:
+        """
+        List the profiles written and deleted after a sequence number.
+
+        Args:
+            since (int): Sequence number already seen, 0 lists every profile.
+
+        Returns:
+            tuple: Whether the listing is full, ids written after `since` (every id if full),
+                ids deleted after `since` (none if full) and the current sequence number.
+        """
+        with self._all_shards():
+            if since <= 0:
+                return True, self.keys(), [], self.sequence
+            written = [profile_id for shard in self._shards for profile_id, seq in shard.seqs.items() if seq > since]
+            deleted = [profile_id for shard in self._shards for profile_id, seq in shard.deleted.items() if seq > since]
+            return False, written, deleted, self.sequence
+
+    def refresh(self):
+        """
+        No-op, a memory store has no other writers.
+        """
+
+    def subscribe(self, listener):
+        """
+        Register a callback for profile writes and replay current profiles to it.
+
+        Args:
+            listener (callable): Called with (profile_id, embedding) on put and (profile_id, None) on delete.
+        """
+        with self._all_shards():
+            self._listeners.append(listener)
+            for shard in self._shards:
+                for profile_id, profile in shard.profiles.items():
+                    listener(profile_id, profile.embedding)
+
+    def _shard(self, profile_id: str) -> _Shard:
+        return self._shards[hash(profile_id) % len(self._shards)]
+
+    def _next_sequence(self) -> int:
+        with self._sequence_lock:
+            self.sequence += 1
+            return self.sequence
+
+    @contextmanager
+    def _all_shards(self):
+        # Always acquired in shard order, so two callers never deadlock
+        with ExitStack() as stack:
+            for shard in self._shards:
+                stack.enter_context(shard.lock)
+            yield
+
+    def _notify(self, profile_id: str, embedding):
+        for listener in self._listeners:
+            listener(profile_id, embedding)
+
+class _Column:
+    # Append-only float32 row file, memory-mapped read-only for lookups
+    def __init__(self, path: str, width: int):
+        self.path = path
+        self.width = width
+        self.row_bytes = width * 4
+        self._map = None
+
+    def row(self, index: int) -> np.ndarray:
+        if self._map is None or index >= len(self._map):
+            rows = os.path.getsize(self.path) // self.row_bytes
+            self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, self.width)) if rows else None
+        return self._map[index]
+
+    def append(self, index: int, vector: np.ndarray):
+        # Drop any uncommitted tail left by a crashed writer before appending at the committed row
+        with open(self.path, "r+b") as f:
+            f.truncate(index * self.row_bytes)
+            f.seek(index * self.row_bytes)
+            f.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+class MmapProfileStore:
+    """
+    Durable profile store with a columnar, memory-mapped on-disk layout.
+
+    Embeddings, LBP histograms and landmark distance vectors are appended as fixed-width
+    float32 rows to one file per column, which every worker memory-maps read-only. An
+    append-only operation log maps profile ids to rows and records deletes. Each worker
+    tails the log to pick up writes from other workers, and writers serialize on a file
+    lock. Once deleted rows make up `STORE_COMPACTION_RATIO` of the files, live rows are
+    compacted into a new generation and the manifest is swapped atomically.
+
+    Every write carries a sequence number. Deletes are remembered as tombstones until the
+    next compaction, so `changes` can list what changed since any sequence number from the
+    current generation, which is what delta snapshots are built from.
+
+    Args:
+        path (str): Directory holding the store, created if missing.
+
+    Attributes:
+        generation (int): Current file generation, bumped by every compaction.
+        sequence (int): Sequence number of the latest applied write.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_file = open(os.path.join(path, "LOCK"), "a+")
+        self._listeners = []
+
+        # flock is shared by forked children through the inherited descriptor, so each child reopens it
+        store = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: store() is not None and store()._reopen_lock_file())
+        self._manifest_inode = None
+        self.generation = None
+        self.sequence = 0
+
+        with self._write_lock():
+            if not os.path.exists(self._manifest_path()):
+                self._create_generation(0, 0)
+            else:
+                self._upgrade()
+        self.refresh()
+
+    def __contains__(self, profile_id: str) -> bool:
+        self.refresh()
+        return profile_id in self._rows
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._rows)
+
+    def __getitem__(self, profile_id: str) -> CompactProfile:
+        self.refresh()
+        with self._lock:
+            row = self._rows[profile_id]
+            return columns_to_profile({name: column.row(row) for name, column in self._columns.items()})
+
+    def __setitem__(self, profile_id: str, profile):
+        with self._write_lock():
+            self._put(profile_id, profile)
+
+    def __delitem__(self, profile_id: str):
+        with self._write_lock():
+            if profile_id not in self._rows:
+                raise KeyError(profile_id)
+            self._append_log({"seq": self.sequence + 1, "op": "del", "id": profile_id})
+            self._maybe_compact()
+
+    def get(self, profile_id: str, default=None):
+        try:
+            return self[profile_id]
+        except KeyError:
+            return default
+
+    def get_many(self, profile_ids) -> dict:
+        """
+        Look up many profiles at once with one refresh, skipping unknown ids.
+
+        Args:
+            profile_ids (iterable[str]): Ids of the profiles.
+
+        Returns:
+            dict: Profile id to profile, for the ids found.
+        """
+        self.refresh()
+        with self._lock:
+            return {
+                profile_id: columns_to_profile({name: column.row(self._rows[profile_id]) for name, column in self._columns.items()})
+                for profile_id in profile_ids if profile_id in self._rows
+            }
+
+    def keys(self) -> list[str]:
+        self.refresh()
+        return list(self._rows)
+
+    def update(self, profile_id: str, function) -> CompactProfile:
+        """
+        Atomically replace a stored profile with a function of it, across workers.
+
+        The profile is read and rewritten under the store's write lock, so concurrent
+        updates of the same profile from any worker are applied one after the other.
+
+        Args:
+            profile_id (str): Id of the profile.
+            function (callable): Called with the stored profile, returns its replacement.
+
+        Returns:
+            CompactProfile: Stored replacement.
+
+        Raises:
+            KeyError: If the profile does not exist.
+        """
+        with self._write_lock():
+            profile = as_compact(function(self[profile_id]))
+            self._put(profile_id, profile)
+            return profile
+
+    def put_many(self, items) -> int:
+        """
+        Store many profiles at once, with one write per column file and one for the log.
+
+        Args:
+            items (iterable[tuple[str, CompactProfile | Profile]]): Profile ids and profiles.
+
+        Returns:
+            int: Number of profiles stored.
+        """
+        items = [(profile_id, profile_to_columns(profile)) for profile_id, profile in items]
+        if not items:
+            return 0
+        with self._write_lock():
+            for name, column in self._columns.items():
+                column.append(self._next_row, np.stack([vectors[name] for _, vectors in items]))
+            self._append_log(*[
+                {"seq": self.sequence + 1 + i, "op": "put", "id": profile_id, "row": self._next_row + i}
+                for i, (profile_id, _) in enumerate(items)
+            ])
+        return len(items)
+
+    def delete_many(self, profile_ids) -> int:
+        """
+        Delete many profiles at once with one log write, ignoring unknown ids.
+
+        Args:
+            profile_ids (iterable[str]): Ids of the profiles.
+
+        Returns:
+            int: Number of profiles deleted.
+        """
+        with self._write_lock():
+            deleted = list(dict.fromkeys(profile_id for profile_id in profile_ids if profile_id in self._rows))
+            if deleted:
+                self._append_log(*[{"seq": self.sequence + 1 + i, "op": "del", "id": profile_id} for i, profile_id in enumerate(deleted)])
+                self._maybe_compact()
+            return len(deleted)
+
+    def changes(self, since: int = 0) -> tuple[bool, list[str], list[str], int]:
+        """
+        List the profiles written and deleted after a sequence number.
+
+        Tombstones are dropped by compaction, so a `since` older than the current
+        generation cannot be answered as a delta and gives a full listing instead.
+
+        Args:
+            since (int): Sequence number already seen, 0 lists every profile.
+
+        Returns:
+            tuple: Whether the listing is full, ids written after `since` (every id if full),
+                ids deleted after `since` (none if full) and the current sequence number.
+        """
+        self.refresh()
+        with self._lock:
+            if since <= 0 or since < self._floor:
+                return True, list(self._rows), [], self.sequence
+            written = [profile_id for profile_id, seq in self._seqs.items() if seq > since]
+            deleted = [profile_id for profile_id, seq in self._deleted.items() if seq > since]
+            return False, written, deleted, self.sequence
+
+    def embedding(self, profile_id: str) -> np.ndarray:
+        """
+        Memory-mapped embedding row of a stored profile.
+
+        Args:
+            profile_id (str): Id of the profile.
+
+        Returns:
+            numpy.ndarray: Read-only float32 embedding vector.
+        """
+        self.refresh()
+        with self._lock:
+            return self._columns["embeddings"].row(self._rows[profile_id])
+
+    def subscribe(self, listener):
+        """
+        Register a callback for profile writes and replay current profiles to it.
+
+        Writes made by other workers are delivered when this worker next refreshes.
+
+        Args:
+            listener (callable): Called with (profile_id, embedding) on put and (profile_id, None) on delete.
+        """
+        self.refresh()
+        with self._lock:
+            self._listeners.append(listener)
+            for profile_id, row in self._rows.items():
+                listener(profile_id, self._columns["embeddings"].row(row))
+
+    def compact(self):
+        """
+        Rewrite live rows into a new generation, dropping deleted rows.
+        """
+        with self._write_lock():
+            self._compact()
+
+    def refresh(self):
+        """
+        Pick up writes and compactions made by other workers.
+        """
+        with self._lock:
+            while True:
+                try:
+                    stat = os.stat(self._manifest_path())
+                    if stat.st_ino != self._manifest_inode:
+                        self._load_manifest(stat.st_ino)
+                    self._tail_log()
+                    return
+                except FileNotFoundError:
+                    # Another worker compacted between reading the manifest and opening the log
+                    self._manifest_inode = None
+
+    def _write_lock(self):
+        store = self
+
+        class _WriteLock:
+            def __enter__(self):
+                store._lock.acquire()
+                fcntl.flock(store._lock_file, fcntl.LOCK_EX)
+                if store.generation is not None:
+                    store.refresh()
+
+            def __exit__(self, *exc):
+                fcntl.flock(store._lock_file, fcntl.LOCK_UN)
+                store._lock.release()
+
+        return _WriteLock()
+
+    def _put(self, profile_id: str, profile):
+        # Caller holds the write lock
+        vectors = profile_to_columns(profile)
+        for name, column in self._columns.items():
+            column.append(self._next_row, vectors[name])
+        self._append_log({"seq": self.sequence + 1, "op": "put", "id": profile_id, "row": self._next_row})
+
+    def _maybe_compact(self):
+        # Caller holds the write lock
+        dead_rows = self._next_row - len(self._rows)
+        if dead_rows >= STORE_COMPACTION_MIN_ROWS and dead_rows >= STORE_COMPACTION_RATIO * self._next_row:
+            self._compact()
+
+    def _reopen_lock_file(self):
+        self._lock = threading.RLock()
+        self._lock_file = open(os.path.join(self.path, "LOCK"), "a+")
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "MANIFEST")
+
+    def _file_path(self, name: str, generation: int) -> str:
+        return os.path.join(self.path, f"{name}.{generation}")
+
+    def _create_generation(self, generation: int, sequence: int):
+        for name in COLUMNS:
+            open(self._file_path(name, generation), "wb").close()
+        open(self._file_path("log", generation), "wb").close()
+        self._write_manifest(generation, sequence)
+
+    def _write_manifest(self, generation: int, sequence: int):
+        # Written last and swapped atomically so readers only ever see complete generations
+        manifest = {"version": STORE_VERSION, "generation": generation, "sequence": sequence, "columns": COLUMNS}
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._manifest_path())
+
+    def _upgrade(self):
+        # Version 1 stores lack the template columns, add them with single-image defaults
+        with open(self._manifest_path()) as f:
+            manifest = json.load(f)
+        missing = {name: width for name, width in COLUMNS.items() if name not in manifest["columns"]}
+        if manifest["version"] != 1 or {**manifest["columns"], **missing} != COLUMNS:
+            return
+        generation = manifest["generation"]
+        rows = os.path.getsize(self._file_path("embeddings", generation)) // (4 * COLUMNS["embeddings"])
+        for name, width in missing.items():
+            with open(self._file_path(name, generation), "wb") as f:
+                f.write(np.full((rows, width), UPGRADE_DEFAULTS[name], dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self._write_manifest(generation, manifest["sequence"])
+
+    def _load_manifest(self, inode: int):
+        with open(self._manifest_path()) as f:
+            manifest = json.load(f)
+        if manifest["version"] != STORE_VERSION or manifest["columns"] != COLUMNS:
+            raise ValueError(f"Incompatible profile store at {self.path}")
+
+        previous = getattr(self, "_rows", {})
+        self._manifest_inode = inode
+        self.generation = manifest["generation"]
+        self.sequence = manifest["sequence"]
+        self._floor = manifest["sequence"]
+        self._columns = {name: _Column(self._file_path(name, self.generation), width) for name, width in COLUMNS.items()}
+        self._log_offset = 0
+        self._rows = {}
+        self._seqs = {}
+        self._deleted = {}
+        self._next_row = 0
+
+        # Listeners only see deletes for profiles missing from the new generation
+        self._tail_log(notify=False)
+        for profile_id in previous:
+            if profile_id not in self._rows:
+                self._notify(profile_id, None)
+        for profile_id, row in self._rows.items():
+            self._notify(profile_id, self._columns["embeddings"].row(row))
+
+    def _tail_log(self, notify: bool = True):
+        with open(self._file_path("log", self.generation), "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+
+        # Only complete lines are committed records
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self._apply(json.loads(line), notify)
+        self._log_offset += end
+
+    def _apply(self, record: dict, notify: bool):
+        if record["op"] == "put":
+            self._rows[record["id"]] = record["row"]
+            self._seqs[record["id"]] = record["seq"]
+            self._deleted.pop(record["id"], None)
+            self._next_row = max(self._next_row, record["row"] + 1)
+            if notify:
+                self._notify(record["id"], self._columns["embeddings"].row(record["row"]))
+        elif record["op"] == "del":
+            self._rows.pop(record["id"], None)
+            self._seqs.pop(record["id"], None)
+            self._deleted[record["id"]] = record["seq"]
+            if notify:
+                self._notify(record["id"], None)
+        self.sequence = max(self.sequence, record["seq"])
+
+    def _append_log(self, *records: dict):
+        with open(self._file_path("log", self.generation), "r+b") as f:
+            f.truncate(self._log_offset)
+            f.seek(self._log_offset)
+            f.write("".join(json.dumps(record) + "\n" for record in records).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self._tail_log()
+
+    def _compact(self):
+        generation = self.generation + 1
+        old_generation = self.generation
+        live = sorted(self._rows.items(), key=lambda item: item[1])
+
+        # Copy live rows column by column into the new generation
+        for name, column in self._columns.items():
+            with open(self._file_path(name, generation), "wb") as f:
+                for _, row in live:
+                    f.write(column.row(row).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        with open(self._file_path("log", generation), "wb") as f:
+            for new_row, (profile_id, _) in enumerate(live):
+                f.write((json.dumps({"seq": self._seqs[profile_id], "op": "put", "id": profile_id, "row": new_row}) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._write_manifest(generation, self.sequence)
+        self.refresh()
+
+        # Workers still mapping the old files keep them alive until they refresh
+        for name in list(COLUMNS) + ["log"]:
+            os.remove(self._file_path(name, old_generation))
+
+    def _notify(self, profile_id: str, embedding):
+        for listener in self._listeners:
+            listener(profile_id, embedding)
+
+def open_profile_store(backend: str = PROFILE_STORE_BACKEND, path: str = PROFILE_STORE_PATH):
+    """
+    Open the profile store selected in analysis_params.
+
+    Args:
+        backend (str): "mmap" for the durable memory-mapped store or "memory" for process-local sharded dicts.
+        path (str): Directory of the memory-mapped store.
+
+    Returns:
+        MmapProfileStore | MemoryProfileStore: Opened profile store.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "mmap":
+        return MmapProfileStore(path)
+    if backend == "memory":
+        return MemoryProfileStore()
+    raise ValueError(f"Unknown profile store backend: {backend}")
@@ -0,0 +1,226 @@
+import json
+import struct
+import zlib
+import numpy as np
+from .analysis_params import SNAPSHOT_CHUNK_ROWS, feature_fingerprint
+from .profile_store import COLUMNS, profile_to_columns, columns_to_profile
+
+# Snapshot stream: header with JSON metadata, then checksummed frames of profiles or deletes, then an end frame
+SNAPSHOT_MAGIC = b"IDSN"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sBI")
+FRAME_HEADER = struct.Struct("<cII")
+FRAME_CHECKSUM = struct.Struct("<I")
+FRAME_PUT, FRAME_DELETE, FRAME_END = b"P", b"D", b"E"
+SNAPSHOT_METADATA_KEYS = ("version", "fingerprint", "columns", "full", "since", "sequence")
+
+class SnapshotError(ValueError):
+    """
+    Raised when a snapshot stream is malformed, truncated or corrupted.
+    """
+
+class IncompatibleSnapshotError(SnapshotError):
+    """
+    Raised when a snapshot was exported with other feature settings or profile columns.
+    """
+
+def encode_ids(profile_ids: list[str]) -> bytes:
+    # Id table: one uint16 byte length per id, then the UTF-8 ids back to back
+    encoded = [profile_id.encode() for profile_id in profile_ids]
+    return np.array([len(data) for data in encoded], dtype="<u2").tobytes() + b"".join(encoded)
+
+def decode_ids(payload: memoryview, count: int) -> tuple[list[str], int]:
+    if 2 * count > len(payload):
+        raise SnapshotError("Snapshot id table is shorter than its frame count")
+    lengths = np.frombuffer(payload, dtype="<u2", count=count)
+    offset = 2 * count
+    if offset + int(lengths.sum(dtype=np.int64)) > len(payload):
+        raise SnapshotError("Snapshot id table overruns its frame")
+    profile_ids = []
+    try:
+        for length in lengths.tolist():
+            profile_ids.append(bytes(payload[offset:offset + length]).decode())
+            offset += length
+    except UnicodeDecodeError:
+        raise SnapshotError("Snapshot profile id is not valid UTF-8")
+    return profile_ids, offset
+
+def encode_frame(kind: bytes, count: int, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(kind, count, len(payload)) + payload + FRAME_CHECKSUM.pack(zlib.crc32(payload))
+
+def iter_snapshot(store, since: int = 0, chunk_rows: int = SNAPSHOT_CHUNK_ROWS):
+    """
+    Export a profile store as a snapshot stream, one chunk of profiles at a time.
+
+    A snapshot holds every profile, or with `since` only the profiles written and deleted
+    after that sequence number. Each put frame carries an id table followed by the
+    float32 rows of every profile column, so importing it needs no feature extraction.
+    When deletes since `since` are no longer known, a full snapshot is exported instead.
+
+    Args:
+        store (MmapProfileStore | MemoryProfileStore): Store to export.
+        since (int): Sequence number the importer has already applied, 0 exports everything.
+        chunk_rows (int): Profiles per frame.
+
+    Yields:
+        bytes: Header, then one frame per chunk of profiles or deletes, then the end frame.
+    """
+    full, written, deleted, sequence = store.changes(since)
+    metadata = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": feature_fingerprint(),
+        "columns": COLUMNS,
+        "full": full,
+        "since": 0 if full else since,
+        "sequence": sequence,
+    }
+    encoded = json.dumps(metadata).encode()
+    yield SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(encoded)) + encoded
+
+    total = 0
+    for start in range(0, len(written), chunk_rows):
+        # Profiles deleted while exporting are left to the next delta
+        profile_ids, rows = [], []
+        for profile_id in written[start:start + chunk_rows]:
+            profile = store.get(profile_id)
+            if profile is not None:
+                profile_ids.append(profile_id)
+                rows.append(profile_to_columns(profile))
+        if not profile_ids:
+            continue
+        columns = b"".join(np.ascontiguousarray(np.stack([row[name] for row in rows]), dtype="<f4").tobytes() for name in COLUMNS)
+        yield encode_frame(FRAME_PUT, len(profile_ids), encode_ids(profile_ids) + columns)
+        total += len(profile_ids)
+
+    for start in range(0, len(deleted), chunk_rows):
+        chunk = deleted[start:start + chunk_rows]
+        yield encode_frame(FRAME_DELETE, len(chunk), encode_ids(chunk))
+    yield encode_frame(FRAME_END, total, b"")
+
+class SnapshotReader:
+    """
+    Incremental reader of a snapshot stream.
+
+    Iterating yields one frame at a time, so a snapshot of any size is imported with
+    the memory of a single chunk.
+
+    Args:
+        stream (file-like): Binary stream positioned at the start of a snapshot.
+
+    Attributes:
+        metadata (dict): Snapshot metadata (version, fingerprint, columns, full, since, sequence).
+
+    Raises:
+        SnapshotError: If the stream does not start with a snapshot header and complete metadata.
+    """
+    def __init__(self, stream):
+        self._stream = stream
+        header = self._read(SNAPSHOT_HEADER.size)
+        magic, version, length = SNAPSHOT_HEADER.unpack(header)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise SnapshotError("Invalid snapshot header")
+        try:
+            self.metadata = json.loads(self._read(length))
+        except ValueError:
+            raise SnapshotError("Invalid snapshot metadata")
+        if not isinstance(self.metadata, dict) or any(key not in self.metadata for key in SNAPSHOT_METADATA_KEYS):
+            raise SnapshotError(f"Snapshot metadata must contain {', '.join(SNAPSHOT_METADATA_KEYS)}")
+        columns = self.metadata["columns"]
+        if not isinstance(columns, dict) or any(type(width) is not int or width <= 0 for width in columns.values()):
+            raise SnapshotError("Invalid snapshot column widths")
+
+    def __iter__(self):
+        """
+        Yield the frames of the snapshot.
+
+        Yields:
+            tuple: ("put", profile ids, list of CompactProfile) or ("delete", profile ids, None).
+
+        Raises:
+            SnapshotError: If a frame is corrupted or the stream ends before the end frame.
+        """
+        widths = self.metadata["columns"]
+        while True:
+            kind, count, length = FRAME_HEADER.unpack(self._read(FRAME_HEADER.size))
+            payload = self._read(length)
+            (checksum,) = FRAME_CHECKSUM.unpack(self._read(FRAME_CHECKSUM.size))
+            if zlib.crc32(payload) != checksum:
+                raise SnapshotError("Snapshot frame checksum mismatch")
+            if kind == FRAME_END:
+                return
+
+            if kind not in (FRAME_PUT, FRAME_DELETE):
+                raise SnapshotError(f"Unknown snapshot frame {kind!r}")
+
+            # Sizes are checked before decoding, as a valid checksum only proves the frame arrived intact
+            payload = memoryview(payload)
+            profile_ids, offset = decode_ids(payload, count)
+            rows_size = 4 * count * sum(widths.values()) if kind == FRAME_PUT else 0
+            if offset + rows_size != len(payload):
+                raise SnapshotError(f"Snapshot frame of {count} profiles has {len(payload)} bytes, expected {offset + rows_size}")
+            if kind == FRAME_DELETE:
+                yield "delete", profile_ids, None
+            else:
+                # Column blocks follow the id table, viewed without copying
+                columns = {}
+                for name, width in widths.items():
+                    columns[name] = np.frombuffer(payload, dtype="<f4", count=count * width, offset=offset).reshape(count, width)
+                    offset += 4 * count * width
+                profiles = [columns_to_profile({name: block[i] for name, block in columns.items()}) for i in range(count)]
+                yield "put", profile_ids, profiles
+
+    def _read(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._stream.read(size - len(data))
+            if not chunk:
+                raise SnapshotError("Snapshot ended before its end frame")
+            data += chunk
+        return bytes(data)
+
+def import_snapshot(store, stream, force: bool = False) -> dict:
+    """
+    Bulk-load a snapshot stream into a profile store.
+
+    Frames are applied as they arrive with one bulk write each. A full snapshot also
+    deletes local profiles missing from it, but only once its end frame has been read,
+    so a truncated full snapshot never removes anything. Puts and deletes are idempotent,
+    so an interrupted import can simply be run again.
+
+    Args:
+        store (MmapProfileStore | MemoryProfileStore): Store to load into.
+        stream (file-like): Binary snapshot stream.
+        force (bool): Import even if the snapshot was exported with other feature settings.
+
+    Returns:
+        dict: Whether the snapshot was full, its `since` and `sequence` (the `since` to request
+            for the next delta), and the numbers of profiles imported and deleted.
+
+    Raises:
+        IncompatibleSnapshotError: If the profile columns differ, or the feature fingerprint differs without `force`.
+        SnapshotError: If the stream is malformed, truncated or corrupted.
+    """
+    reader = SnapshotReader(stream)
+    metadata = reader.metadata
+    if metadata["columns"] != COLUMNS:
+        raise IncompatibleSnapshotError("Snapshot profile columns differ from this store")
+    if metadata["fingerprint"] != feature_fingerprint() and not force:
+        raise IncompatibleSnapshotError(f"Snapshot feature fingerprint {metadata['fingerprint']} differs from {feature_fingerprint()}")
+
+    imported, deleted, seen = 0, 0, set()
+    for kind, profile_ids, profiles in reader:
+        if kind == "put":
+            imported += store.put_many(zip(profile_ids, profiles))
+            seen.update(profile_ids)
+        else:
+            deleted += store.delete_many(profile_ids)
+    if metadata["full"]:
+        deleted += store.delete_many([profile_id for profile_id in store.keys() if profile_id not in seen])
+
+    return {
+        "full": metadata["full"],
+        "since": metadata["since"],
+        "sequence": metadata["sequence"],
+        "imported": imported,
+        "deleted": deleted,
+    }
@@ -0,0 +1,76 @@
+import os
+import time
+from .lazy_imports import import_times
+
+def _process_age() -> float:
+    # Seconds since the process started, read from /proc where available
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+class StartupReport:
+    """
+    Records how long the process took to become ready to serve.
+
+    Phases are seconds since the process started (or since the fork, for preforked
+    workers), so they include interpreter start-up and imports.
+
+    Attributes:
+        mode (str): "standard", "prefork" for the preforking parent or "prefork-worker".
+        phases (dict): Phase name to seconds since start, in the order they were reached.
+        parent_phases (dict): Phases of the preforking parent, for workers.
+    """
+    def __init__(self):
+        self.started = time.perf_counter() - _process_age()
+        self.mode = "standard"
+        self.phases = {}
+        self.parent_phases = {}
+
+    def mark(self, phase: str):
+        """
+        Record that a startup phase was reached.
+
+        Args:
+            phase (str): Name of the phase.
+        """
+        self.phases[phase] = time.perf_counter() - self.started
+
+    def start_worker(self):
+        """
+        Restart the clock in a freshly forked worker, keeping the parent's phases.
+        """
+        self.parent_phases = dict(self.phases)
+        self.phases = {}
+        self.mode = "prefork-worker"
+        self.started = time.perf_counter()
+
+    @property
+    def ready_seconds(self) -> float:
+        """
+        Seconds until the process was ready, or None while starting.
+        """
+        return self.phases.get("ready")
+
+    def report(self) -> dict:
+        """
+        Build the startup-time report.
+
+        Returns:
+            dict: Mode, pid, phase timings, parent phases for preforked workers, and seconds
+                spent importing each lazily imported library so far.
+        """
+        return {
+            "mode": self.mode,
+            "pid": os.getpid(),
+            "ready_seconds": self.ready_seconds,
+            "phases": dict(self.phases),
+            "parent_phases": dict(self.parent_phases),
+            "lazy_imports": dict(import_times),
+        }
+
+startup_report = StartupReport()
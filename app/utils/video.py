@@ -0,0 +1,254 @@
+import time
+from contextlib import contextmanager
+import cv2
+import dlib
+import numpy as np
+from .analysis_params import (
+    CONFIDENCE_THRESHOLD, FACE_CROP_MARGIN, VIDEO_SAMPLE_FPS, VIDEO_MIN_SAMPLE_FPS, VIDEO_MAX_SAMPLE_FPS,
+    VIDEO_STABLE_DELTA, VIDEO_DETECT_SIZE, VIDEO_KEYFRAME_INTERVAL, VIDEO_TRACKING_MIN_PSR, VIDEO_BATCH_SIZE,
+    VIDEO_MIN_FRAMES, VIDEO_MAX_FRAMES, VIDEO_CONFIDENCE_Z,
+)
+from .compact_profile import CompactProfile
+from .deep_analysis import embed_image_tensors
+from .executor import profile_executor
+from .landmark_analysis import NoFaceDetectedError
+from .metrics import record_stage_timings
+from .model_registry import model_registry
+from .preprocessing import scale_box
+from .profile import analyze_face_crops, compare_profile_batch, record_failures
+
+class FaceTracker:
+    """
+    Follows one face across sampled video frames.
+
+    The dlib detector only runs on keyframes, every `keyframe_interval` sampled frames or
+    whenever the correlation tracker loses confidence. In between, the face box is tracked,
+    which costs a fraction of a detection.
+
+    Args:
+        keyframe_interval (int): Sampled frames between full detections.
+        min_psr (float): Tracker peak-to-sidelobe ratio below which the face is re-detected.
+    """
+    def __init__(self, keyframe_interval: int = VIDEO_KEYFRAME_INTERVAL, min_psr: float = VIDEO_TRACKING_MIN_PSR):
+        self.keyframe_interval = keyframe_interval
+        self.min_psr = min_psr
+        self.detections = 0
+        self._tracker = None
+        self._box = None
+        self._since_detection = 0
+
+    def locate(self, view: np.ndarray) -> tuple:
+        """
+        Locate the followed face in the next sampled frame.
+
+        Args:
+            view (numpy.ndarray): Downscaled grayscale frame.
+
+        Returns:
+            tuple: Face box in view coordinates as (left, top, right, bottom), or None if no face is found,
+                and whether the frame was a keyframe.
+        """
+        if self._tracker is not None and self._since_detection < self.keyframe_interval:
+            if self._tracker.update(view) >= self.min_psr:
+                position = self._tracker.get_position()
+                self._box = (int(position.left()), int(position.top()), int(position.right()), int(position.bottom()))
+                self._since_detection += 1
+                return self._box, False
+        return self._detect(view), True
+
+    def _detect(self, view: np.ndarray) -> tuple:
+        self.detections += 1
+        faces = model_registry.landmark_analyzer.face_detector(view)
+        if not len(faces):
+            self._tracker = None
+            return None
+
+        # Keep following the same person, picking the detection closest to the last known box
+        face = faces[0]
+        if self._box is not None:
+            center = np.array([(self._box[0] + self._box[2]) / 2, (self._box[1] + self._box[3]) / 2])
+            face = min(faces, key=lambda f: np.linalg.norm(np.array([f.center().x, f.center().y]) - center))
+
+        self._tracker = dlib.correlation_tracker()
+        self._tracker.start_track(view, face)
+        self._since_detection = 0
+        self._box = (face.left(), face.top(), face.right(), face.bottom())
+        return self._box
+
+def verdict_settled(confidences: list[float], threshold: float = CONFIDENCE_THRESHOLD, z: float = VIDEO_CONFIDENCE_Z) -> bool:
+    """
+    Check whether more frames are unlikely to move the mean confidence across the threshold.
+
+    Args:
+        confidences (list[float]): Per-frame confidences analyzed so far.
+        threshold (float): Deepfake confidence threshold.
+        z (float): Standard errors required between the mean and the threshold.
+
+    Returns:
+        bool: True once the mean is at least `z` standard errors away from the threshold.
+    """
+    if len(confidences) < max(2, VIDEO_MIN_FRAMES):
+        return False
+    standard_error = np.std(confidences, ddof=1) / np.sqrt(len(confidences))
+    return abs(np.mean(confidences) - threshold) > z * standard_error
+
+def verify_video(video_path: str, reference: CompactProfile, timings: dict = None) -> dict:
+    """
+    Verify the face in a video against a reference profile.
+
+    Frames are decoded sequentially and sampled adaptively: sampling speeds up while the
+    confidence changes and slows down while it is stable. The face is detected on keyframes
+    and tracked in between. Sampled face crops are analyzed in batches of VIDEO_BATCH_SIZE
+    by `analyze_face_crops`, the analysis behind every stored profile, and decoding stops
+    as soon as the verdict is statistically settled.
+
+    Args:
+        video_path (str): Path of the video file.
+        reference (CompactProfile): Profile to verify against.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
+
+    Returns:
+        dict: Mean confidence and its confidence interval (None for a single frame), frame counts, whether
+            the verdict settled early, and per-frame results with frame index, timestamp, face box, keyframe
+            flag and confidence.
+
+    Raises:
+        ValueError: If the file cannot be decoded as a video.
+        NoFaceDetectedError: If no face is found in any sampled frame.
+    """
+    stage_timings = {}
+
+    @contextmanager
+    def timed(stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage_timings[stage] = stage_timings.get(stage, 0.0) + time.perf_counter() - start
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError("Invalid Video Format")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    min_stride, max_stride = max(1.0, fps / VIDEO_MAX_SAMPLE_FPS), max(1.0, fps / VIDEO_MIN_SAMPLE_FPS)
+    stride = min(max_stride, max(min_stride, fps / VIDEO_SAMPLE_FPS))
+
+    tracker = FaceTracker()
+    frames, batch, confidences = [], [], []
+    frame_index, next_sample, decoded, without_face, settled = -1, 0.0, 0, 0, False
+
+    def analyze_batch():
+        nonlocal stride
+        landmark_distances, image_tensors, lbp_histograms = analyze_face_crops(
+            [(rgb, box, crop_box) for _, rgb, box, crop_box, _ in batch], timed)
+        with timed("facenet"):
+            deep_features = embed_image_tensors(image_tensors)
+        with timed("compare"):
+            batch_confidences = compare_profile_batch(reference, landmark_distances, deep_features, lbp_histograms).tolist()
+        for (index, _, box, _, keyframe), confidence in zip(batch, batch_confidences):
+            frames.append({"frame": index, "timestamp": index / fps, "box": box, "keyframe": keyframe, "confidence": confidence})
+        confidences.extend(batch_confidences)
+        batch.clear()
+
+        # Sample faster while the confidence moves, slower while it is stable
+        if max(batch_confidences) - min(batch_confidences) < VIDEO_STABLE_DELTA:
+            stride = min(max_stride, stride * 1.5)
+        else:
+            stride = max(min_stride, stride / 2)
+
+    try:
+        while len(confidences) + len(batch) < VIDEO_MAX_FRAMES:
+            # Grab every frame but only convert the sampled ones
+            with timed("decode"):
+                if not capture.grab():
+                    break
+                frame_index += 1
+                decoded += 1
+                if frame_index < next_sample:
+                    continue
+                next_sample += stride
+                ok, bgr = capture.retrieve()
+                if not ok:
+                    break
+
+            with timed("track"):
+                height, width = bgr.shape[:2]
+                scale = min(1.0, VIDEO_DETECT_SIZE / max(height, width))
+                view = cv2.cvtColor(cv2.resize(bgr, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+                box, keyframe = tracker.locate(view)
+            if box is None:
+                without_face += 1
+                continue
+
+            scale_x, scale_y = width / view.shape[1], height / view.shape[0]
+            face_box = scale_box(box, scale_x, scale_y, width, height)
+            if face_box[2] <= face_box[0] or face_box[3] <= face_box[1]:
+                without_face += 1
+                continue
+            crop_box = scale_box(box, scale_x, scale_y, width, height, FACE_CROP_MARGIN)
+            batch.append((frame_index, cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), face_box, crop_box, keyframe))
+
+            if len(batch) == VIDEO_BATCH_SIZE:
+                analyze_batch()
+                if verdict_settled(confidences):
+                    settled = True
+                    break
+        if batch:
+            analyze_batch()
+    finally:
+        capture.release()
+
+    if not confidences:
+        raise NoFaceDetectedError("No faces detected within video")
+
+    mean = float(np.mean(confidences))
+    interval = None
+    if len(confidences) > 1:
+        margin = VIDEO_CONFIDENCE_Z * float(np.std(confidences, ddof=1) / np.sqrt(len(confidences)))
+        interval = (mean - margin, mean + margin)
+    if timings is not None:
+        timings.update(stage_timings)
+    return {
+        "confidence": mean,
+        "confidence_interval": interval,
+        "frames_decoded": decoded,
+        "frames_analyzed": len(confidences),
+        "frames_without_face": without_face,
+        "detections": tracker.detections,
+        "early_exit": settled,
+        "video_seconds": decoded / fps,
+        "frames": frames,
+    }
+
+def _verify_video_with_timings(video_path: str, reference: CompactProfile) -> tuple[dict, dict]:
+    # Process pool entry point, timings cannot be filled in across processes
+    timings = {}
+    return verify_video(video_path, reference, timings), timings
+
+async def verify_video_async(video_path: str, reference: CompactProfile, timings: dict = None) -> dict:
+    """
+    Verify the face in a video against a reference profile in the worker pool.
+
+    Args:
+        video_path (str): Path of the video file.
+        reference (CompactProfile): Profile to verify against.
+        timings (dict): Optional dictionary filled with seconds spent per stage.
+
+    Returns:
+        dict: Verification results as returned by `verify_video`.
+
+    Raises:
+        ServerOverloadedError: If the worker pool and its queue are saturated.
+        ValueError: If the file cannot be decoded as a video.
+        NoFaceDetectedError: If no face is found in any sampled frame.
+    """
+    # Copy the reference out of the memory-mapped store so it can be sent to process workers
+    reference = CompactProfile.from_bytes(reference.to_bytes())
+    with record_failures():
+        async with profile_executor.admit():
+            result, stage_timings = await profile_executor.run(_verify_video_with_timings, video_path, reference)
+
+    record_stage_timings(stage_timings)
+    if timings is not None:
+        timings.update(stage_timings)
+    return result
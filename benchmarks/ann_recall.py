@@ -0,0 +1,97 @@
+"""
+Recall@k and latency benchmark of the IVF-flat index against exact search.
+
+Ground truth is the existing `compare_embeddings` scoring of each query against every
+gallery embedding, so recall measures agreement with the confidence used by the API.
+
+Usage:
+    python benchmarks/ann_recall.py --gallery 10000 --queries 10 --k 10 --nprobe 1 4 16 64
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.utils.ann_index import IVFFlatIndex
+from app.utils.deep_analysis import compare_embeddings
+from app.utils.embedding_index import EmbeddingIndex
+
+def synthetic_embeddings(n: int, dim: int, identities: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Generate clustered embeddings resembling several photos per identity.
+
+    Args:
+        n (int): Number of embeddings.
+        dim (int): Embedding dimension.
+        identities (int): Number of identity clusters.
+        rng (numpy.random.Generator): Random generator.
+
+    Returns:
+        numpy.ndarray: (n, dim) float32 embeddings.
+    """
+    centers = rng.normal(size=(identities, dim))
+    labels = rng.integers(0, identities, size=n)
+    return (centers[labels] + 0.6 * rng.normal(size=(n, dim))).astype(np.float32)
+
+def ground_truth(gallery: np.ndarray, query: np.ndarray, k: int) -> list[int]:
+    # Top-k by the API's pairwise confidence score
+    confidences = [compare_embeddings(query[None, :], embedding[None, :]) for embedding in gallery]
+    return list(np.argsort(confidences)[::-1][:k])
+
+def timed_search(index, queries: np.ndarray, k: int, **kwargs) -> tuple[list, float]:
+    # Run every query and return results with mean latency in milliseconds
+    start = time.perf_counter()
+    results = [index.search(query, k, **kwargs) for query in queries]
+    return results, 1000 * (time.perf_counter() - start) / len(queries)
+
+def recall_at_k(results: list, truths: list, k: int) -> float:
+    # Fraction of ground-truth neighbours found in the returned top-k
+    hits = sum(len({int(profile_id) for profile_id, _ in result} & {int(i) for i in truth}) for result, truth in zip(results, truths))
+    return hits / (k * len(truths))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gallery", type=int, default=10000, help="Number of gallery embeddings")
+    parser.add_argument("--queries", type=int, default=10, help="Number of query embeddings")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--nlist", type=int, default=128, help="Inverted lists of the IVF index")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64], help="Lists scanned per search")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_embeddings(args.gallery + args.queries, 512, max(1, args.gallery // 5), rng)
+    gallery, queries = vectors[:args.gallery], vectors[args.gallery:]
+
+    exact = EmbeddingIndex(initial_capacity=args.gallery)
+    ivf = IVFFlatIndex(nlist=args.nlist, min_train_size=args.nlist, retrain_interval=0)
+    for i, embedding in enumerate(gallery):
+        exact.add(str(i), embedding)
+        ivf.add(str(i), embedding)
+
+    start = time.perf_counter()
+    ivf.train(seed=args.seed)
+    train_seconds = time.perf_counter() - start
+
+    truths = [ground_truth(gallery, query, args.k) for query in queries]
+    exact_results, exact_ms = timed_search(exact, queries, args.k)
+    report = {
+        "gallery": args.gallery,
+        "queries": args.queries,
+        "k": args.k,
+        "nlist": args.nlist,
+        "train_seconds": train_seconds,
+        "exact": {"recall": recall_at_k(exact_results, truths, args.k), "latency_ms": exact_ms},
+        "ivf": [],
+    }
+    for nprobe in args.nprobe:
+        results, latency_ms = timed_search(ivf, queries, args.k, nprobe=nprobe)
+        report["ivf"].append({"nprobe": nprobe, "recall": recall_at_k(results, truths, args.k), "latency_ms": latency_ms})
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Speed and detection rate benchmark of the face detectors at several detection resolutions.
+
+The image set is the `tests/test_images` photos and their augmented copies, plus copies
+rotated by --angles degrees, since in-plane rotation is where detectors differ most.
+Every image contains one face, so the detection rate is the fraction of images where at
+least one face is found. For each detector and --detect-sizes value the report gives the
+detection latency on the downscaled view, and the latency of the aligned single-face
+pipeline (detection, crop, landmarks, alignment, FaceNet preprocessing and LBP).
+Detectors whose models or OpenCV support are missing are reported as unavailable.
+
+Usage:
+    python benchmarks/face_detectors.py
+    python benchmarks/face_detectors.py --detectors dlib mtcnn --detect-sizes 160 240 480 --angles 0 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from io import BytesIO
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.profile_pipeline import augmented_images, summarize
+from app.utils import model_registry
+from app.utils.face_detection import FACE_DETECTORS, create_face_detector
+from app.utils.landmark_analysis import NoFaceDetectedError
+from app.utils.preprocessing import PreparedImage
+from app.utils.profile import detect_face_boxes, analyze_face_crops
+
+def benchmark_images(max_side: int, angles: list[int]) -> list[tuple[str, Image.Image]]:
+    """
+    Build the augmented image set with rotated copies.
+
+    Args:
+        max_side (int): Downscale originals so their longest side is at most this (0 keeps full size).
+        angles (list[int]): Rotations in degrees applied to every augmented image, 0 keeps it upright.
+
+    Returns:
+        list[tuple[str, PIL.Image.Image]]: Image names and decoded RGB images.
+    """
+    images = []
+    for name, data in augmented_images(max_side):
+        image = Image.open(BytesIO(data)).convert("RGB")
+        for angle in angles:
+            rotated = image.rotate(angle, resample=Image.BICUBIC, fillcolor=(128, 128, 128)) if angle else image
+            images.append((f"{name}@{angle}", rotated))
+    return images
+
+def bench_detector(detector, images: list, detect_size: int) -> dict:
+    # Swap the detector into the shared analyzer so the pipeline runs exactly as served
+    analyzer = model_registry.landmark_analyzer
+    analyzer.face_detector = detector
+
+    detect_samples, pipeline_samples, found = [], [], 0
+    for _, image in images:
+        prepared = PreparedImage(image)
+        view = prepared.downscaled_bgr(detect_size)
+        start = time.perf_counter()
+        faces = detector(view)
+        detect_samples.append(time.perf_counter() - start)
+        if not faces:
+            continue
+        found += 1
+
+        start = time.perf_counter()
+        try:
+            boxes, crop_boxes = detect_face_boxes(prepared, view, max_faces=1)
+            analyze_face_crops([(prepared.rgb, boxes[0], crop_boxes[0])], align=True)
+        except NoFaceDetectedError:
+            continue
+        pipeline_samples.append(time.perf_counter() - start)
+
+    return {
+        "detection_rate": found / len(images),
+        "detect": summarize(detect_samples),
+        "aligned_pipeline": summarize(pipeline_samples) if pipeline_samples else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detectors", nargs="+", default=list(FACE_DETECTORS), help="Detectors to compare")
+    parser.add_argument("--detect-sizes", type=int, nargs="+", default=[160, 240, 320, 480], help="Longest side of the detection view")
+    parser.add_argument("--angles", type=int, nargs="+", default=[0, 15, -30], help="In-plane rotations added to the image set, in degrees")
+    parser.add_argument("--max-side", type=int, default=1024, help="Downscale test images to this longest side (0 keeps full size)")
+    args = parser.parse_args()
+
+    model_registry.load()
+    images = benchmark_images(args.max_side, args.angles)
+    default_detector = model_registry.landmark_analyzer.face_detector
+
+    report = {"images": len(images), "detectors": {}}
+    for name in args.detectors:
+        try:
+            start = time.perf_counter()
+            detector = create_face_detector(name)
+            load_seconds = time.perf_counter() - start
+        except (FileNotFoundError, RuntimeError, ValueError) as e:
+            report["detectors"][name] = {"unavailable": str(e)}
+            continue
+        report["detectors"][name] = {
+            "load_seconds": load_seconds,
+            "sizes": {str(size): bench_detector(detector, images, size) for size in args.detect_sizes},
+        }
+    model_registry.landmark_analyzer.face_detector = default_detector
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
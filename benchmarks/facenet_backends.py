@@ -0,0 +1,102 @@
+"""
+Throughput and accuracy-parity benchmark of the FaceNet inference backends.
+
+The reference set is the `tests/test_images` photos plus their augmented copies, run
+through the regular profile preprocessing. Every backend is checked against the fp32
+eager embeddings of the same images and timed at several batch sizes. A backend passes
+when its minimum cosine similarity to fp32 is at least FACENET_PARITY_MIN_COSINE.
+
+Usage:
+    python benchmarks/facenet_backends.py
+    python benchmarks/facenet_backends.py --backends eager torchscript channels_last,torchscript --batch-sizes 1 16
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from io import BytesIO
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.profile_pipeline import augmented_images, summarize
+from facenet_pytorch import InceptionResnetV1
+from app.utils.analysis_params import FACENET_PRETRAINED, FACENET_PARITY_MIN_COSINE
+from app.utils.facenet_backends import FacenetBackend, embedding_parity
+from app.utils.landmark_analysis import NoFaceDetectedError
+from app.utils.profile import extract_profile_inputs
+
+def reference_tensors(max_side: int) -> torch.Tensor:
+    """
+    Preprocess the offline image set into FaceNet inputs.
+
+    Args:
+        max_side (int): Downscale originals so their longest side is at most this (0 keeps full size).
+
+    Returns:
+        torch.Tensor: Input tensors of every image where a face is found, with shape (N, 3, 160, 160).
+    """
+    tensors = []
+    for _, data in augmented_images(max_side):
+        try:
+            tensors.append(extract_profile_inputs(Image.open(BytesIO(data)))[1])
+        except NoFaceDetectedError:
+            continue
+    return torch.cat(tensors)
+
+def time_batches(backend: FacenetBackend, tensors: torch.Tensor, batch_size: int, iterations: int, warmup: int) -> dict:
+    # Cycle through the reference set in batches, discarding warmup calls
+    samples = []
+    for i in range(warmup + iterations):
+        start_index = (i * batch_size) % len(tensors)
+        batch = tensors[start_index:start_index + batch_size]
+        if len(batch) < batch_size:
+            batch = torch.cat([batch, tensors[:batch_size - len(batch)]])
+        start = time.perf_counter()
+        backend(batch)
+        if i >= warmup:
+            samples.append(time.perf_counter() - start)
+    result = summarize(samples)
+    result["images_per_second"] = result["throughput"] * batch_size
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["eager", "torchscript", "int8", "channels_last", "channels_last,torchscript", "channels_last,int8,torchscript"], help="Backend specifications to compare")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8], help="Images per forward pass")
+    parser.add_argument("--iterations", type=int, default=10, help="Timed forward passes per batch size")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed forward passes before each batch size")
+    parser.add_argument("--max-side", type=int, default=0, help="Downscale test images to this longest side (0 keeps full size)")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 keeps torch default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tensors = reference_tensors(args.max_side)
+    model = InceptionResnetV1(pretrained=FACENET_PRETRAINED).eval()
+    reference = FacenetBackend(model, "eager")(tensors)
+
+    report = {"images": len(tensors), "torch_num_threads": torch.get_num_threads(), "backends": {}}
+    failed = []
+    for spec in args.backends:
+        start = time.perf_counter()
+        backend = FacenetBackend(model, spec)
+        build_seconds = time.perf_counter() - start
+        parity = embedding_parity(reference, backend(tensors))
+        parity["passed"] = parity["min_cosine"] >= FACENET_PARITY_MIN_COSINE
+        if not parity["passed"]:
+            failed.append(backend.name)
+        report["backends"][backend.name] = {
+            "build_seconds": build_seconds,
+            "weight_bytes": backend.nbytes,
+            "parity": parity,
+            "batches": {str(size): time_batches(backend, tensors, size, args.iterations, args.warmup) for size in args.batch_sizes},
+        }
+    report["failed_parity"] = failed
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Reproducible benchmark suite for the profile pipeline and API.
+
+Three layers can be run on their own or together, fully offline:
+    cold-start  Import time and model load time, measured in fresh interpreters.
+    stages      Per-stage microbenchmarks of the extract and compare functions.
+    load        End-to-end load against a local uvicorn for create, verify and get.
+
+Inputs are the `tests/test_images` photos plus augmented copies (flips, brightness,
+downscaling and JPEG recompression). Results are printed as JSON with throughput and
+p50/p95/p99 latencies in milliseconds, and can be saved as or compared to a baseline.
+
+Usage:
+    python benchmarks/profile_pipeline.py all --save-baseline benchmarks/baseline.json
+    python benchmarks/profile_pipeline.py stages load --concurrency 8 --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageEnhance, ImageOps
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+IMAGE_DIR = os.path.join(ROOT, "tests", "test_images")
+sys.path.insert(0, ROOT)
+
+COLD_START_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from app.main import app
+from app.utils import model_registry
+imported = time.perf_counter()
+model_registry.load()
+loaded = time.perf_counter()
+print(json.dumps({"import": imported - start, "model_load": loaded - imported, "total": loaded - start}))
+"""
+
+def summarize(samples: list[float], elapsed: float = None) -> dict:
+    """
+    Summarize latency samples.
+
+    Args:
+        samples (list[float]): Latencies in seconds.
+        elapsed (float): Wall-clock seconds for the whole run, defaults to the summed latencies.
+
+    Returns:
+        dict: Sample count, throughput per second and mean/p50/p95/p99 latency in milliseconds.
+    """
+    latencies = 1000 * np.asarray(samples)
+    elapsed = elapsed if elapsed is not None else sum(samples)
+    return {
+        "n": len(samples),
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def augmented_images(max_side: int = 0) -> list[tuple[str, bytes]]:
+    """
+    Build the offline image set from the test images and augmented copies of them.
+
+    Args:
+        max_side (int): Downscale originals so their longest side is at most this (0 keeps full size).
+
+    Returns:
+        list[tuple[str, bytes]]: JPEG file names and encoded bytes.
+    """
+    images = []
+    for filename in sorted(os.listdir(IMAGE_DIR)):
+        original = Image.open(os.path.join(IMAGE_DIR, filename)).convert("RGB")
+        if max_side:
+            original.thumbnail((max_side, max_side))
+        stem = os.path.splitext(filename)[0]
+        variants = {
+            "": original,
+            "_flip": ImageOps.mirror(original),
+            "_dark": ImageEnhance.Brightness(original).enhance(0.8),
+            "_bright": ImageEnhance.Brightness(original).enhance(1.2),
+            "_half": original.resize((original.width // 2, original.height // 2)),
+        }
+        for suffix, image in variants.items():
+            for quality in (95, 60):
+                buffer = BytesIO()
+                image.save(buffer, format="JPEG", quality=quality)
+                images.append((f"{stem}{suffix}_q{quality}.jpg", buffer.getvalue()))
+    return images
+
+def bench_cold_start(args) -> dict:
+    """
+    Measure import and model load time in fresh interpreters.
+    """
+    runs = []
+    for _ in range(args.cold_runs):
+        output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=ROOT, capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {phase: summarize([run[phase] for run in runs]) for phase in ("import", "model_load", "total")}
+
+def time_calls(fn, inputs: list, iterations: int, warmup: int) -> dict:
+    # Cycle through the inputs, discarding warmup calls
+    samples = []
+    for i in range(warmup + iterations):
+        arg = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(*arg)
+        if i >= warmup:
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def bench_stages(args) -> dict:
+    """
+    Microbenchmark each extraction and comparison stage on in-memory images.
+    """
+    import cv2
+    from app.utils import model_registry
+    from app.utils.deep_analysis import extract_deep_features, compare_embeddings
+    from app.utils.landmark_analysis import compare_distance_vectors
+    from app.utils.lbph_analysis import extract_lbp_histogram, compare_lbp_histograms
+    from app.utils.profile import generate_profile, compare_profiles
+
+    model_registry.load()
+    analyzer = model_registry.landmark_analyzer
+    encoded = augmented_images(args.max_side)
+    pil_images = [Image.open(BytesIO(data)) for _, data in encoded]
+    bgr_images = [(cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR),) for image in pil_images]
+
+    # Profiles for the comparison stages, skipping augmentations where no face is found
+    profiles = []
+    for _, data in encoded:
+        try:
+            profiles.append(generate_profile(Image.open(BytesIO(data))))
+        except TypeError:
+            continue
+    pairs = [(p1, p2) for p1 in profiles for p2 in profiles]
+
+    iterations, warmup = args.iterations, args.warmup
+    return {
+        "extract_landmarks": time_calls(analyzer.extract_landmarks, bgr_images, iterations, warmup),
+        "extract_deep_features": time_calls(extract_deep_features, bgr_images, iterations, warmup),
+        "extract_lbp_histogram": time_calls(extract_lbp_histogram, bgr_images, iterations, warmup),
+        "generate_profile": time_calls(lambda data: generate_profile(Image.open(BytesIO(data))), [(data,) for _, data in encoded], iterations, warmup),
+        "compare_distance_vectors": time_calls(lambda p1, p2: compare_distance_vectors(p1.landmarks, p2.landmarks), pairs, 100 * iterations, warmup),
+        "compare_embeddings": time_calls(lambda p1, p2: compare_embeddings(p1.embedding[None, :], p2.embedding[None, :]), pairs, 100 * iterations, warmup),
+        "compare_lbp_histograms": time_calls(lambda p1, p2: compare_lbp_histograms(p1.lbp, p2.lbp), pairs, 100 * iterations, warmup),
+        "compare_profiles": time_calls(compare_profiles, pairs, 100 * iterations, warmup),
+    }
+
+def multipart(filename: str, data: bytes) -> tuple[bytes, str]:
+    # Encode a single "file" field as multipart/form-data
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def request(url: str, method: str = "GET", upload: tuple = None) -> tuple[int, bytes, float]:
+    # Send one request, returning status, body and latency
+    body, headers = None, {}
+    if upload is not None:
+        body, headers["Content-Type"] = multipart(*upload)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body, method=method, headers=headers), timeout=120) as response:
+            status, content = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, content = e.code, e.read()
+    return status, content, time.perf_counter() - start
+
+def run_load(calls: list, concurrency: int) -> tuple[dict, list]:
+    # Issue every call with a fixed number of client threads
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda call: request(*call), calls))
+    elapsed = time.perf_counter() - start
+    ok = [latency for status, _, latency in results if status < 400]
+    summary = summarize(ok, elapsed) if ok else {"n": 0}
+    summary["errors"] = len(results) - len(ok)
+    return summary, results
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(args) -> tuple[subprocess.Popen, str]:
+    """
+    Start a local uvicorn with a throwaway profile store and wait until it is ready.
+    """
+    port = free_port()
+    env = dict(os.environ, PROFILE_STORE_PATH=tempfile.mkdtemp(prefix="bench_store_"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        try:
+            if request(url + "/health/ready")[0] == 200:
+                return server, url
+        except OSError:
+            pass
+        if server.poll() is not None:
+            break
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("uvicorn did not become ready")
+
+def bench_load(args) -> dict:
+    """
+    Drive create, verify and get requests at the configured concurrency.
+    """
+    server, url = (None, args.url) if args.url else start_server(args)
+    try:
+        rng = random.Random(args.seed)
+        images = augmented_images(args.max_side)
+        uploads = [images[i % len(images)] for i in range(args.requests)]
+
+        create, results = run_load([(url + "/profile/create", "POST", upload) for upload in uploads], args.concurrency)
+        profile_ids = [json.loads(content)["profile_id"] for status, content, _ in results if status == 200]
+        if not profile_ids:
+            raise RuntimeError("No profiles were created")
+
+        verify, _ = run_load([(f"{url}/profile/verify/{rng.choice(profile_ids)}", "POST", upload) for upload in uploads], args.concurrency)
+        get, _ = run_load([(f"{url}/profile/{rng.choice(profile_ids)}", "GET", None) for _ in range(10 * args.requests)], args.concurrency)
+        return {"concurrency": args.concurrency, "create": create, "verify": verify, "get": get}
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float, path: str = "") -> list[str]:
+    """
+    List latency percentiles that regressed beyond the tolerance.
+
+    Args:
+        report (dict): Current results.
+        baseline (dict): Stored results with the same layout.
+        tolerance (float): Allowed fractional increase before a percentile counts as a regression.
+
+    Returns:
+        list[str]: One description per regression.
+    """
+    regressions = []
+    for key, value in report.items():
+        if key not in baseline:
+            continue
+        if isinstance(value, dict):
+            regressions += compare_to_baseline(value, baseline[key], tolerance, f"{path}{key}.")
+        elif key.startswith("p") and key.endswith("_ms") and baseline[key] > 0:
+            ratio = value / baseline[key]
+            if ratio > 1 + tolerance:
+                regressions.append(f"{path}{key}: {baseline[key]:.2f}ms -> {value:.2f}ms ({ratio:.2f}x)")
+    return regressions
+
+LAYERS = {"cold-start": bench_cold_start, "stages": bench_stages, "load": bench_load}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("layers", nargs="+", choices=[*LAYERS, "all"], help="Benchmark layers to run")
+    parser.add_argument("--cold-runs", type=int, default=3, help="Fresh interpreters for the cold start layer")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed calls per extraction stage (x100 for compare stages)")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed calls before each stage")
+    parser.add_argument("--max-side", type=int, default=0, help="Downscale test images to this longest side (0 keeps full size)")
+    parser.add_argument("--requests", type=int, default=40, help="Create and verify requests in the load layer")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients in the load layer")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers started for the load layer")
+    parser.add_argument("--url", help="Load test an already running server instead of starting one")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against, exits non-zero on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional latency increase over the baseline")
+    parser.add_argument("--save-baseline", help="Write the results to this path as the new baseline")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    layers = list(LAYERS) if "all" in args.layers else args.layers
+    report = {layer: LAYERS[layer](args) for layer in layers}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,55 @@
 from fastapi.testclient import TestClient
+import asyncio
+import json
 import os
+import subprocess
 import sys
+import tempfile
+import zipfile
+from io import BytesIO
+import numpy as np
+import torch
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("PROFILE_STORE_PATH", tempfile.mkdtemp(prefix="profile_store_"))
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(tempfile.mkdtemp(prefix="job_queue_"), "jobs.sqlite3"))
 from app.main import app
+from app.utils.batching import EmbeddingBatcher
+from app.utils.executor import profile_executor
+from app.utils.embedding_index import EmbeddingIndex
+from app.utils.ann_index import IVFFlatIndex
+from app.utils.profile_store import MmapProfileStore, UPGRADE_DEFAULTS
+from app.utils.landmark_analysis import DISTANCE_KEYS, compare_distance_matrix
+from app.models import Profile
+from app.utils.compact_profile import CompactProfile, LBP_BINS, BINARY_HEADER_V1, BINARY_MAGIC
+from app.utils.profile import extract_profile_inputs, analyze_face_crops, detect_face_boxes, compare_profiles, compare_profile_batch, stack_profiles
+from app.utils.lbph_analysis import lbp_histogram_from_gray, lbp_histograms_from_gray, uniform_lbp_codes, lbp_descriptors_from_gray, compare_lbp_histogram_matrix
+from skimage.feature import local_binary_pattern
+from app.utils.analysis_params import LANDMARK_MAX_DIFFERENCE, LBP_MAX_DISTANCE, FACE_DETECT_SIZE, CONFIDENCE_THRESHOLD, LM_WEIGHT, DF_WEIGHT, LBPH_WEIGHT, FACENET_PRETRAINED, FACENET_PARITY_MIN_COSINE
+from app.utils.facenet_backends import FacenetBackend, embedding_parity
+from facenet_pytorch import InceptionResnetV1
+from PIL import Image
+import cv2
+from app.utils.deep_analysis import embed_image_tensors, compare_embedding_matrix
+from app.utils.metrics import FACES_NOT_FOUND, STAGE_LATENCY
+from app.utils.feature_cache import FeatureCache, feature_cache
+from app.utils.ingest import inspect_image, precheck_face, spool_upload, UploadRejectedError
+from app.utils.jobs import JobQueue
+from app.utils.face_detection import create_face_detector
+from app.utils.preprocessing import PreparedImage, alignment_matrix
+from app.utils.snapshot import SNAPSHOT_HEADER, FRAME_PUT, FRAME_DELETE, SnapshotError, IncompatibleSnapshotError, iter_snapshot, import_snapshot, encode_frame, encode_ids
+from app.utils.profile_store import MemoryProfileStore
+from app.routers import profile_routers
+from app.routers.profile_routers import profile_db
+from app.utils.profile import cascade_ranges, cascade_bound, settled_confidence, verify_profile_async, verify_profile_from_bytes, generate_profile
+from app.utils.metrics import CASCADE_STAGES
+from app.utils.profile_ids import ProfileIdGenerator, profile_id_timestamp
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from app.utils.landmark_analysis import NoFaceDetectedError
+import zlib
+from app.utils.bulk import stream_profiles
 
 client = TestClient(app)
 
@@ -92,6 +138,911 @@ def test_verify_real_photo_with_non_existing_profile():
     assert response.status_code == 404
     assert response.json()["detail"] == "Profile not found"
 
+## Model registry readiness ##
+def test_models_ready_after_startup():
+    print("Testing model readiness after startup")
+    with TestClient(app) as startup_client:
+        response = startup_client.get("/health/ready")
+        assert response.status_code == 200
+        assert response.json()["ready"] == True
+        assert response.json()["models"]["facenet"] == True
+
+## Micro-batching ##
+def test_micro_batcher_batches_concurrent_requests():
+    print("Testing micro-batching of concurrent embeddings")
+    batcher = EmbeddingBatcher(max_batch_size=4, max_wait_ms=200)
+    tensors = [torch.rand(1, 3, 160, 160) for _ in range(4)]
+
+    async def embed_all():
+        return await asyncio.gather(*(batcher.embed(tensor) for tensor in tensors))
+
+    embeddings = asyncio.run(embed_all())
+    expected = embed_image_tensors(torch.cat(tensors))
+    assert np.allclose(np.concatenate(embeddings), expected, atol=1e-5)
+    assert batcher.stats.snapshot()["batch_sizes"] == {4: 1}
+
+## Admission control ##
+def test_create_profile_rejected_when_saturated():
+    print("Testing admission control when worker pool is saturated")
+    max_workers, max_queue = profile_executor.max_workers, profile_executor.max_queue
+    profile_executor.max_workers, profile_executor.max_queue = 0, 0
+    feature_cache.clear()
+    try:
+        image_data = load_image(image_path1)
+        response = client.post("/profile/create", files={"file": ("tom1.jpg", image_data, "image/jpeg")})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+    finally:
+        profile_executor.max_workers, profile_executor.max_queue = max_workers, max_queue
+
+## Bulk profile creation ##
+def test_create_profiles_batch():
+    print("Testing bulk profile creation from files and archive")
+    archive_data = BytesIO()
+    with zipfile.ZipFile(archive_data, "w") as archive:
+        archive.writestr("faces/tom2.jpg", load_image(image_path2))
+        archive.writestr("faces/notes.txt", "not an image")
+
+    webp = BytesIO()
+    Image.open(image_path2).save(webp, "WEBP")
+
+    response = client.post("/profile/create/batch", files=[
+        ("files", ("TOM1.JPG", load_image(image_path1), "image/jpeg")),
+        ("files", ("devito.jpg", load_image(different_image_path), "image/jpeg")),
+        ("files", ("tom2.webp", webp.getvalue(), "image/webp")),
+        ("files", ("notes.txt", b"not an image", "text/plain")),
+        ("archive", ("faces.zip", archive_data.getvalue(), "application/zip")),
+    ])
+    assert response.status_code == 200
+    results = {result["filename"]: result for result in map(json.loads, response.text.splitlines())}
+    assert sorted(results) == ["TOM1.JPG", "devito.jpg", "faces/tom2.jpg", "notes.txt", "tom2.webp"]
+    assert "Unsupported file extension" in results.pop("notes.txt")["error"]
+    for result in results.values():
+        assert client.get(f"/profile/{result['profile_id']}").status_code == 200
+
+    # Uploads and archives are read off the event loop
+    readers = []
+    def images():
+        readers.append(threading.current_thread())
+        yield "skipped.txt", ValueError("skipped")
+        readers.append(threading.current_thread())
+    async def collect():
+        return [item async for item in stream_profiles(images())]
+    assert [(name, str(error)) for name, error in asyncio.run(collect())] == [("skipped.txt", "skipped")]
+    assert threading.main_thread() not in readers
+
+## Identification ##
+def test_embedding_index_matches_brute_force():
+    print("Testing embedding index search against brute force")
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(50, 512))
+    index = EmbeddingIndex(initial_capacity=4)
+    for i, embedding in enumerate(embeddings):
+        index.add(str(i), embedding)
+    for i in range(0, 50, 3):
+        index.remove(str(i))
+
+    probe = rng.normal(size=512)
+    remaining = [i for i in range(50) if i % 3]
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    similarities = normalized[remaining] @ (probe / np.linalg.norm(probe))
+    expected = [str(remaining[i]) for i in np.argsort(-similarities)[:5]]
+    assert len(index) == len(remaining)
+    assert [profile_id for profile_id, _ in index.search(probe, 5)] == expected
+
+def test_ivf_index_full_probe_matches_exact_search():
+    print("Testing IVF index against exact search")
+    rng = np.random.default_rng(1)
+    embeddings = rng.normal(size=(400, 512))
+    exact = EmbeddingIndex()
+    ivf = IVFFlatIndex(nlist=8, min_train_size=8, retrain_interval=0)
+    for i, embedding in enumerate(embeddings):
+        exact.add(str(i), embedding)
+        ivf.add(str(i), embedding)
+    ivf.train()
+    for i in range(0, 400, 7):
+        exact.remove(str(i))
+        ivf.remove(str(i))
+
+    probe = rng.normal(size=512)
+    assert ivf.centroids is not None and len(ivf) == len(exact)
+    assert [profile_id for profile_id, _ in ivf.search(probe, 10, nprobe=8)] == [profile_id for profile_id, _ in exact.search(probe, 10)]
+    assert len(ivf.search(probe, 10, nprobe=1)) == 10
+
+def test_identify_photo_matches_enrolled_profile():
+    print("Testing identification of enrolled profile")
+    image_data = load_image(image_path1)
+    response = client.post("/profile/create", files={"file": ("tom1.jpg", image_data, "image/jpeg")})
+    profile_id = response.json()["profile_id"]
+
+    response = client.post("/profile/identify", files={"file": ("tom1.jpg", image_data, "image/jpeg")})
+    print(response.json()["message"])
+    assert response.status_code == 200
+    assert response.json()["match_found"] == True
+    # Earlier tests may have enrolled the same image under other ids
+    assert profile_id in [candidate["profile_id"] for candidate in response.json()["candidates"]]
+
+## Persistent profile store ##
+def random_profile(rng):
+    return Profile(
+        landmark_distances={key: float(value) for key, value in zip(DISTANCE_KEYS, rng.uniform(0, 100, len(DISTANCE_KEYS)))},
+        deep_features=[rng.normal(size=512).tolist()],
+        lbp_histogram=rng.dirichlet(np.ones(LBP_BINS)).tolist(),
+    )
+
+def test_mmap_store_shared_between_workers_and_restarts():
+    print("Testing memory-mapped profile store across workers, compaction and restart")
+    rng = np.random.default_rng(2)
+    path = tempfile.mkdtemp()
+    worker1, worker2 = MmapProfileStore(path), MmapProfileStore(path)
+    seen = {}
+    worker2.subscribe(lambda profile_id, embedding: seen.__setitem__(profile_id, embedding is not None))
+
+    profiles = {str(i): random_profile(rng) for i in range(6)}
+    for profile_id, profile in profiles.items():
+        worker1[profile_id] = profile
+    del worker2["0"]
+    del worker2["1"]
+    worker1.refresh()
+    worker2.refresh()
+    assert worker1.keys() == worker2.keys() == ["2", "3", "4", "5"]
+    assert seen == {"0": False, "1": False, "2": True, "3": True, "4": True, "5": True}
+
+    worker1.compact()
+    restarted = MmapProfileStore(path)
+    for store in (worker2, restarted):
+        assert len(store) == 4 and "0" not in store
+        restored = store["3"].to_profile()
+        assert np.allclose(restored.deep_features, profiles["3"].deep_features, atol=1e-6)
+        assert np.allclose(restored.lbp_histogram, profiles["3"].lbp_histogram, atol=1e-6)
+        assert restored.landmark_distances.keys() == profiles["3"].landmark_distances.keys()
+
+## Compact profiles ##
+def test_retrieve_profile_binary_format():
+    print("Testing binary profile retrieval")
+    image_data = load_image(image_path1)
+    response = client.post("/profile/create", files={"file": ("tom1.jpg", image_data, "image/jpeg")})
+    profile_id = response.json()["profile_id"]
+
+    json_profile = client.get(f"/profile/{profile_id}").json()["profile"]
+    response = client.get(f"/profile/{profile_id}", headers={"Accept": "application/octet-stream"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.content == client.get(f"/profile/{profile_id}?format=binary").content
+
+    binary_profile = CompactProfile.from_bytes(response.content)
+    assert np.allclose(binary_profile.embedding, json_profile["deep_features"][0])
+    assert np.allclose(binary_profile.lbp, json_profile["lbp_histogram"])
+    assert np.allclose(binary_profile.landmarks, [json_profile["landmark_distances"][key] for key in DISTANCE_KEYS])
+
+## Shared preprocessing ##
+def test_single_face_inputs_match_face_crop_analysis():
+    print("Testing single-face extraction against the shared face crop analysis")
+    landmarks, image_tensor, lbp_histogram, timings = extract_profile_inputs(Image.open(image_path2))
+
+    # The face found on the detection view goes through the same crop analysis as multi-face and video profiles
+    prepared = PreparedImage(Image.open(image_path2))
+    boxes, crop_boxes = detect_face_boxes(prepared, prepared.downscaled_bgr(FACE_DETECT_SIZE), max_faces=1)
+    expected_landmarks, expected_tensors, expected_lbp = analyze_face_crops([(prepared.rgb, boxes[0], crop_boxes[0])])
+    assert np.array_equal(landmarks, expected_landmarks[0])
+    assert torch.equal(image_tensor, expected_tensors)
+    assert np.array_equal(lbp_histogram, expected_lbp[0])
+    assert {"decode", "detect", "crop", "landmarks", "facenet_preprocess", "lbp"} <= timings.keys()
+
+    feature_cache.clear()
+    response = client.post("/profile/create", files={"file": ("tom2.jpg", load_image(image_path2), "image/jpeg")})
+    assert "facenet;dur=" in response.headers["Server-Timing"]
+
+## Metrics ##
+def test_metrics_endpoint_reports_stages_and_faces_not_found():
+    print("Testing Prometheus metrics endpoint")
+    feature_cache.clear()
+    stage_count = STAGE_LATENCY.count(stage="landmarks")
+    faces_not_found = FACES_NOT_FOUND.value()
+    client.post("/profile/create", files={"file": ("tom2.jpg", load_image(image_path2), "image/jpeg")})
+
+    blank = BytesIO()
+    Image.new("RGB", (320, 320), "white").save(blank, format="JPEG")
+    response = client.post("/profile/create", files={"file": ("blank.jpg", blank.getvalue(), "image/jpeg")})
+    assert response.status_code == 500
+    assert STAGE_LATENCY.count(stage="landmarks") == stage_count + 1
+    assert FACES_NOT_FOUND.value() == faces_not_found + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'profile_stage_duration_seconds_bucket{stage="facenet",le="+Inf"}' in response.text
+    assert 'http_requests_total{method="POST",route="/profile/create",status="200"}' in response.text
+    assert "faces_not_found_total" in response.text
+    assert "model_memory_bytes" in response.text
+
+## Feature cache ##
+def test_repeated_upload_served_from_feature_cache():
+    print("Testing feature cache on repeated uploads")
+    response = client.post("/profile/create", files={"file": ("tom1.jpg", load_image(image_path1), "image/jpeg")})
+    profile_id = response.json()["profile_id"]
+    hits = feature_cache.hits
+
+    response = client.post(f"/profile/verify/{profile_id}", files={"file": ("tom1.jpg", load_image(image_path1), "image/jpeg")})
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith("upload;dur=") and "cache;dur=" in response.headers["Server-Timing"]
+    assert "facenet;dur=" not in response.headers["Server-Timing"]
+    assert feature_cache.hits == hits + 1
+    assert response.json()["confidence"] == 100
+
+def test_feature_cache_evicts_and_persists():
+    print("Testing feature cache eviction and persistence")
+    rng = np.random.default_rng(0)
+    profiles = [CompactProfile.from_profile(random_profile(rng)) for _ in range(3)]
+    entry_size = len(profiles[0].to_bytes())
+    with tempfile.TemporaryDirectory() as path:
+        cache = FeatureCache(max_bytes=2 * entry_size, path=path)
+        keys = [cache.key(bytes([i])) for i in range(3)]
+        for key, profile in zip(keys, profiles):
+            cache.put(key, profile)
+        assert cache.get(keys[0]) is None
+        assert cache.stats()["evictions"] == 1
+
+        # A new cache over the same directory, like a restarted worker, serves the survivors
+        restarted = FeatureCache(max_bytes=2 * entry_size, path=path)
+        assert restarted.stats()["entries"] == 2
+        assert np.array_equal(restarted.get(keys[2]).embedding, profiles[2].embedding)
+        assert restarted.get(keys[0]) is None
+
+## Multi-face ##
+def group_photo():
+    # Side-by-side composite of two different people
+    left, right = Image.open(image_path2).convert("RGB"), Image.open(different_image_path).convert("RGB")
+    right = right.resize((right.width * left.height // right.height, left.height))
+    group = Image.new("RGB", (left.width + right.width, left.height))
+    group.paste(left, (0, 0))
+    group.paste(right, (left.width, 0))
+    buffer = BytesIO()
+    group.save(buffer, format="JPEG")
+    return buffer.getvalue(), left.width
+
+def test_multi_face_create_and_verify():
+    print("Testing multi-face profile creation and verification")
+    image_data, split = group_photo()
+    response = client.post("/profile/create/faces", files={"file": ("group.jpg", image_data, "image/jpeg")})
+    assert response.status_code == 200
+    faces = response.json()["faces"]
+    assert len(faces) == 2
+    assert sorted(face["box"]["left"] < split for face in faces) == [False, True]
+    for face in faces:
+        assert client.get(f"/profile/{face['profile_id']}").status_code == 200
+
+    response = client.post("/profile/create/faces", files={"file": ("tom1.jpg", load_image(image_path1), "image/jpeg")})
+    reference_id = response.json()["faces"][0]["profile_id"]
+    response = client.post(f"/profile/verify/{reference_id}/faces", files={"file": ("group.jpg", image_data, "image/jpeg")})
+    assert response.status_code == 200
+    result = response.json()
+    assert len(result["faces"]) == 2
+    assert result["faces"][result["best_face"]]["box"]["left"] < split
+
+def test_profiles_compare_across_single_and_multi_face_endpoints():
+    print("Testing verification across single-face and multi-face endpoints")
+    feature_cache.clear()
+    image_data = load_image(image_path1)
+    single_id = client.post("/profile/create", files={"file": ("tom1.jpg", image_data, "image/jpeg")}).json()["profile_id"]
+    faces_id = client.post("/profile/create/faces", files={"file": ("tom1.jpg", image_data, "image/jpeg")}).json()["faces"][0]["profile_id"]
+
+    # Either kind of reference gives the same verdicts through either verification endpoint
+    for reference_id in (single_id, faces_id):
+        for path, is_deepfaked in ((image_path2, False), (fake_image_path, True), (different_image_path, True)):
+            files = {"file": (os.path.basename(path), load_image(path), "image/jpeg")}
+            assert client.post(f"/profile/verify/{reference_id}", files=files).json()["is_deepfaked"] == is_deepfaked
+            result = client.post(f"/profile/verify/{reference_id}/faces", files=files).json()
+            assert result["faces"][result["best_face"]]["is_deepfaked"] == is_deepfaked
+
+def test_batched_lbp_matches_per_image():
+    print("Testing batched LBP histograms against per-image histograms")
+    images = np.random.default_rng(0).integers(0, 256, size=(3, 128, 128), dtype=np.uint8)
+    expected = np.stack([lbp_histogram_from_gray(image) for image in images])
+    assert np.array_equal(lbp_histograms_from_gray(images), expected)
+
+def test_numpy_lbp_matches_skimage():
+    print("Testing vectorized LBP engine against skimage")
+    face = cv2.equalizeHist(cv2.resize(cv2.imread(image_path1, cv2.IMREAD_GRAYSCALE), (128, 128)))
+    noise = np.random.default_rng(1).integers(0, 256, size=(128, 96), dtype=np.uint8)
+    for image in (face, noise):
+        for P, R in ((8, 1), (16, 2), (24, 3), (12, 1.5)):
+            assert np.array_equal(uniform_lbp_codes(image, P, R), local_binary_pattern(image, P, R, method="uniform"))
+
+    # Histogram matches the original skimage-based computation
+    codes, _ = np.histogram(local_binary_pattern(face, 24, 3, method="uniform").ravel(), bins=np.arange(0, 27), range=(0, 26))
+    assert np.array_equal(lbp_histogram_from_gray(face), codes / (codes.sum() + 1e-6))
+
+    # Multi-scale grid descriptor keeps one histogram's scale
+    descriptors = lbp_descriptors_from_gray(np.stack([face, face]), levels=((8, 1), (16, 2), (24, 3)), grid_size=2)
+    assert descriptors.shape == (2, (10 + 18 + 26) * 4)
+    assert np.allclose(descriptors.sum(axis=1), 1)
+    assert np.array_equal(lbp_descriptors_from_gray(face[None], levels=((24, 3),), grid_size=1)[0], lbp_histogram_from_gray(face))
+
+## Video verification ##
+def write_clip(path, seconds=10, fps=30):
+    # Face drifting side to side, like a handheld selfie clip
+    face = cv2.resize(cv2.imread(image_path2), (320, 480))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (360, 480))
+    for i in range(seconds * fps):
+        frame = np.zeros((480, 360, 3), dtype=np.uint8)
+        offset = int(20 + 20 * np.sin(i / fps))
+        frame[:, offset:offset + 320] = face
+        writer.write(frame)
+    writer.release()
+
+def test_verify_video_with_existing_profile():
+    print("Testing video verification with early exit")
+    # Frames go through the same face crop analysis as /profile/create, so its profiles are valid references
+    response = client.post("/profile/create", files={"file": ("tom1.jpg", load_image(image_path1), "image/jpeg")})
+    profile_id = response.json()["profile_id"]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "clip.mp4")
+        write_clip(path)
+        response = client.post(f"/profile/verify/video/{profile_id}", files={"file": ("clip.mp4", load_image(path), "video/mp4")})
+    assert response.status_code == 200
+    result = response.json()
+    assert not result["is_deepfaked"] and result["confidence"] >= CONFIDENCE_THRESHOLD
+    assert result["early_exit"] and result["frames_decoded"] < 300
+    assert len(result["frames"]) == result["frames_analyzed"]
+    assert result["detections"] < result["frames_analyzed"]
+    assert result["frames"][0]["keyframe"]
+
+    response = client.post(f"/profile/verify/video/{profile_id}", files={"file": ("clip.mp4", b"not a video", "video/mp4")})
+    assert response.status_code == 400
+
+    # Videos over the byte limit are rejected while they are copied, without spooling the rest
+    limit = profile_routers.VIDEO_MAX_BYTES
+    profile_routers.VIDEO_MAX_BYTES = 1000
+    try:
+        response = client.post(f"/profile/verify/video/{profile_id}", files={"file": ("clip.mp4", b"\0" * 1001, "video/mp4")})
+        assert response.status_code == 413
+    finally:
+        profile_routers.VIDEO_MAX_BYTES = limit
+    spooled = BytesIO()
+    try:
+        spool_upload(BytesIO(b"\0" * 300_000), spooled, 100_000)
+        assert False, "Oversized video spooled"
+    except UploadRejectedError as e:
+        assert e.status_code == 413 and len(spooled.getvalue()) < 100_000
+
+## Batch scoring ##
+def test_batch_scoring_matches_per_pair():
+    print("Testing batch scoring against per-pair comparison")
+    rng = np.random.default_rng(4)
+    probe = CompactProfile.from_profile(random_profile(rng))
+    gallery = [CompactProfile.from_profile(random_profile(rng)) for _ in range(64)]
+    confidences = compare_profile_batch(probe, *stack_profiles(gallery))
+    assert confidences.shape == (64,)
+    assert np.array_equal(confidences, [compare_profiles(probe, profile) for profile in gallery])
+
+    # Deep feature confidence still follows the cosine similarity of the embeddings
+    landmarks, embeddings, lbp, _ = stack_profiles(gallery)
+    confidences = compare_profile_batch(probe, np.tile(probe.landmarks, (64, 1)), embeddings, np.tile(probe.lbp, (64, 1)))
+    cosine = embeddings.astype(np.float64) @ probe.embedding / (np.linalg.norm(embeddings.astype(np.float64), axis=1) * np.linalg.norm(probe.embedding))
+    expected = (100 * (LM_WEIGHT + LBPH_WEIGHT) + DF_WEIGHT * (cosine + 1) / 2 * 100) / (LM_WEIGHT + DF_WEIGHT + LBPH_WEIGHT)
+    assert np.allclose(confidences, expected)
+
+def baseline_compare_profiles(profile1, profile2):
+    # Frozen copy of the per-pair formulas the batch scoring replaced, on Profile dicts and lists
+    differences = {key: abs(profile1.landmark_distances[key] - profile2.landmark_distances[key]) for key in profile1.landmark_distances}
+    lm_confidence = max(0, 100 * (1 - sum(differences.values()) / LANDMARK_MAX_DIFFERENCE))
+
+    # scikit-learn's cosine_similarity: rows scaled to unit length, then a matrix product
+    embeddings1, embeddings2 = np.atleast_2d(np.array(profile1.deep_features)), np.atleast_2d(np.array(profile2.deep_features))
+    similarity = (embeddings1 / np.linalg.norm(embeddings1, axis=1, keepdims=True)) @ (embeddings2 / np.linalg.norm(embeddings2, axis=1, keepdims=True)).T
+    df_confidence = (similarity[0][0] + 1) / 2 * 100
+
+    histogram1, histogram2 = np.array(profile1.lbp_histogram), np.array(profile2.lbp_histogram)
+    chi_sq_dist = 0.5 * np.sum(((histogram1 - histogram2) ** 2) / (histogram1 + histogram2 + 1e-6))
+    lbph_confidence = max(0, 100 * (1 - (chi_sq_dist / LBP_MAX_DISTANCE)))
+    return lm_confidence, df_confidence, lbph_confidence
+
+def test_batch_scoring_matches_baseline_formulas():
+    print("Testing batch scoring against the baseline per-pair formulas")
+    profiles = [generate_profile(Image.open(path)) for path in (image_path1, image_path2, different_image_path, fake_image_path)]
+    weights = [LM_WEIGHT, DF_WEIGHT, LBPH_WEIGHT]
+    for probe in profiles:
+        confidences = compare_profile_batch(probe, *stack_profiles(profiles))
+        for profile, confidence in zip(profiles, confidences):
+            # Summation order differs from the baseline, so only the last bits may change
+            expected = baseline_compare_profiles(probe.to_profile(), profile.to_profile())
+            families = [
+                compare_distance_matrix(probe.landmarks, profile.landmarks[None, :])[0],
+                compare_embedding_matrix(probe.embedding, profile.embedding[None, :])[0],
+                compare_lbp_histogram_matrix(probe.lbp, profile.lbp[None, :])[0],
+            ]
+            assert np.allclose(families, expected, rtol=0, atol=1e-9)
+            combined = sum(c * w for c, w in zip(expected, weights)) / sum(weights)
+            assert abs(confidence - combined) < 1e-9 and abs(compare_profiles(probe, profile) - combined) < 1e-9
+
+## FaceNet backends ##
+def test_facenet_backends_match_fp32_embeddings():
+    print("Testing optimized FaceNet backends against fp32 embeddings")
+    image_tensors = torch.cat([extract_profile_inputs(Image.open(path))[1] for path in (image_path1, image_path2, different_image_path, fake_image_path)])
+    model = InceptionResnetV1(pretrained=FACENET_PRETRAINED).eval()
+    reference = FacenetBackend(model, "eager")(image_tensors)
+    for spec in ("torchscript", "int8", "channels_last", "channels_last,int8,torchscript"):
+        backend = FacenetBackend(model, spec)
+        assert embedding_parity(reference, backend(image_tensors))["min_cosine"] >= FACENET_PARITY_MIN_COSINE
+    assert torch.equal(FacenetBackend(model, "eager")(image_tensors), reference)
+
+    try:
+        FacenetBackend(model, "fp16")
+        assert False
+    except ValueError:
+        pass
+
+## Upload ingestion ##
+def png_header(width, height):
+    # PNG signature and header chunk declaring the dimensions, without pixel data
+    def chunk(kind, data):
+        return len(data).to_bytes(4, "big") + kind + data + zlib.crc32(kind + data).to_bytes(4, "big")
+    ihdr = width.to_bytes(4, "big") + height.to_bytes(4, "big") + bytes([8, 2, 0, 0, 0])
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"")) + chunk(b"IEND", b"")
+
+def test_uploads_rejected_before_decoding():
+    print("Testing early upload rejection and the no-face pre-check")
+    decode_count = STAGE_LATENCY.count(stage="decode")
+    for size in ((8000, 8000), (30000, 30000)):
+        response = client.post("/profile/create", files={"file": ("large.png", png_header(*size), "image/png")})
+        assert response.status_code == 413
+    response = client.post("/profile/create", files={"file": ("notes.jpg", b"not an image" * 100, "image/jpeg")})
+    assert response.status_code == 415
+    assert STAGE_LATENCY.count(stage="decode") == decode_count
+
+    # Large baseline JPEGs are searched on a reduced decode, faces are still found there
+    blank = BytesIO()
+    Image.new("RGB", (2400, 2000), "white").save(blank, format="JPEG")
+    try:
+        precheck_face(inspect_image(blank.getvalue()))
+        assert False, "blank image passed the face pre-check"
+    except NoFaceDetectedError:
+        pass
+    baseline = BytesIO()
+    Image.open(image_path1).save(baseline, format="JPEG", quality=90)
+    precheck_face(inspect_image(baseline.getvalue()))
+    for path in (image_path2, different_image_path, fake_image_path):
+        precheck_face(inspect_image(load_image(path)), min_pixels=1)
+
+    # Group photos are searched on a larger view than single faces, so the pre-check never gates them
+    canvas, left = Image.new("RGB", (4000, 3000), (120, 120, 120)), 200
+    for path in (image_path2, different_image_path):
+        face = Image.open(path).convert("RGB")
+        face = face.resize((face.width * 1100 // face.height, 1100))
+        canvas.paste(face, (left, 600))
+        left += face.width + 300
+    group = BytesIO()
+    canvas.save(group, format="JPEG", quality=90)
+    response = client.post("/profile/create/faces", files={"file": ("group.jpg", group.getvalue(), "image/jpeg")})
+    assert response.status_code == 200 and len(response.json()["faces"]) == 2
+
+## Verification jobs ##
+def test_verification_job_matches_synchronous_verify():
+    print("Testing asynchronous verification jobs")
+    with TestClient(app) as job_client:
+        response = job_client.post("/profile/create", files={"file": ("tom1.jpg", load_image(image_path1), "image/jpeg")})
+        profile_id = response.json()["profile_id"]
+        expected = {}
+        for name, path in (("tom2.jpg", image_path2), ("devito.jpg", different_image_path)):
+            response = job_client.post(f"/profile/verify/{profile_id}", files={"file": (name, load_image(path), "image/jpeg")})
+            expected[name] = response.json()["confidence"]
+
+        manifest = [
+            {"profile_id": profile_id, "image": "tom2.jpg"},
+            {"profile_id": profile_id, "image": "devito.jpg"},
+            {"profile_id": "missing", "image": "tom2.jpg"},
+            {"profile_id": profile_id, "image": "absent.jpg"},
+        ]
+        response = job_client.post("/jobs/verify?priority=5", data={"manifest": json.dumps(manifest)}, files=[
+            ("files", ("tom2.jpg", load_image(image_path2), "image/jpeg")),
+            ("files", ("devito.jpg", load_image(different_image_path), "image/jpeg")),
+        ])
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.json()["total"] == 4 and response.json()["failed"] == 1
+
+        status = job_client.get(f"/jobs/{job_id}?wait=30").json()
+        assert status["state"] == "finished" and status["completed"] == 2 and status["failed"] == 2
+        results = job_client.get(f"/jobs/{job_id}/results").json()["results"]
+        assert [result["state"] for result in results] == ["completed", "completed", "failed", "failed"]
+        assert abs(results[0]["confidence"] - expected["tom2.jpg"]) < 1e-6
+        assert abs(results[1]["confidence"] - expected["devito.jpg"]) < 1e-6
+        assert results[2]["error"] == "Profile not found" and results[3]["error"] == "Image not found in upload"
+
+        assert job_client.post("/jobs/verify", data={"manifest": "[]"}, files=[("files", ("tom2.jpg", b"", "image/jpeg"))]).status_code == 400
+        assert job_client.delete(f"/jobs/{job_id}").status_code == 200
+        assert job_client.get(f"/jobs/{job_id}").status_code == 404
+
+def test_job_queue_dedupes_images_and_survives_restart():
+    print("Testing job queue deduplication and lease recovery")
+    path = os.path.join(tempfile.mkdtemp(prefix="job_queue_"), "jobs.sqlite3")
+    queue = JobQueue(path, lease_seconds=60)
+    image = load_image(image_path2)
+    low = queue.submit([("1", "a.jpg"), ("2", "b.jpg")], [("a.jpg", image), ("b.jpg", image)], priority=0)
+    high = queue.submit([("3", "c.jpg")], [("c.jpg", image)], priority=1)
+    assert queue._db.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 1
+
+    # Uploads are read and validated without holding the queue lock, so status polls are not blocked
+    def read_images():
+        assert not queue._lock.locked() and queue.status(low)["state"] == "queued"
+        yield "d.jpg", image
+        assert not queue._lock.locked() and queue.pending() == 3
+    queue.delete(queue.submit([("4", "d.jpg")], read_images()))
+
+    # One claim takes the high priority task with every task sharing its image
+    tasks = queue.claim(limit=1)
+    assert sorted(task["job_id"] for task in tasks) == sorted([high, low, low])
+    assert queue.claim() == []
+
+    # A worker that restarts finds the tasks leased by its previous process once the lease expires
+    restarted = JobQueue(path)
+    assert restarted.claim() == []
+    restarted._db.execute("UPDATE tasks SET lease_until = 0 WHERE state = 'running'")
+    reclaimed = restarted.claim()
+    assert len(reclaimed) == 3
+    restarted.complete([(task, 80.0, None) for task in reclaimed])
+    assert restarted.status(low)["state"] == "finished" and restarted.status(high)["completed"] == 1
+    assert restarted._db.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 0
+
+    # Large jobs are written in small batches as they are read, never holding every image in memory
+    budget = 8
+    def many_images(count, fail=False):
+        for i in range(count):
+            stored = restarted._db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+            assert i - stored <= budget and not restarted._lock.locked()
+            yield f"{i}.jpg", image + i.to_bytes(4, "big")
+        if fail:
+            raise OSError("Upload interrupted")
+    pairs = [(str(i), f"{i}.jpg") for i in range(100)]
+    job_id = restarted.submit(pairs, many_images(100), batch_size=budget)
+    assert restarted.status(job_id)["pending"] == 100 and len(restarted.claim(limit=100)) == 100
+    restarted.delete(job_id)
+
+    # An interrupted submission leaves neither its job nor its images behind
+    try:
+        restarted.submit(pairs, many_images(50, fail=True), batch_size=budget)
+        assert False, "Interrupted submission stored"
+    except OSError:
+        pass
+    assert restarted._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 2
+    assert restarted._db.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 0
+
+## Enrollment templates ##
+def test_template_merge_matches_batch_statistics():
+    print("Testing incremental enrollment templates")
+    rng = np.random.default_rng(4)
+    profiles = [CompactProfile.from_profile(random_profile(rng)) for _ in range(7)]
+    landmarks = np.stack([profile.landmarks for profile in profiles]).astype(np.float64)
+
+    one_by_one = profiles[0]
+    for profile in profiles[1:]:
+        one_by_one = one_by_one.merge(profile)
+    halves = profiles[0].merge(profiles[1]).merge(profiles[2]).merge(profiles[3].merge(profiles[4]).merge(profiles[5]).merge(profiles[6]))
+    for template in (one_by_one, halves):
+        assert template.count == 7
+        assert np.allclose(template.landmarks, landmarks.mean(axis=0), atol=1e-4)
+        assert np.allclose(template.landmark_variance, landmarks.var(axis=0), rtol=1e-4)
+        assert np.allclose(template.embedding, np.mean([profile.embedding for profile in profiles], axis=0), atol=1e-6)
+        assert np.allclose(template.lbp, np.mean([profile.lbp for profile in profiles], axis=0), atol=1e-7)
+
+    # Templates survive the binary format and version 1 profiles load as single images
+    restored = CompactProfile.from_bytes(one_by_one.to_bytes())
+    assert restored.count == 7 and np.array_equal(restored.landmark_variance, one_by_one.landmark_variance)
+    single = profiles[0]
+    v1 = BINARY_HEADER_V1.pack(BINARY_MAGIC, 1, 15, 512, LBP_BINS) + b"".join(vector.astype("<f4").tobytes() for vector in (single.landmarks, single.embedding, single.lbp))
+    assert CompactProfile.from_bytes(v1).count == 1 and compare_profiles(CompactProfile.from_bytes(v1), single) == compare_profiles(single, single)
+
+    # Landmark differences within the enrolled spread are not penalized
+    assert compare_profiles(one_by_one, profiles[0]) >= compare_profiles(CompactProfile(one_by_one.landmarks, one_by_one.embedding, one_by_one.lbp), profiles[0])
+
+    # Stores written before templates are upgraded in place
+    path = tempfile.mkdtemp()
+    store = MmapProfileStore(path)
+    store["a"] = profiles[0]
+    with open(os.path.join(path, "MANIFEST")) as f:
+        manifest = json.load(f)
+    manifest["version"] = 1
+    for name in UPGRADE_DEFAULTS:
+        del manifest["columns"][name]
+        os.remove(os.path.join(path, f"{name}.{manifest['generation']}"))
+    with open(os.path.join(path, "MANIFEST"), "w") as f:
+        json.dump(manifest, f)
+    upgraded = MmapProfileStore(path)
+    assert upgraded["a"].count == 1 and not upgraded["a"].landmark_variance.any()
+    assert upgraded.update("a", lambda profile: profile.merge(profiles[1])).count == 2
+    assert MmapProfileStore(path)["a"].count == 2
+
+def test_enroll_images_into_profile():
+    print("Testing enrollment of further images into a profile")
+    response = client.post("/profile/create", files={"file": ("tom1.jpg", load_image(image_path1), "image/jpeg")})
+    profile_id = response.json()["profile_id"]
+    response = client.post(f"/profile/enroll/{profile_id}", files=[
+        ("files", ("tom2.jpg", load_image(image_path2), "image/jpeg")),
+        ("files", ("tom1.jpg", load_image(image_path1), "image/jpeg")),
+    ])
+    assert response.status_code == 200 and response.json()["enrollment_count"] == 3
+    profile = client.get(f"/profile/{profile_id}").json()["profile"]
+    assert profile["enrollment_count"] == 3 and max(profile["landmark_variance"].values()) > 0
+
+    blank = BytesIO()
+    Image.new("RGB", (320, 320), "white").save(blank, format="JPEG")
+    response = client.post(f"/profile/enroll/{profile_id}", files=[
+        ("files", ("tom2.jpg", load_image(image_path2), "image/jpeg")),
+        ("files", ("blank.jpg", blank.getvalue(), "image/jpeg")),
+    ])
+    assert response.status_code == 500
+    assert client.get(f"/profile/{profile_id}").json()["profile"]["enrollment_count"] == 3
+    assert client.post("/profile/enroll/missing", files=[("files", ("tom2.jpg", load_image(image_path2), "image/jpeg"))]).status_code == 404
+
+    response = client.post(f"/profile/verify/{profile_id}", files={"file": ("tom2.jpg", load_image(image_path2), "image/jpeg")})
+    assert response.status_code == 200 and response.json()["is_deepfaked"] == False
+
+## Face detection and alignment ##
+def test_pluggable_detectors_and_aligned_crops():
+    print("Testing pluggable face detectors and aligned face crops")
+    view = cv2.resize(cv2.cvtColor(np.array(Image.open(image_path2)), cv2.COLOR_RGB2BGR), (160, 240))
+    dlib_faces = create_face_detector("dlib")(view)
+    assert dlib_faces == create_face_detector("dlib")(cv2.cvtColor(view, cv2.COLOR_BGR2GRAY))
+    mtcnn_face = create_face_detector("mtcnn")(view)[0]
+    assert dlib_faces[0].intersect(mtcnn_face).area() > 0.5 * min(dlib_faces[0].area(), mtcnn_face.area())
+    try:
+        create_face_detector("unknown")
+        assert False, "Unknown detector accepted"
+    except ValueError:
+        pass
+
+    # Alignment levels the eyes, rotating about their midpoint
+    points = np.zeros((68, 2))
+    points[36:42], points[42:48] = (40, 60), (100, 80)
+    matrix = alignment_matrix(points)
+    eyes = np.array([[40, 60, 1], [100, 80, 1]]) @ matrix.T
+    assert abs(eyes[0, 1] - eyes[1, 1]) < 1e-6 and np.allclose(eyes.mean(axis=0), (70, 70))
+
+    # Landmark distances survive rotation of the photo, and aligned crops keep identities apart
+    upright = Image.open(image_path2)
+    rotated = upright.rotate(15, resample=Image.BICUBIC, fillcolor=(128, 128, 128))
+    landmarks, image_tensor, lbp_histogram, timings = extract_profile_inputs(upright, align=True)
+    assert image_tensor.shape == (1, 3, 160, 160) and np.isclose(lbp_histogram.sum(), 1)
+    assert {"detect", "crop", "landmarks", "align", "lbp"} <= timings.keys()
+    assert np.abs(extract_profile_inputs(rotated, align=True)[0] - landmarks).sum() < 0.1 * landmarks.sum()
+
+    def aligned_profile(path):
+        landmarks, image_tensor, lbp_histogram, _ = extract_profile_inputs(Image.open(path), align=True)
+        return CompactProfile(landmarks, embed_image_tensors(image_tensor), lbp_histogram)
+    reference = aligned_profile(image_path1)
+    assert compare_profiles(reference, aligned_profile(image_path2)) >= CONFIDENCE_THRESHOLD
+    assert compare_profiles(reference, aligned_profile(fake_image_path)) < CONFIDENCE_THRESHOLD
+
+## Snapshots ##
+def test_snapshot_export_import_and_deltas():
+    print("Testing profile snapshots and delta snapshots")
+    rng = np.random.default_rng(5)
+    primary = MmapProfileStore(tempfile.mkdtemp())
+    primary.put_many((f"p{i}", CompactProfile.from_profile(random_profile(rng))) for i in range(50))
+    replica = MemoryProfileStore()
+    replica["stale"] = CompactProfile.from_profile(random_profile(rng))
+
+    def assert_replicated():
+        assert sorted(replica.keys()) == sorted(primary.keys())
+        for profile_id in primary.keys():
+            assert np.array_equal(replica[profile_id].embedding, primary[profile_id].embedding)
+            assert np.array_equal(replica[profile_id].landmark_variance, primary[profile_id].landmark_variance)
+
+    # A full snapshot in small chunks replaces the replica's profiles
+    result = import_snapshot(replica, BytesIO(b"".join(iter_snapshot(primary, chunk_rows=16))))
+    assert result == {"full": True, "since": 0, "sequence": primary.sequence, "imported": 50, "deleted": 1}
+    assert_replicated()
+
+    # A delta carries only the writes and deletes since the last import
+    primary["p3"] = primary["p3"].merge(CompactProfile.from_profile(random_profile(rng)))
+    primary["new"] = CompactProfile.from_profile(random_profile(rng))
+    primary.delete_many(["p4", "p5", "missing"])
+    delta = b"".join(iter_snapshot(primary, result["sequence"]))
+    result = import_snapshot(replica, BytesIO(delta))
+    assert not result["full"] and (result["imported"], result["deleted"]) == (2, 2)
+    assert_replicated()
+
+    # Truncated snapshots are rejected and full ones never prune before their end
+    snapshot = b"".join(iter_snapshot(primary))
+    replica["extra"] = CompactProfile.from_profile(random_profile(rng))
+    try:
+        import_snapshot(replica, BytesIO(snapshot[:-20]))
+        assert False, "Truncated snapshot imported"
+    except SnapshotError:
+        assert "extra" in replica
+
+    # Snapshots from other feature settings are refused unless forced
+    _, _, length = SNAPSHOT_HEADER.unpack_from(snapshot)
+    metadata = json.loads(snapshot[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length])
+    metadata["fingerprint"] = "0" * 16
+    encoded = json.dumps(metadata).encode()
+    foreign = SNAPSHOT_HEADER.pack(*SNAPSHOT_HEADER.unpack_from(snapshot)[:2], len(encoded)) + encoded + snapshot[SNAPSHOT_HEADER.size + length:]
+    try:
+        import_snapshot(replica, BytesIO(foreign))
+        assert False, "Foreign snapshot imported"
+    except IncompatibleSnapshotError:
+        pass
+    assert import_snapshot(replica, BytesIO(foreign), force=True)["deleted"] == 1
+    assert_replicated()
+
+    # Deletes compacted away can no longer be sent as a delta, so a full snapshot is sent
+    since = primary.sequence
+    del primary["p6"]
+    primary.compact()
+    assert primary.changes(since)[0] and not primary.changes(primary.sequence)[0]
+
+    # The CLI exports a store and bulk-loads it into another
+    path = os.path.join(tempfile.mkdtemp(), "gallery.snapshot")
+    copy = tempfile.mkdtemp()
+    root = os.path.join(os.path.dirname(__file__), "..")
+    subprocess.run([sys.executable, "-m", "app.snapshot", "export", path, "--store", primary.path], cwd=root, capture_output=True, check=True)
+    output = subprocess.run([sys.executable, "-m", "app.snapshot", "import", path, "--store", copy], cwd=root, capture_output=True, text=True, check=True)
+    assert json.loads(output.stdout.strip().splitlines()[-1])["imported"] == len(primary)
+    assert sorted(MmapProfileStore(copy).keys()) == sorted(primary.keys())
+
+    # The endpoints round-trip the served store
+    response = client.get("/snapshot")
+    assert response.status_code == 200
+    result = client.post("/snapshot", files={"file": ("gallery.snapshot", response.content, "application/octet-stream")}).json()
+    assert result["full"] and result["deleted"] == 0 and result["imported"] == len(profile_db)
+    assert client.post("/snapshot", files={"file": ("bad.snapshot", b"not a snapshot", "application/octet-stream")}).status_code == 400
+
+    # Frames with valid checksums but inconsistent contents, and incomplete metadata, are rejected as malformed
+    _, _, length = SNAPSHOT_HEADER.unpack_from(response.content)
+    header = response.content[:SNAPSHOT_HEADER.size + length]
+    malformed = [
+        header + encode_frame(FRAME_PUT, 1000, encode_ids(["a", "b"])),
+        header + encode_frame(FRAME_PUT, 1, encode_ids(["a"]) + b"\0" * 12),
+        header + encode_frame(FRAME_DELETE, 1, encode_ids(["a"])[:2] + b"\xff"),
+        header + encode_frame(FRAME_DELETE, 1, encode_ids(["a"])[:2] + b"\xff\xfe"),
+    ]
+    metadata = json.loads(header[SNAPSHOT_HEADER.size:])
+    del metadata["sequence"]
+    encoded = json.dumps(metadata).encode()
+    malformed.append(SNAPSHOT_HEADER.pack(*SNAPSHOT_HEADER.unpack_from(header)[:2], len(encoded)) + encoded)
+    for data in malformed:
+        try:
+            import_snapshot(MemoryProfileStore(), BytesIO(data))
+            assert False, "Malformed snapshot imported"
+        except SnapshotError:
+            pass
+        assert client.post("/snapshot", files={"file": ("bad.snapshot", data, "application/octet-stream")}).status_code == 400
+    assert client.post("/snapshot", files={"file": ("foreign.snapshot", foreign, "application/octet-stream")}).status_code == 409
+
+## Cascade verification ##
+def test_cascade_settles_verdict_before_facenet():
+    print("Testing early-exit verification cascade")
+    # Exact bounds never settle a verdict the full comparison would reverse
+    rng = np.random.default_rng(6)
+    ranges = cascade_ranges("exact")
+    weights = [LM_WEIGHT, DF_WEIGHT, LBPH_WEIGHT]
+    for lm, lbp in rng.uniform(0, 100, (500, 2)):
+        bound = settled_confidence({"landmarks": lm, "lbp": lbp}, ranges)
+        if bound is not None:
+            for df in (0.0, 100.0, rng.uniform(0, 100)):
+                full = sum(c * w for c, w in zip([lm, df, lbp], weights)) / sum(weights)
+                assert (full < CONFIDENCE_THRESHOLD) == (bound < CONFIDENCE_THRESHOLD)
+
+    # Bounds are scored on the float32 features the full comparison uses, so references at the threshold get its verdict
+    generated = generate_profile(Image.open(image_path2))
+    landmarks, _, lbp, _ = extract_profile_inputs(Image.open(image_path2))
+    rounded = landmarks.astype(np.float32)
+    # Every distance sits just above the float32 value it rounds to, so the rounding errors add up instead of cancelling
+    landmarks = rounded.astype(np.float64) - 0.49 * (rounded - np.nextafter(rounded, np.float32(0))).astype(np.float64)
+    probe = CompactProfile(landmarks=landmarks, embedding=generated.embedding, lbp=lbp)
+    shifted = lambda offset: CompactProfile(landmarks=rounded + np.float32(offset), embedding=generated.embedding, lbp=generated.lbp)
+    low, high = 0.0, 100.0
+    for _ in range(60):
+        middle = (low + high) / 2
+        low, high = (middle, high) if compare_profiles(shifted(middle), probe) >= CONFIDENCE_THRESHOLD else (low, middle)
+    settled = 0
+    for offset in np.float32(low) + np.arange(-100, 101) * np.spacing(np.float32(low)):
+        bound = cascade_bound(shifted(offset), landmarks, lbp, ranges)
+        if bound is not None:
+            settled += 1
+            assert (bound < CONFIDENCE_THRESHOLD) == (compare_profiles(shifted(offset), probe) < CONFIDENCE_THRESHOLD)
+    assert settled
+
+    reference = generate_profile(Image.open(image_path1))
+    upload = inspect_image(load_image(image_path2))
+    full_confidence = compare_profiles(reference, generate_profile(Image.open(image_path2)))
+
+    # An open verdict runs FaceNet and gives the full comparison's confidence
+    profile, bound = asyncio.run(verify_profile_async(upload, reference, mode="exact"))
+    assert bound is None and compare_profiles(reference, profile) == full_confidence
+
+    # Landmarks far from the reference settle the verdict as deepfaked without FaceNet
+    skipped = CASCADE_STAGES.value(stage="facenet", outcome="skipped")
+    distant = CompactProfile(landmarks=reference.landmarks + 200, embedding=reference.embedding, lbp=reference.lbp)
+    profile, bound = asyncio.run(verify_profile_async(upload, distant, mode="exact"))
+    assert profile is None and bound < CONFIDENCE_THRESHOLD
+    assert compare_profiles(distant, generate_profile(Image.open(image_path2))) <= bound
+    assert CASCADE_STAGES.value(stage="facenet", outcome="skipped") == skipped + 1
+
+    # The fast range settles a close landmark match as genuine too, and only complete profiles are cached
+    feature_cache.clear()
+    probe = generate_profile(Image.open(image_path2))
+    close = CompactProfile(landmarks=probe.landmarks, embedding=reference.embedding, lbp=reference.lbp)
+    profile, bound = asyncio.run(verify_profile_from_bytes(upload, close, mode="fast"))
+    assert profile is None and bound >= CONFIDENCE_THRESHOLD
+    assert feature_cache.stats()["entries"] == 0
+    profile, bound = asyncio.run(verify_profile_from_bytes(upload, distant, mode="off"))
+    assert bound is None and feature_cache.stats()["entries"] == 1
+    assert asyncio.run(verify_profile_from_bytes(upload, distant, mode="exact"))[0] is not None
+
+## Profile ids and sharded store ##
+def test_profile_ids_and_sharded_store_under_concurrency():
+    print("Testing time-ordered ids and lock-striped store under concurrent writes")
+    # Ids are unique and ordered across threads, and encode their creation time
+    generator = ProfileIdGenerator()
+    with ThreadPoolExecutor(16) as pool:
+        batches = list(pool.map(lambda _: [generator() for _ in range(2000)], range(16)))
+    ids = [profile_id for batch in batches for profile_id in batch]
+    assert len(set(ids)) == len(ids) and all(batch == sorted(batch) for batch in batches)
+    assert abs(profile_id_timestamp(ids[0]) - time.time()) < 60
+
+    # Concurrent puts, deletes and read-modify-write updates lose nothing
+    rng = np.random.default_rng(7)
+    base = CompactProfile.from_profile(random_profile(rng))
+    store = MemoryProfileStore(shards=8)
+    indexed = set()
+    index_lock = threading.Lock()
+    def listener(profile_id, embedding):
+        with index_lock:
+            (indexed.add if embedding is not None else indexed.discard)(profile_id)
+    store.subscribe(listener)
+    store["shared"] = base
+
+    def worker(_):
+        own = []
+        for i in range(500):
+            profile_id = generator()
+            store[profile_id] = base
+            own.append(profile_id)
+            store.update("shared", lambda profile: profile.merge(base))
+            if i % 5 == 0:
+                del store[own.pop(0)]
+        return own
+
+    with ThreadPoolExecutor(16) as pool:
+        kept = [profile_id for own in pool.map(worker, range(16)) for profile_id in own]
+    assert sorted(store.keys()) == sorted(kept + ["shared"]) and indexed == set(store.keys())
+    assert store["shared"].count == 1 + 16 * 500
+    full, written, deleted, sequence = store.changes()
+    assert full and len(written) == len(store) and sequence == 1 + 16 * 500 * 2 + 16 * 100
+    assert len(store.changes(1)[2]) == 16 * 100
+
+    # Concurrent create requests each get their own profile
+    feature_cache.clear()
+    image_data = load_image(image_path1)
+    with TestClient(app) as shared_client, ThreadPoolExecutor(8) as pool:
+        # One client shares its event loop between the threads, like a served app
+        created = list(pool.map(lambda _: shared_client.post(
+            "/profile/create", files={"file": ("tom1.jpg", image_data, "image/jpeg")}).json()["profile_id"], range(64)))
+    assert len(set(created)) == 64 and all(profile_id in profile_db for profile_id in created)
+
+    # Bulk endpoints report what they found, and reject oversized requests
+    response = client.post("/profile/get/batch", json={"profile_ids": created[:3] + ["missing"]}).json()
+    assert sorted(response["profiles"]) == sorted(created[:3]) and response["missing"] == ["missing"]
+    response = client.post("/profile/delete/batch", json={"profile_ids": created + ["missing"]}).json()
+    assert response["deleted"] == 64 and response["missing"] == ["missing"]
+    assert not any(profile_id in profile_db for profile_id in created)
+    assert client.post("/profile/get/batch", json={"profile_ids": ["x"] * 1001}).status_code == 400
+
+## Startup ##
+def test_app_import_defers_heavy_libraries():
+    print("Testing lazy imports and the startup report")
+    script = "import sys, app.main; print(sorted(m for m in ('torch', 'torchvision', 'facenet_pytorch') if m in sys.modules))"
+    env = dict(os.environ, PROFILE_STORE_BACKEND="memory")
+    output = subprocess.run([sys.executable, "-c", script], cwd=os.path.join(os.path.dirname(__file__), ".."), env=env, capture_output=True, text=True, check=True)
+    assert output.stdout.strip().splitlines()[-1] == "[]"
+
+    with TestClient(app) as startup_client:
+        report = startup_client.get("/health/startup").json()
+    assert report["ready_seconds"] is not None and "app_imported" in report["phases"]
+    assert "facenet" in report["model_load_times"]
+
 if __name__ == "__main__":
     test_retrieve_existing_profile()
     test_retrieve_non_existing_profile()
@@ -100,4 +1051,35 @@ if __name__ == "__main__":
     test_verify_real_photo_with_existing_profile()
     test_verify_fake_photo_with_existing_profile()
     test_verify_real_photo_with_non_existing_profile()
+    test_models_ready_after_startup()
+    test_micro_batcher_batches_concurrent_requests()
+    test_create_profile_rejected_when_saturated()
+    test_create_profiles_batch()
+    test_embedding_index_matches_brute_force()
+    test_ivf_index_full_probe_matches_exact_search()
+    test_identify_photo_matches_enrolled_profile()
+    test_mmap_store_shared_between_workers_and_restarts()
+    test_retrieve_profile_binary_format()
+    test_single_face_inputs_match_face_crop_analysis()
+    test_metrics_endpoint_reports_stages_and_faces_not_found()
+    test_repeated_upload_served_from_feature_cache()
+    test_feature_cache_evicts_and_persists()
+    test_multi_face_create_and_verify()
+    test_profiles_compare_across_single_and_multi_face_endpoints()
+    test_batched_lbp_matches_per_image()
+    test_numpy_lbp_matches_skimage()
+    test_verify_video_with_existing_profile()
+    test_batch_scoring_matches_per_pair()
+    test_batch_scoring_matches_baseline_formulas()
+    test_facenet_backends_match_fp32_embeddings()
+    test_app_import_defers_heavy_libraries()
+    test_uploads_rejected_before_decoding()
+    test_verification_job_matches_synchronous_verify()
+    test_job_queue_dedupes_images_and_survives_restart()
+    test_template_merge_matches_batch_statistics()
+    test_enroll_images_into_profile()
+    test_pluggable_detectors_and_aligned_crops()
+    test_snapshot_export_import_and_deltas()
+    test_cascade_settles_verdict_before_facenet()
+    test_profile_ids_and_sharded_store_under_concurrency()
     print("All tests passed!")